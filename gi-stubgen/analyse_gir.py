@@ -9,13 +9,13 @@ GIR_DIR = '/usr/share/gir-1.0'
 def main():
     data = generate_intermediate_json("Gtk-3.0", GIR_DIR)
     data_summary = {
-        'library': data['library'],
-        'libraryPath': data['libraryPath'],
-        'name': data['name'],
-        'version': data['version'],
-        'package': data['package'],
-        'docstring': data['docstring'],
-        'imports': data['imports'],
+        'library': data.library,
+        'libraryPath': data.library_path,
+        'name': data.name,
+        'version': data.version,
+        'package': data.package,
+        'docstring': data.docstring,
+        'imports': data.imports,
     }
     json_summary = json.dumps(data_summary, indent=2)
     print(json_summary)
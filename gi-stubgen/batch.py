@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from fnmatch import fnmatch
+from os import cpu_count, path
+from time import perf_counter
+from typing import Iterator, NamedTuple, Optional
+
+from .dependency_graph import (
+    IncludeGraph, get_build_order, get_missing_includes, resolve_include_graph)
+from .gir_index import GirIndex
+from .json_intermediate.main import (
+    EXTRACTOR_BACKENDS, generate_intermediate_json, get_default_input_dirs, get_input_extension)
+from .json_intermediate.io import (
+    INTERMEDIATE_FORMATS, get_intermediate_file_name, get_intermediate_outputs, write_intermediate)
+from .json_intermediate.model import IRLib
+from .manifest import BuildManifest
+from .memory import ReleaseTracker, add_memory_arguments, release_girs, set_memory_budget
+from .parallel import parallel_generation
+from .profiling import add_profile_arguments, finish_profiling, start_profiling
+from .stub_gen import add_docstring_arguments, generate_stubs
+from .stubs.io import write_counts
+
+
+INTERMEDIATE_DIR = '.intermediate'
+STUBS_DIR = '.stubs'
+
+
+class BatchSummary(NamedTuple):
+    libraries: int
+    intermediates: int
+    stubs: int
+    # Stub files written, and left untouched as their content did not change
+    stub_files_written: int
+    stub_files_unchanged: int
+    symbols: int
+    failed: list[str]
+    seconds: float
+
+
+def main():
+    parser = ArgumentParser(
+        description='Generate the intermediates and stubs of every GIR in the given directories.')
+    parser.add_argument('gir_dirs', nargs='*',
+                        help='directories containing GIR files, or typelibs with --backend '
+                             'typelib, the first ones take precedence')
+    parser.add_argument('--allow', action='append', default=[],
+                        help='only generate the matching libraries, e.g. Gtk-3.0, Gtk or "G*"')
+    parser.add_argument('--deny', action='append', default=[],
+                        help='skip the matching libraries')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, 0 to use all CPUs')
+    parser.add_argument('--force', action='store_true',
+                        help='regenerate outputs even if they are up to date')
+    parser.add_argument('--format', choices=list(INTERMEDIATE_FORMATS), default='json',
+                        help='format of the intermediates')
+    parser.add_argument('--backend', choices=list(EXTRACTOR_BACKENDS), default='gidocgen',
+                        help='how GIRs are read, streaming reads them incrementally and '
+                             'typelib reads the compiled typelibs instead')
+    parser.add_argument('--fast-path', action='store_true',
+                        help='render functions in Python instead of with their template macros')
+    parser.add_argument('--split', action='store_true',
+                        help='write each library as a package of smaller stubs')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='write and render each library while the next ones are extracted, '
+                             'from memory instead of from its intermediate')
+    add_docstring_arguments(parser)
+    add_memory_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    start_profiling(args)
+    set_memory_budget(args.max_memory)
+    jobs = args.jobs if args.jobs > 0 else (cpu_count() or 1)
+    generation = batch_generation
+    if args.pipeline:
+        # Imported here, as it builds on this module
+        from .pipeline import pipeline_generation
+        generation = pipeline_generation
+    try:
+        summary = generation(
+            args.gir_dirs or get_default_input_dirs(args.backend), args.allow, args.deny, jobs,
+            args.force, args.format, args.fast_path, args.backend, args.split, args.docstrings)
+    finally:
+        finish_profiling(args)
+
+    print_summary(summary)
+
+
+def print_summary(summary: BatchSummary):
+    print(
+        f'\nGenerated {summary.intermediates} intermediates and {summary.stubs} stubs '
+        f'for {summary.libraries} libraries in {summary.seconds:.2f}s'
+    )
+    seconds = max(summary.seconds, 1e-9)
+    print(f'- {summary.libraries / seconds:.2f} libraries/s')
+    print(f'- {summary.symbols / seconds:.2f} symbols/s')
+    print(
+        f'- {summary.stub_files_written} stub files written, '
+        f'{summary.stub_files_unchanged} unchanged'
+    )
+    print(f'- {len(summary.failed)} failures')
+    for library in summary.failed:
+        print(f'  - {library}')
+
+
+def _matches(library: str, patterns: list[str]) -> bool:
+    # Patterns match either the full library name or just the namespace
+    namespace = library.split('-')[0]
+    return any(
+        fnmatch(library.lower(), pattern.lower())
+        or fnmatch(namespace.lower(), pattern.lower())
+        for pattern in patterns
+    )
+
+
+def select_libraries(
+    gir_dirs: list[str],
+    allow: list[str],
+    deny: list[str],
+    extension: str = 'gir'
+) -> list[str]:
+    for gir_dir in gir_dirs:
+        if not path.isdir(gir_dir):
+            print(f'- Could not find {gir_dir}')
+
+    return sorted(
+        library for library in GirIndex(gir_dirs, extension).libraries
+        if (len(allow) == 0 or _matches(library, allow))
+        and not _matches(library, deny)
+    )
+
+
+def extract_libraries(
+    graph: IncludeGraph,
+    output_dir: str,
+    manifest: BuildManifest,
+    search_paths: list[str],
+    intermediate_format: str,
+    backend: str,
+    release: Optional[ReleaseTracker],
+    failed: list[str]
+) -> Iterator[IRLib]:
+    """
+    Extract the libraries of the graph whose intermediate is out of date, in
+    build order. The ones that fail are appended to failed.
+    """
+    for library in get_build_order(graph):
+        gir_path = graph.girs[library]
+        intermediate_file = get_intermediate_file_name(library, intermediate_format)
+        try:
+            if manifest.is_fresh(library, [gir_path], [path.join(output_dir, intermediate_file)]):
+                print(f'- {intermediate_file} is up to date. Skipping...')
+                continue
+            try:
+                data = generate_intermediate_json(
+                    library, path.dirname(gir_path), search_paths=search_paths, backend=backend)
+            except Exception as e:
+                print(f'- Failed to generate {library}: {e}')
+                failed.append(library)
+                continue
+            yield data
+        finally:
+            # Repositories no library left includes
+            if release is not None:
+                release_girs(release.done(library))
+
+
+def _serial_generation(
+    graph: IncludeGraph,
+    output_dir: str,
+    manifest: BuildManifest,
+    search_paths: list[str],
+    generated: list[str],
+    intermediate_format: str,
+    backend: str,
+    release: Optional[ReleaseTracker]
+) -> list[str]:
+    failed: list[str] = []
+    for data in extract_libraries(
+            graph, output_dir, manifest, search_paths, intermediate_format, backend, release, failed):
+        try:
+            intermediate_file_path = write_intermediate(data, output_dir, intermediate_format)
+        except Exception as e:
+            print(f'- Failed to generate {data.library}: {e}')
+            failed.append(data.library)
+            continue
+        manifest.record(
+            data.library, [data.library_path, *data.import_girs],
+            get_intermediate_outputs(intermediate_file_path))
+        generated.append(data.library)
+        print(f'Generated {intermediate_file_path}')
+    return failed
+
+
+def select_graph(
+    gir_dirs: list[str],
+    allow: list[str],
+    deny: list[str],
+    extension: str = 'gir'
+) -> tuple[IncludeGraph, IncludeGraph]:
+    """
+    Return the include graph of the selected libraries and of all their
+    includes, and the one of the selected libraries only.
+    """
+    libraries = select_libraries(gir_dirs, allow, deny, extension)
+
+    # Only the selected libraries are generated, but their includes are
+    # still resolved from every directory
+    full_graph = resolve_include_graph(libraries, gir_dirs, extension)
+    graph = IncludeGraph(
+        girs={lib: full_graph.girs[lib] for lib in libraries if lib in full_graph.girs},
+        includes={lib: full_graph.includes[lib] for lib in libraries if lib in full_graph.includes},
+        missing=full_graph.missing
+    )
+    return full_graph, graph
+
+
+def remove_unresolved(full_graph: IncludeGraph, graph: IncludeGraph) -> list[str]:
+    """
+    Remove from the graph the libraries that include, directly or not, a
+    library without a GIR, as they can not be generated, and return them.
+    """
+    unresolved: list[str] = []
+    for library in get_build_order(graph):
+        missing = get_missing_includes(full_graph, library)
+        if len(missing) > 0:
+            print(f'- Skipping {library}: could not find {", ".join(missing)}')
+            unresolved.append(library)
+            del graph.girs[library]
+            del graph.includes[library]
+    return unresolved
+
+
+def batch_generation(
+    gir_dirs: list[str],
+    allow: list[str],
+    deny: list[str],
+    jobs: int = 1,
+    force: bool = False,
+    intermediate_format: str = 'json',
+    fast_path: bool = False,
+    backend: str = 'gidocgen',
+    split: bool = False,
+    docstrings: str = 'full',
+    keep_repositories: bool = False
+) -> BatchSummary:
+    """
+    Generate the intermediates and stubs of the selected libraries. The
+    repositories parsed are released as soon as no pending library includes
+    them, unless kept for the next run, within the memory budget anyway.
+    """
+    start = perf_counter()
+    write_counts.take()
+    full_graph, graph = select_graph(gir_dirs, allow, deny, get_input_extension(backend))
+
+    intermediate_manifest = BuildManifest(INTERMEDIATE_DIR)
+    stubs_manifest = BuildManifest(STUBS_DIR)
+    if force:
+        intermediate_manifest.entries.clear()
+        stubs_manifest.entries.clear()
+
+    unresolved = remove_unresolved(full_graph, graph)
+    failed = list(unresolved)
+    generated: list[str] = []
+    # Includes outside of the selection are parsed, and released, too
+    release = ReleaseTracker(full_graph, graph.girs) if not keep_repositories else None
+    try:
+        if jobs > 1:
+            failed.extend(parallel_generation(
+                graph, INTERMEDIATE_DIR, jobs, intermediate_manifest, gir_dirs, generated,
+                intermediate_format, backend, release, full_graph))
+        else:
+            failed.extend(_serial_generation(
+                graph, INTERMEDIATE_DIR, intermediate_manifest, gir_dirs, generated,
+                intermediate_format, backend, release))
+    finally:
+        intermediate_manifest.save()
+
+    try:
+        stub_failures: list[str] = []
+        results = generate_stubs(
+            INTERMEDIATE_DIR, STUBS_DIR, stubs_manifest,
+            intermediate_files=[
+                get_intermediate_file_name(library, intermediate_format)
+                for library in graph.girs
+                if library not in failed
+            ],
+            failed=stub_failures,
+            fast_path=fast_path,
+            split=split,
+            docstrings=docstrings,
+            jobs=jobs
+        )
+        failed.extend(path.splitext(file_name)[0] for file_name in stub_failures)
+    finally:
+        stubs_manifest.save()
+
+    written, unchanged = write_counts.take()
+    return BatchSummary(
+        libraries=len(graph.girs) + len(unresolved),
+        intermediates=len(generated),
+        stubs=len(results),
+        stub_files_written=written,
+        stub_files_unchanged=unchanged,
+        symbols=sum(result.symbols for result in results),
+        failed=failed,
+        seconds=perf_counter() - start
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+from hashlib import sha256
+from os import makedirs, path
+from random import Random
+from typing import NamedTuple
+from xml.sax.saxutils import escape, quoteattr
+
+
+# Synthetic GIRs used by the benchmarks, so that they run offline and on the
+# same input everywhere. They are generated from fixed seeds, so a fixture is
+# byte-identical across runs and machines, and sized after real libraries.
+
+
+class FixtureSpec(NamedTuple):
+    library: str
+    includes: list[str]
+    constants: int
+    enums: int  # Half of them are bitfields
+    members: int  # Per enum
+    aliases: int
+    records: int
+    callbacks: int
+    functions: int
+    interfaces: int
+    classes: int
+    methods: int  # Per class and interface
+    constructors: int  # Per class
+
+
+FIXTURES: dict[str, FixtureSpec] = {
+    'small': FixtureSpec(
+        'BenchSmall-1.0', [], constants=10, enums=4, members=4, aliases=2, records=2,
+        callbacks=2, functions=20, interfaces=1, classes=5, methods=8, constructors=1),
+    # Sized after GLib-2.0
+    'glib': FixtureSpec(
+        'BenchBase-1.0', [], constants=125, enums=45, members=8, aliases=30, records=100,
+        callbacks=40, functions=520, interfaces=4, classes=12, methods=10, constructors=1),
+    # Sized after Gtk-4.0
+    'gtk': FixtureSpec(
+        'BenchWidgets-1.0', ['BenchBase-1.0'], constants=120, enums=150, members=8, aliases=20,
+        records=150, callbacks=60, functions=500, interfaces=40, classes=300, methods=14,
+        constructors=1),
+}
+
+FUNDAMENTAL_TYPES = ['gint', 'guint', 'gboolean', 'gdouble', 'utf8', 'gpointer', 'gsize', 'gint64']
+WORDS = (
+    'the of a widget value returns sets gets object new current default '
+    'list data size name flags emitted when signal property child parent '
+    'whether allocated freed called see also instance type string'
+).split()
+
+_HEADER = '''<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0"
+            xmlns:glib="http://www.gtk.org/introspection/glib/1.0">
+'''
+
+
+def get_fixture_specs(names: list[str]) -> list[FixtureSpec]:
+    """
+    The specs of the given fixtures preceded by the ones they include.
+    """
+    by_library = {spec.library: spec for spec in FIXTURES.values()}
+    specs: list[FixtureSpec] = []
+
+    def add(spec: FixtureSpec):
+        for include in spec.includes:
+            add(by_library[include])
+        if spec not in specs:
+            specs.append(spec)
+
+    for name in names:
+        add(FIXTURES[name])
+    return specs
+
+
+class _GirWriter:
+    def __init__(self, spec: FixtureSpec):
+        self.spec = spec
+        self.ns, self.version = spec.library.split('-')
+        self.prefix = self.ns.lower()
+        self.rng = Random(spec.library)
+        self.lines: list[str] = []
+
+        self.types = list(FUNDAMENTAL_TYPES)
+        self.types += [f'Alias{i}' for i in range(spec.aliases)]
+        self.types += [f'Record{i}' for i in range(spec.records)]
+        self.types += [f'Enum{i}' for i in range(spec.enums)]
+        self.types += [f'Object{i}' for i in range(spec.classes)]
+        for include in spec.includes:
+            include_spec = next(s for s in FIXTURES.values() if s.library == include)
+            include_ns = include.split('-')[0]
+            self.types += [f'{include_ns}.Record{i}' for i in range(include_spec.records)]
+            self.types += [f'{include_ns}.Object{i}' for i in range(include_spec.classes)]
+
+    def write(self, line: str, indent: int):
+        self.lines.append(' ' * indent + line)
+
+    def doc(self, indent: int, sentences: int = 2):
+        if self.rng.random() < 0.2:
+            return
+        text = '\n'.join(
+            ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(4, 14))).capitalize() + '.'
+            for _ in range(self.rng.randint(1, sentences))
+        )
+        self.write(
+            f'<doc xml:space="preserve" filename="{self.prefix}.c" line="{len(self.lines)}">'
+            f'{escape(text)}</doc>', indent)
+
+    def type(self, name: str, indent: int):
+        c_type = ' c:type="void"' if name == 'none' else ''
+        self.write(f'<type name={quoteattr(name)}{c_type}/>', indent)
+
+    def return_value(self, indent: int, type_name: str | None = None):
+        if type_name is None and self.rng.random() < 0.4:
+            type_name = 'none'
+        self.write('<return-value transfer-ownership="none">', indent)
+        self.type(type_name or self.rng.choice(self.types), indent + 2)
+        self.write('</return-value>', indent)
+
+    def parameters(self, indent: int, instance_type: str | None = None):
+        count = self.rng.randint(0, 4)
+        if instance_type is None and count == 0:
+            return
+        self.write('<parameters>', indent)
+        if instance_type is not None:
+            self.write('<instance-parameter name="self" transfer-ownership="none">', indent + 2)
+            self.type(instance_type, indent + 4)
+            self.write('</instance-parameter>', indent + 2)
+        for i in range(count):
+            nullable = ' nullable="1" allow-none="1"' if self.rng.random() < 0.25 else ''
+            self.write(f'<parameter name="arg{i}" transfer-ownership="none"{nullable}>', indent + 2)
+            self.type(self.rng.choice(self.types), indent + 4)
+            self.write('</parameter>', indent + 2)
+        if self.rng.random() < 0.05:
+            self.write('<parameter name="..." transfer-ownership="none">', indent + 2)
+            self.write('<varargs/>', indent + 4)
+            self.write('</parameter>', indent + 2)
+        self.write('</parameters>', indent)
+
+    def callable(self, tag: str, name: str, indent: int, instance_type: str | None = None,
+                 return_type: str | None = None):
+        self.write(f'<{tag} name="{name}" c:identifier="{self.prefix}_{name}">', indent)
+        self.doc(indent + 2)
+        self.return_value(indent + 2, return_type)
+        self.parameters(indent + 2, instance_type)
+        self.write(f'</{tag}>', indent)
+
+    def generate(self) -> str:
+        spec = self.spec
+        self.lines.append(_HEADER.rstrip('\n'))
+        for include in spec.includes:
+            include_ns, include_version = include.split('-')
+            self.write(f'<include name="{include_ns}" version="{include_version}"/>', 2)
+        self.write(
+            f'<namespace name="{self.ns}" version="{self.version}" '
+            f'shared-library="lib{self.prefix}.so" '
+            f'c:identifier-prefixes="{self.ns}" c:symbol-prefixes="{self.prefix}">', 2)
+
+        for i in range(spec.aliases):
+            self.write(f'<alias name="Alias{i}" c:type="{self.ns}Alias{i}">', 4)
+            self.type(self.rng.choice(FUNDAMENTAL_TYPES), 6)
+            self.write('</alias>', 4)
+
+        for i in range(spec.constants):
+            value = self.rng.choice([str(self.rng.randint(0, 1 << 16)), f'constant value {i}'])
+            value_type = 'utf8' if value.startswith('constant') else 'gint'
+            self.write(f'<constant name="CONSTANT_{i}" value={quoteattr(value)}>', 4)
+            self.doc(6, 1)
+            self.type(value_type, 6)
+            self.write('</constant>', 4)
+
+        for i in range(spec.enums):
+            tag = 'bitfield' if i % 2 else 'enumeration'
+            self.write(f'<{tag} name="Enum{i}" c:type="{self.ns}Enum{i}">', 4)
+            self.doc(6)
+            for j in range(spec.members):
+                value = 1 << j if tag == 'bitfield' else j
+                self.write(
+                    f'<member name="member_{j}" value="{value}" '
+                    f'c:identifier="{self.ns.upper()}_ENUM{i}_MEMBER_{j}"/>', 6)
+            self.write(f'</{tag}>', 4)
+
+        for i in range(spec.callbacks):
+            self.write(f'<callback name="Callback{i}" c:type="{self.ns}Callback{i}">', 4)
+            self.return_value(6)
+            self.parameters(6)
+            self.write('</callback>', 4)
+
+        for i in range(spec.records):
+            self.write(f'<record name="Record{i}" c:type="{self.ns}Record{i}">', 4)
+            self.doc(6)
+            self.write('<field name="data" writable="1">', 6)
+            self.type('gpointer', 8)
+            self.write('</field>', 6)
+            for j in range(self.rng.randint(0, 6)):
+                self.callable('method', f'record{i}_method_{j}', 6, f'Record{i}')
+            self.write('</record>', 4)
+
+        for i in range(spec.interfaces):
+            self.write(f'<interface name="Iface{i}" c:type="{self.ns}Iface{i}" '
+                       f'glib:type-name="{self.ns}Iface{i}" '
+                       f'glib:get-type="{self.prefix}_iface{i}_get_type">', 4)
+            self.doc(6)
+            for j in range(spec.methods // 2):
+                self.callable('method', f'iface{i}_method_{j}', 6, f'Iface{i}')
+            self.write('</interface>', 4)
+
+        base = next(
+            (f'{include.split("-")[0]}.Object0' for include in spec.includes), None)
+        for i in range(spec.classes):
+            parent = f'Object{self.rng.randrange(i)}' if i > 0 else base
+            parent_attr = f' parent="{parent}"' if parent is not None else ''
+            abstract = ' abstract="1"' if self.rng.random() < 0.1 else ''
+            self.write(f'<class name="Object{i}" c:type="{self.ns}Object{i}"{parent_attr}{abstract} '
+                       f'glib:type-name="{self.ns}Object{i}" '
+                       f'glib:get-type="{self.prefix}_object{i}_get_type">', 4)
+            self.doc(6, 4)
+            if spec.interfaces > 0:
+                for j in sorted(self.rng.sample(range(spec.interfaces), min(2, spec.interfaces))):
+                    self.write(f'<implements name="Iface{j}"/>', 6)
+            for j in range(spec.constructors):
+                self.callable('constructor', f'object{i}_new' if j == 0 else f'object{i}_new_{j}',
+                              6, return_type=f'Object{i}')
+            for j in range(spec.methods):
+                self.callable('method', f'object{i}_method_{j}', 6, f'Object{i}')
+            self.write('</class>', 4)
+
+        for i in range(spec.functions):
+            self.callable('function', f'function_{i}', 4)
+
+        self.write('</namespace>', 2)
+        self.lines.append('</repository>\n')
+        return '\n'.join(self.lines)
+
+
+def write_fixtures(output_dir: str, names: list[str]) -> dict[str, str]:
+    """
+    Write the GIRs of the given fixtures, and of the ones they include, to
+    output_dir and return their sha256 by library.
+    """
+    makedirs(output_dir, exist_ok=True)
+    digests: dict[str, str] = {}
+    for spec in get_fixture_specs(names):
+        content = _GirWriter(spec).generate().encode()
+        with open(path.join(output_dir, f'{spec.library}.gir'), 'wb') as fp:
+            fp.write(content)
+        digests[spec.library] = sha256(content).hexdigest()
+    return digests
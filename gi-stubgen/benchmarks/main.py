@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime, timezone
+from gc import collect
+from os import cpu_count, path, remove
+from platform import platform, python_version
+from statistics import median
+from subprocess import DEVNULL, PIPE, CalledProcessError, CompletedProcess, check_output, run
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, NamedTuple, Optional, TypedDict
+
+import json
+import sys
+import tracemalloc
+
+from ..json_intermediate.io import read_json, write_json
+from ..json_intermediate.main import (
+    _get_classes, _get_constants, _get_enums, _get_functions, _load_gir_parser)
+from ..json_intermediate.model import IRLib, count_symbols
+from ..json_intermediate.repository_cache import clear_repository_cache
+from ..json_intermediate.streaming import clear_index_cache, stream_intermediate
+from ..json_intermediate.type_table import make_type_table
+from ..manifest import _get_generator_id
+from ..stubs.generator import generate_lib_stub
+from ..stubs.io import write_stub
+from .fixtures import FIXTURES, write_fixtures
+
+
+RESULTS_FORMAT_VERSION = 1
+
+# Entry points timed at startup, e.g. by editor hooks rendering stubs
+STARTUP_MODULES = ['stub_gen', 'batch']
+# Modules that rendering stubs from intermediates must not import
+STARTUP_FORBIDDEN_MODULES = ['gidocgen', 'jinja2']
+# Seconds to import an entry point, interpreter startup excluded
+IMPORT_TIME_BUDGET = 0.15
+
+_PKG_NAME = __package__.split('.')[0]
+# Prints the seconds to import a module and the forbidden modules it loaded
+_STARTUP_SCRIPT = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted({
+    name.split('.')[0] for name in sys.modules
+    if name.split('.')[0] in sys.argv[2:]
+})]))
+'''
+
+
+class StageResult(TypedDict):
+    fixture: str
+    stage: str
+    # Seconds
+    min: float
+    median: float
+    # Bytes allocated at the peak of one run, as traced by tracemalloc
+    peak_memory: int
+
+
+class Stage(NamedTuple):
+    name: str
+    run: Callable[[], Any]
+    # Run before each run of the stage, untimed
+    setup: Optional[Callable[[], Any]] = None
+
+
+def main():
+    parser = ArgumentParser(
+        description='Benchmark the GIR to intermediate to stub pipeline on synthetic fixtures.')
+    parser.add_argument('--fixture', action='append', choices=list(FIXTURES),
+                        help='fixtures to benchmark, all of them by default')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timed runs of each stage')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='compare with the results of a previous run')
+    parser.add_argument('--max-slowdown', type=float,
+                        help='exit with an error if a stage median is slower than the compared '
+                             'one by more than this ratio, e.g. 1.2')
+    parser.add_argument('--fixtures-dir',
+                        help='keep the generated fixtures in this directory')
+    parser.add_argument('--max-import-time', type=float, default=IMPORT_TIME_BUDGET,
+                        help='exit with an error if importing an entry point takes longer, in '
+                             f'seconds, {IMPORT_TIME_BUDGET} by default')
+    args = parser.parse_args()
+
+    fixtures = args.fixture or list(FIXTURES)
+    if args.fixtures_dir:
+        results = run_benchmarks(fixtures, args.fixtures_dir, args.repeat)
+    else:
+        with TemporaryDirectory() as fixtures_dir:
+            results = run_benchmarks(fixtures, fixtures_dir, args.repeat)
+
+    print('Benchmarking startup')
+    startup_errors: list[str] = []
+    for module in STARTUP_MODULES:
+        result, forbidden = measure_startup(module, args.repeat)
+        results['results'].append(result)
+        print(f'- {result["stage"]:<28} {result["median"] * 1000:10.2f} ms')
+        if len(forbidden) > 0:
+            startup_errors.append(f'{module} imports {", ".join(forbidden)}')
+        if result['min'] > args.max_import_time:
+            startup_errors.append(
+                f'{module} takes {result["min"] * 1000:.1f} ms to import, above '
+                f'{args.max_import_time * 1000:.1f} ms, slowest imports: '
+                + ', '.join(get_slowest_imports(module)))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+        print(f'\nWrote {args.output}')
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        slowdown = compare_results(baseline, results)
+        if args.max_slowdown is not None and slowdown > args.max_slowdown:
+            print(f'\nSlowest stage is {slowdown:.2f}x slower, above {args.max_slowdown:.2f}x')
+            sys.exit(1)
+
+    if len(startup_errors) > 0:
+        print()
+        for error in startup_errors:
+            print(f'- Startup: {error}')
+        sys.exit(1)
+
+
+def _get_revision() -> Optional[str]:
+    try:
+        return check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=path.dirname(__file__), stderr=DEVNULL, text=True
+        ).strip()
+    except (OSError, CalledProcessError):
+        return None
+
+
+def measure(fixture: str, stage: Stage, repeat: int) -> StageResult:
+    # The first run warms up the caches that every later run relies on, e.g.
+    # the compiled templates
+    if stage.setup is not None:
+        stage.setup()
+    stage.run()
+
+    timings: list[float] = []
+    for _ in range(repeat):
+        if stage.setup is not None:
+            stage.setup()
+        collect()
+        start = perf_counter()
+        stage.run()
+        timings.append(perf_counter() - start)
+
+    # Tracing slows allocations down, so memory is measured on its own run
+    if stage.setup is not None:
+        stage.setup()
+    collect()
+    tracemalloc.start()
+    try:
+        stage.run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'fixture': fixture,
+        'stage': stage.name,
+        'min': min(timings),
+        'median': median(timings),
+        'peak_memory': peak_memory
+    }
+
+
+def _run_python(args: list[str]) -> 'CompletedProcess[str]':
+    # The package is imported the way the scripts run it, from its parent
+    # directory, in a fresh interpreter
+    return run(
+        [sys.executable, *args],
+        cwd=path.dirname(path.dirname(path.dirname(path.abspath(__file__)))),
+        stdout=PIPE, stderr=PIPE, text=True, check=True
+    )
+
+
+def measure_startup(module: str, repeat: int) -> tuple[StageResult, list[str]]:
+    """
+    Time the import of an entry point, e.g. stub_gen, in fresh interpreters
+    and return the forbidden modules it loads, see STARTUP_FORBIDDEN_MODULES.
+    """
+    timings: list[float] = []
+    forbidden: list[str] = []
+    # The first run compiles the bytecode of the package
+    for _ in range(repeat + 1):
+        elapsed, forbidden = json.loads(_run_python(
+            ['-c', _STARTUP_SCRIPT, f'{_PKG_NAME}.{module}', *STARTUP_FORBIDDEN_MODULES]).stdout)
+        timings.append(elapsed)
+    timings = timings[1:]
+    return {
+        'fixture': 'startup',
+        'stage': f'import_{module}',
+        'min': min(timings),
+        'median': median(timings),
+        'peak_memory': 0
+    }, forbidden
+
+
+def get_slowest_imports(module: str, count: int = 5) -> list[str]:
+    # As reported by -X importtime, by their own time, without their imports
+    module_name = f'{_PKG_NAME}.{module}'
+    lines = _run_python([
+        '-X', 'importtime', '-c', f'import importlib; importlib.import_module({module_name!r})'
+    ]).stderr.splitlines()
+    imports: list[tuple[int, str]] = []
+    for line in lines[1:]:
+        self_time, _, name = line.removeprefix('import time:').split('|')
+        imports.append((int(self_time), name.strip()))
+    return [f'{name} ({self_time / 1000:.1f} ms)' for self_time, name in sorted(imports, reverse=True)[:count]]
+
+
+def _get_stages(
+    library: str,
+    fixtures_dir: str,
+    output_dir: str,
+    executor: Executor
+) -> tuple[IRLib, list[Stage]]:
+    gir_path = path.join(fixtures_dir, f'{library}.gir')
+    name, version = library.split('-')
+
+    def load():
+        # Parse from scratch, includes too, instead of hitting the cache
+        clear_repository_cache()
+        return _load_gir_parser(gir_path, [fixtures_dir])
+
+    def stream():
+        clear_index_cache()
+        return stream_intermediate(library, fixtures_dir, 'gi.repository', [fixtures_dir])
+
+    repo = load()
+    type_table = make_type_table(repo)
+    data = IRLib(
+        library=library,
+        library_path=gir_path,
+        name=name,
+        version=version,
+        package='gi.repository',
+        imports=tuple(repo.includes.keys()),
+        import_girs=tuple(lib.girfile or '' for lib in repo.includes.values()),
+        docstring='',
+        constants=tuple(_get_constants(repo)),
+        functions=tuple(_get_functions(repo, type_table)),
+        classes=tuple(_get_classes(repo, type_table)),
+        enums=tuple(_get_enums(repo))
+    )
+    json_path = write_json(data, output_dir)
+    stub_path = path.join(output_dir, f'{name}.pyi')
+
+    def remove_stub():
+        # Stubs that did not change are not written again, see write_stub()
+        if path.exists(stub_path):
+            remove(stub_path)
+
+    return data, [
+        Stage('load_gir_parser', load),
+        Stage('type_table', lambda: make_type_table(repo)),
+        Stage('get_constants', lambda: _get_constants(repo)),
+        Stage('get_enums', lambda: _get_enums(repo)),
+        Stage('get_functions', lambda: _get_functions(repo, type_table)),
+        Stage('get_classes', lambda: _get_classes(repo, type_table)),
+        Stage('stream_intermediate', stream),
+        Stage('write_json', lambda: write_json(data, output_dir)),
+        Stage('read_json', lambda: read_json(json_path)),
+        Stage('generate_lib_stub', lambda: generate_lib_stub(data)),
+        Stage('generate_lib_stub_fast_path', lambda: generate_lib_stub(data, fast_path=True)),
+        Stage('generate_lib_stub_parallel', lambda: generate_lib_stub(data, executor=executor)),
+        Stage('write_stub', lambda: write_stub(data, output_dir), remove_stub),
+        Stage('write_stub_unchanged', lambda: write_stub(data, output_dir)),
+    ]
+
+
+def run_benchmarks(fixtures: list[str], fixtures_dir: str, repeat: int) -> dict[str, Any]:
+    digests = write_fixtures(fixtures_dir, fixtures)
+
+    fixture_info: dict[str, Any] = {}
+    results: list[StageResult] = []
+    # Renders the units of large libraries, see generate_lib_stub_chunks()
+    with TemporaryDirectory() as output_dir, ProcessPoolExecutor(cpu_count()) as executor:
+        for fixture in fixtures:
+            library = FIXTURES[fixture].library
+            print(f'Benchmarking {fixture} ({library})')
+            data, stages = _get_stages(library, fixtures_dir, output_dir, executor)
+            for stage in stages:
+                result = measure(fixture, stage, repeat)
+                results.append(result)
+                print(
+                    f'- {stage.name:<28} {result["median"] * 1000:10.2f} ms'
+                    f' {result["peak_memory"] / 1024:12.1f} KiB'
+                )
+            fixture_info[fixture] = {
+                'library': library,
+                'symbols': count_symbols(data),
+            }
+    clear_repository_cache()
+
+    return {
+        'format': RESULTS_FORMAT_VERSION,
+        'meta': {
+            'revision': _get_revision(),
+            'generator': _get_generator_id(),
+            'python': python_version(),
+            'platform': platform(),
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'repeat': repeat,
+            # The fixtures are part of the comparison, as the input of each stage
+            'fixture_digests': digests,
+        },
+        'fixtures': fixture_info,
+        'results': results,
+    }
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any]) -> float:
+    """
+    Print how the current results changed from the baseline ones and return
+    the largest slowdown ratio of a stage median.
+    """
+    print(
+        f'\nComparing with {baseline["meta"].get("revision") or "baseline"} '
+        f'({baseline["meta"]["date"]})'
+    )
+    baseline_digests = baseline['meta']['fixture_digests']
+    for library, digest in current['meta']['fixture_digests'].items():
+        if library in baseline_digests and baseline_digests[library] != digest:
+            print(f'- Warning: {library} differs from the baseline fixture')
+
+    baseline_results = {
+        (result['fixture'], result['stage']): result
+        for result in baseline['results']
+    }
+    slowdown = 0.0
+    for result in current['results']:
+        old = baseline_results.get((result['fixture'], result['stage']))
+        if old is None:
+            continue
+        time_ratio = result['median'] / max(old['median'], 1e-9)
+        memory_ratio = result['peak_memory'] / max(old['peak_memory'], 1)
+        slowdown = max(slowdown, time_ratio)
+        print(
+            f'- {result["fixture"]:<6} {result["stage"]:<28} '
+            f'time {time_ratio:6.2f}x  memory {memory_ratio:6.2f}x'
+        )
+    return slowdown
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+from typing import NamedTuple, Optional
+
+from .gir_index import GirIndex
+
+
+class IncludeGraph(NamedTuple):
+    # Library (e.g. Gtk-3.0) => path of its GIR, or of its typelib
+    girs: dict[str, str]
+    # Library => libraries it includes
+    includes: dict[str, list[str]]
+    # Included libraries without a GIR in the search paths
+    missing: list[str]
+
+
+def find_gir(library: str, gir_dirs: list[str], extension: str = 'gir') -> Optional[str]:
+    gir = GirIndex(gir_dirs, extension).find(library)
+    return gir.path if gir is not None else None
+
+
+def resolve_include_graph(
+    libraries: list[str],
+    gir_dirs: list[str],
+    extension: str = 'gir'
+) -> IncludeGraph:
+    """
+    Resolve the include closure of the given libraries from the index of the
+    GIR files, or of the typelibs, see gir_index.py.
+    """
+    index = GirIndex(gir_dirs, extension)
+    graph = IncludeGraph(girs={}, includes={}, missing=[])
+    pending = list(libraries)
+    while len(pending) > 0:
+        library = pending.pop()
+        if library in graph.girs or library in graph.missing:
+            continue
+
+        gir = index.libraries.get(library)
+        if gir is None:
+            graph.missing.append(library)
+            continue
+
+        graph.girs[library] = gir.path
+        graph.includes[library] = index.get_includes(library)
+        pending.extend(graph.includes[library])
+
+    return graph
+
+
+def get_dependents(graph: IncludeGraph) -> dict[str, list[str]]:
+    dependents: dict[str, list[str]] = {library: [] for library in graph.girs}
+    for library, includes in graph.includes.items():
+        for include in includes:
+            if include in dependents:
+                dependents[include].append(library)
+    return dependents
+
+
+def get_include_closure(graph: IncludeGraph, library: str) -> set[str]:
+    """
+    Return the library and every library it includes, directly or not.
+    """
+    closure: set[str] = set()
+    pending = [library]
+    while len(pending) > 0:
+        current = pending.pop()
+        if current not in closure:
+            closure.add(current)
+            pending.extend(graph.includes.get(current, []))
+    return closure
+
+
+def get_missing_includes(graph: IncludeGraph, library: str) -> list[str]:
+    """
+    Return the libraries a library includes, directly or not, that have no
+    GIR in the graph.
+    """
+    return sorted(include for include in get_include_closure(graph, library) if include in graph.missing)
+
+
+def get_build_order(graph: IncludeGraph) -> list[str]:
+    """
+    Libraries of the graph, sorted so that every library comes after its
+    includes.
+    """
+    order: list[str] = []
+    visited: set[str] = set()
+
+    def visit(library: str):
+        if library in visited or library not in graph.girs:
+            return
+        visited.add(library)
+        for include in graph.includes[library]:
+            visit(include)
+        order.append(library)
+
+    for library in sorted(graph.girs):
+        visit(library)
+    return order
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from os import environ, getpid, listdir, makedirs, path, pathsep, replace, stat
+from typing import Any, NamedTuple, Optional
+
+import json
+
+from .utils import get_cache_dir, read_gir_includes
+
+
+INDEX_FILE_NAME = 'gir-index.json'
+# Bump whenever the format changes, the index is then rebuilt
+INDEX_VERSION = 1
+GIR_DIR_NAME = 'gir-1.0'
+
+
+class IndexedGir(NamedTuple):
+    # e.g. Gtk-3.0
+    library: str
+    namespace: str
+    version: str
+    # GIR, or typelib, of the library
+    path: str
+    # (name, version) includes, in document order, version being '' if
+    # unspecified
+    includes: list[tuple[str, str]]
+
+
+def get_gir_dirs() -> list[str]:
+    """
+    Directories where GIRs are installed, in order of precedence: the ones of
+    GI_GIRPATH, then the gir-1.0 directories of the XDG data directories,
+    like g-ir-scanner.
+    """
+    data_dirs = [environ.get('XDG_DATA_HOME', path.expanduser('~/.local/share'))]
+    data_dirs += environ.get('XDG_DATA_DIRS', '/usr/local/share:/usr/share').split(pathsep)
+    gir_dirs = [gir_dir for gir_dir in environ.get('GI_GIRPATH', '').split(pathsep) if gir_dir]
+    gir_dirs += [path.join(data_dir, GIR_DIR_NAME) for data_dir in data_dirs if data_dir]
+    gir_dirs.append(path.join('/usr/share', GIR_DIR_NAME))
+
+    unique_dirs: list[str] = []
+    for gir_dir in gir_dirs:
+        if path.isdir(gir_dir) and gir_dir not in unique_dirs:
+            unique_dirs.append(gir_dir)
+    return unique_dirs
+
+
+def get_version_key(version: str) -> tuple[tuple[int, str], ...]:
+    # Numerically, e.g. 10.0 after 9.0
+    return tuple(
+        (int(part), '') if part.isdigit() else (-1, part)
+        for part in version.split('.')
+    )
+
+
+def _read_includes(file_path: str, extension: str) -> list[tuple[str, str]]:
+    if extension == 'typelib':
+        from .json_intermediate.typelib import read_typelib_dependencies
+        return [
+            (name, version) for name, _, version in
+            (library.rpartition('-') for library in read_typelib_dependencies(file_path))
+        ]
+    return read_gir_includes(file_path)
+
+
+def _load_cache(cache_path: str) -> dict[str, Any]:
+    try:
+        with open(cache_path) as fp:
+            cache = json.load(fp)
+        if cache.get('version') == INDEX_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {'version': INDEX_VERSION}
+
+
+def _save_cache(cache: dict[str, Any], cache_path: str):
+    # Best effort, e.g. with a read-only cache directory
+    tmp_path = f'{cache_path}.{getpid()}.tmp'
+    try:
+        makedirs(path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'w') as fp:
+            json.dump(cache, fp)
+        replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+class GirIndex:
+    """
+    Index of the GIRs, or typelibs, of the given directories, mapping every
+    namespace to its versions and every library to its file and includes,
+    read from the headers only. The includes are kept in a cache validated
+    by mtime, and directories are only listed again when they changed.
+    """
+
+    def __init__(
+        self,
+        search_dirs: list[str],
+        extension: str = 'gir',
+        cache_path: Optional[str] = None
+    ):
+        self.search_dirs = search_dirs
+        self.extension = extension
+        self.cache_path = cache_path if cache_path is not None \
+            else path.join(get_cache_dir(), INDEX_FILE_NAME)
+        # The first directories take precedence
+        self.libraries: dict[str, IndexedGir] = {}
+        self.namespaces: dict[str, dict[str, IndexedGir]] = {}
+        self._lower_case: dict[str, str] = {}
+
+        cache = _load_cache(self.cache_path)
+        cached_dirs: dict[str, Any] = cache.setdefault(extension, {})
+        changed = False
+        for search_dir in search_dirs:
+            dir_changed = self._index_dir(search_dir, cached_dirs)
+            changed = changed or dir_changed
+        if changed:
+            _save_cache(cache, self.cache_path)
+
+    def _index_dir(self, search_dir: str, cached_dirs: dict[str, Any]) -> bool:
+        real_dir = path.realpath(search_dir)
+        try:
+            dir_mtime_ns = stat(real_dir).st_mtime_ns
+        except OSError:
+            return False
+        cached = cached_dirs.get(real_dir, {'mtime_ns': None, 'files': {}})
+        cached_files: dict[str, Any] = cached['files']
+        # Files were added or removed only if the directory changed
+        if cached['mtime_ns'] == dir_mtime_ns:
+            file_names = sorted(cached_files)
+        else:
+            file_names = sorted(
+                file_name for file_name in listdir(real_dir)
+                if file_name.endswith(f'.{self.extension}')
+            )
+        changed = cached['mtime_ns'] != dir_mtime_ns
+
+        files: dict[str, Any] = {}
+        for file_name in file_names:
+            file_path = path.join(real_dir, file_name)
+            try:
+                file_stat = stat(file_path)
+                entry = cached_files.get(file_name)
+                if entry is None or entry[:2] != [file_stat.st_mtime_ns, file_stat.st_size]:
+                    entry = [file_stat.st_mtime_ns, file_stat.st_size, [
+                        list(include) for include in _read_includes(file_path, self.extension)
+                    ]]
+                    changed = True
+            except (OSError, ValueError) as e:
+                print(f'- Could not index {file_path}: {e}')
+                changed = True
+                continue
+            files[file_name] = entry
+            self._add(search_dir, file_name, [(name, version) for name, version in entry[2]])
+        cached_dirs[real_dir] = {'mtime_ns': dir_mtime_ns, 'files': files}
+        return changed
+
+    def _add(self, search_dir: str, file_name: str, includes: list[tuple[str, str]]):
+        library = file_name[:-len(self.extension) - 1]
+        if library in self.libraries:
+            return
+        namespace, _, version = library.rpartition('-')
+        if not namespace:
+            namespace, version = library, ''
+        gir = IndexedGir(library, namespace, version, path.join(search_dir, file_name), includes)
+        self.libraries[library] = gir
+        self.namespaces.setdefault(namespace, {})[version] = gir
+        self._lower_case.setdefault(library.lower(), library)
+        self._lower_case.setdefault(namespace.lower(), namespace)
+
+    def get_versions(self, namespace: str) -> list[str]:
+        """
+        Return the versions of a namespace, latest first.
+        """
+        return sorted(self.namespaces.get(namespace, {}), key=get_version_key, reverse=True)
+
+    def resolve(self, name: str, version: str = '') -> Optional[IndexedGir]:
+        """
+        Find a library by namespace and version, or by namespace alone, e.g.
+        Gtk, in which case its latest version is used. Names are matched
+        regardless of case if there is no exact match.
+        """
+        name = name if name in self.namespaces else self._lower_case.get(name.lower(), name)
+        versions = self.namespaces.get(name, {})
+        if version:
+            return versions.get(version)
+        latest = self.get_versions(name)
+        return versions[latest[0]] if len(latest) > 0 else None
+
+    def find(self, library: str) -> Optional[IndexedGir]:
+        """
+        Find a library, e.g. Gtk-3.0, or the latest version of a namespace,
+        e.g. Gtk.
+        """
+        gir = self.libraries.get(library)
+        if gir is not None:
+            return gir
+        lower_case = self._lower_case.get(library.lower())
+        if lower_case in self.libraries:
+            return self.libraries[lower_case]
+        namespace, _, version = library.rpartition('-')
+        if namespace in self.namespaces or namespace.lower() in self._lower_case:
+            return self.resolve(namespace, version)
+        return self.resolve(library)
+
+    def get_includes(self, library: str) -> list[str]:
+        """
+        Return the libraries a library includes, with the latest version of
+        the includes without one. Missing includes are kept as declared.
+        """
+        gir = self.libraries[library]
+        includes: list[str] = []
+        for name, version in gir.includes:
+            include = self.resolve(name, version)
+            if include is not None:
+                includes.append(include.library)
+            else:
+                includes.append(f'{name}-{version}' if version else name)
+        return includes
+
+
+def main():
+    parser = ArgumentParser(
+        description='List the namespaces, versions and includes of the indexed GIRs.')
+    parser.add_argument('names', nargs='*',
+                        help='libraries or namespaces to show, e.g. Gtk-3.0 or Gtk, all by default')
+    parser.add_argument('--dir', action='append',
+                        help='directories to index, the GIR directories of GI_GIRPATH and '
+                             'XDG_DATA_DIRS by default')
+    parser.add_argument('--typelib', action='store_true',
+                        help='index typelibs instead of GIRs')
+    args = parser.parse_args()
+
+    if args.typelib:
+        from .json_intermediate.typelib import get_typelib_dirs
+        search_dirs = args.dir or get_typelib_dirs()
+    else:
+        search_dirs = args.dir or get_gir_dirs()
+    index = GirIndex(search_dirs, 'typelib' if args.typelib else 'gir')
+
+    if len(args.names) == 0:
+        for namespace in sorted(index.namespaces):
+            print(f'{namespace}: {", ".join(index.get_versions(namespace))}')
+        return
+    for name in args.names:
+        gir = index.find(name)
+        if gir is None:
+            print(f'- Could not find {name}')
+            continue
+        print(f'{gir.library}: {gir.path}')
+        print(f'  Includes: {", ".join(index.get_includes(gir.library))}')
+
+
+if __name__ == '__main__':
+    main()
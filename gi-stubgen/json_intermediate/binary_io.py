@@ -0,0 +1,146 @@
+from mmap import mmap, ACCESS_READ
+from os import makedirs, path, replace
+from struct import Struct
+from typing import Any
+
+import json
+
+
+from .docstring_store import (
+    DOCSTRING_STORE_FILE_NAME, LIB_SECTIONS, DocstringStore, get_docstring_resolver,
+    get_section_docstring_ids, map_section_docstrings, resolve_lib_docstrings)
+from .model import IRLib
+from .types import JSONIntermediateLib
+
+
+# Layout of a binary intermediate:
+#
+#   magic | format version | index length | index | sections...
+#
+# The index is the offset table of the sections: {name: [offset, length]},
+# with offsets relative to the start of the file. Every section is a compact
+# JSON document, so that each one can be decoded on its own. Docstrings are
+# ids in the docstring store of the directory, see docstring_store.py.
+BINARY_MAGIC = b'GISB'
+BINARY_FORMAT_VERSION = 2
+BINARY_EXTENSION = '.bin'
+
+_PREAMBLE = Struct('<4sII')
+
+HEADER_SECTION = 'header'
+
+
+def _encode(section: Any) -> bytes:
+    return json.dumps(section, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def write_binary(data: IRLib, output_dir: str, store: DocstringStore) -> str:
+    if not path.isdir(output_dir):
+        makedirs(output_dir)
+
+    # Sections are converted in place, which is fine on a fresh dict
+    lib_dict = data.to_dict()
+    header = {
+        key: value for key, value in lib_dict.items()
+        if key not in LIB_SECTIONS
+    }
+    header['docstring'] = store.add(header['docstring'])
+    header['docstringStore'] = DOCSTRING_STORE_FILE_NAME
+    sections: dict[str, bytes] = {HEADER_SECTION: _encode(header)}
+    for name in LIB_SECTIONS:
+        sections[name] = _encode(map_section_docstrings(name, lib_dict[name], store.add))
+
+    # The index size depends on the offsets, so lay the sections out relative
+    # to the end of the index and shift them once the index is encoded
+    relative_index: dict[str, list[int]] = {}
+    offset = 0
+    for name, section in sections.items():
+        relative_index[name] = [offset, len(section)]
+        offset += len(section)
+
+    index_size = len(_encode(relative_index))
+    while True:
+        start = _PREAMBLE.size + index_size
+        index = _encode({
+            name: [start + section_offset, length]
+            for name, (section_offset, length) in relative_index.items()
+        })
+        if len(index) == index_size:
+            break
+        index_size = len(index)
+
+    file_path = path.join(output_dir, data.library + BINARY_EXTENSION)
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as fp:
+        fp.write(_PREAMBLE.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION, len(index)))
+        fp.write(index)
+        for section in sections.values():
+            fp.write(section)
+    replace(tmp_path, file_path)
+    return file_path
+
+
+class BinaryIntermediate:
+    """
+    Memory-mapped binary intermediate, decoding each section only when it
+    is first accessed.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, 'rb') as fp:
+            self._buffer = mmap(fp.fileno(), 0, access=ACCESS_READ)
+
+        magic, version, index_size = _PREAMBLE.unpack_from(self._buffer)
+        if magic != BINARY_MAGIC or version != BINARY_FORMAT_VERSION:
+            self.close()
+            raise ValueError(f'{file_path} is not a binary intermediate')
+
+        self.index: dict[str, list[int]] = json.loads(
+            self._buffer[_PREAMBLE.size:_PREAMBLE.size + index_size])
+        self._sections: dict[str, Any] = {}
+
+    def __enter__(self) -> 'BinaryIntermediate':
+        return self
+
+    def __exit__(self, *_: Any):
+        self.close()
+
+    def close(self):
+        self._buffer.close()
+
+    def _decode(self, name: str) -> Any:
+        offset, length = self.index[name]
+        return json.loads(self._buffer[offset:offset + length])
+
+    def section(self, name: str) -> Any:
+        if name not in self._sections:
+            self._sections[name] = self._decode(name)
+        return self._sections[name]
+
+    def load_section(self, name: str, docstrings: str = 'full') -> Any:
+        """
+        Decode a section with its docstrings in the given mode, see
+        DOCSTRING_MODES.
+        """
+        section = self._decode(name)
+        store_path = path.join(
+            path.dirname(self.file_path), self.section(HEADER_SECTION)['docstringStore'])
+        resolve = get_docstring_resolver(
+            get_section_docstring_ids(name, section) if docstrings != 'none' else [],
+            store_path, docstrings)
+        return map_section_docstrings(name, section, resolve)
+
+    def load_dict(self, docstrings: str = 'full') -> JSONIntermediateLib:
+        data = self._decode(HEADER_SECTION)
+        for name in LIB_SECTIONS:
+            data[name] = self._decode(name)
+        return resolve_lib_docstrings(data, path.dirname(self.file_path), docstrings)
+
+    def load(self, docstrings: str = 'full') -> IRLib:
+        return IRLib.from_dict(self.load_dict(docstrings))
+
+
+def read_binary(file_path: str, docstrings: str = 'full') -> IRLib:
+    with BinaryIntermediate(file_path) as intermediate:
+        return intermediate.load(docstrings)
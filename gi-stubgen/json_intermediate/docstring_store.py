@@ -0,0 +1,173 @@
+from hashlib import blake2b
+from os import path
+from typing import Any, Callable, Iterable, Optional
+
+import sqlite3
+
+
+# Docstrings are most of the size of an intermediate, and many are repeated
+# within and across libraries, e.g. the ones of inherited methods. They are
+# kept in a content-addressed store shared by the intermediates of a
+# directory, which reference them by id, the empty docstring being ''.
+DOCSTRING_STORE_FILE_NAME = '.docstrings.sqlite'
+# full renders docstrings as they are, summary only their first paragraph and
+# none leaves them out without loading them
+DOCSTRING_MODES = ('full', 'summary', 'none')
+LIB_SECTIONS = ['constants', 'enums', 'functions', 'classes']
+
+# Ids per query, below the SQLite limit of variables
+_QUERY_SIZE = 500
+
+
+def get_docstring_id(docstring: str) -> str:
+    if len(docstring) == 0:
+        return ''
+    return blake2b(docstring.encode(), digest_size=12).hexdigest()
+
+
+def get_docstring_store_path(intermediate_dir: str) -> str:
+    return path.join(intermediate_dir, DOCSTRING_STORE_FILE_NAME)
+
+
+def summarize(docstring: str) -> str:
+    return docstring.strip().split('\n\n', 1)[0]
+
+
+def map_section_docstrings(section_name: str, section: list[Any], convert: Callable[[str], str]) -> list[Any]:
+    """
+    Convert in place the docstrings of a section of an intermediate, e.g.
+    its classes.
+    """
+    for item in section:
+        item['docstring'] = convert(item['docstring'])
+        if section_name == 'enums':
+            for member in item['members']:
+                member['docstring'] = convert(member['docstring'])
+        elif section_name == 'classes':
+            for fun in item['constructors']:
+                fun['docstring'] = convert(fun['docstring'])
+            for fun in item['methods']:
+                fun['docstring'] = convert(fun['docstring'])
+    return section
+
+
+def get_section_docstring_ids(section_name: str, section: list[Any]) -> list[str]:
+    docstring_ids: list[str] = []
+
+    def collect(docstring_id: str) -> str:
+        docstring_ids.append(docstring_id)
+        return docstring_id
+
+    map_section_docstrings(section_name, section, collect)
+    return docstring_ids
+
+
+def map_lib_docstrings(lib_dict: Any, convert: Callable[[str], str]) -> Any:
+    lib_dict['docstring'] = convert(lib_dict['docstring'])
+    for name in LIB_SECTIONS:
+        map_section_docstrings(name, lib_dict[name], convert)
+    return lib_dict
+
+
+class DocstringStore:
+    """
+    SQLite store of docstrings by id. Added docstrings are written on
+    flush(), and the database is only opened when used.
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pending: dict[str, str] = {}
+
+    def __enter__(self) -> 'DocstringStore':
+        return self
+
+    def __exit__(self, exc_type: Any, *_: Any):
+        if exc_type is None:
+            self.flush()
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.store_path, timeout=30)
+            # Worker processes add docstrings concurrently
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS docstrings (id TEXT PRIMARY KEY, docstring TEXT NOT NULL)')
+        return self._connection
+
+    def add(self, docstring: str) -> str:
+        docstring_id = get_docstring_id(docstring)
+        if docstring_id:
+            self._pending[docstring_id] = docstring
+        return docstring_id
+
+    def flush(self):
+        if len(self._pending) == 0:
+            return
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO docstrings VALUES (?, ?)', self._pending.items())
+        self._pending.clear()
+
+    def get(self, docstring_ids: Iterable[str]) -> dict[str, str]:
+        ids = sorted({docstring_id for docstring_id in docstring_ids if docstring_id})
+        docstrings: dict[str, str] = {}
+        if len(ids) == 0 or not path.exists(self.store_path):
+            return docstrings
+        connection = self._connect()
+        for start in range(0, len(ids), _QUERY_SIZE):
+            chunk = ids[start:start + _QUERY_SIZE]
+            docstrings.update(connection.execute(
+                f'SELECT id, docstring FROM docstrings WHERE id IN ({", ".join("?" * len(chunk))})',
+                chunk))
+        return docstrings
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def get_docstring_resolver(
+    docstring_ids: Iterable[str],
+    store_path: Optional[str],
+    mode: str = 'full'
+) -> Callable[[str], str]:
+    """
+    Return the function converting the given docstring ids to docstrings in
+    the given mode. Without a store, the docstrings are inline instead of ids.
+    """
+    if mode == 'none':
+        return lambda _: ''
+
+    docstrings: Optional[dict[str, str]] = None
+    if store_path is not None:
+        with DocstringStore(store_path) as store:
+            docstrings = store.get(docstring_ids)
+
+    def resolve(docstring: str) -> str:
+        if docstrings is not None:
+            docstring = docstrings.get(docstring, '')
+        return summarize(docstring) if mode == 'summary' else docstring
+
+    return resolve
+
+
+def resolve_lib_docstrings(lib_dict: Any, intermediate_dir: str, mode: str = 'full') -> Any:
+    """
+    Replace in place the docstring ids of an intermediate with its docstrings
+    in the given mode.
+    """
+    store_file_name = lib_dict.pop('docstringStore', None)
+    docstring_ids = [lib_dict['docstring']]
+    if store_file_name is not None and mode != 'none':
+        for name in LIB_SECTIONS:
+            docstring_ids.extend(get_section_docstring_ids(name, lib_dict[name]))
+    return map_lib_docstrings(lib_dict, get_docstring_resolver(
+        docstring_ids,
+        path.join(intermediate_dir, store_file_name) if store_file_name is not None else None,
+        mode
+    ))
@@ -1,20 +1,99 @@
-from os import makedirs, path
+from os import makedirs, path, remove
+from typing import Optional
 
 import json
 
 
-from .types import JSONIntermediateLib
+from ..profiling import profiler
+from .binary_io import BINARY_EXTENSION, read_binary, write_binary
+from .docstring_store import (
+    DOCSTRING_STORE_FILE_NAME, DocstringStore, get_docstring_store_path, map_lib_docstrings,
+    resolve_lib_docstrings, summarize)
+from .model import IRLib
 
 
-def write_json(data: JSONIntermediateLib, output_dir: str) -> str:
+JSON_EXTENSION = '.json'
+INTERMEDIATE_FORMATS = {
+    'json': JSON_EXTENSION,
+    'binary': BINARY_EXTENSION
+}
+
+
+def write_json(data: IRLib, output_dir: str, store: Optional[DocstringStore] = None) -> str:
+    """
+    Write the intermediate of a library, with its docstrings in the given
+    store, or inline without one.
+    """
     if not path.isdir(output_dir):
         makedirs(output_dir)
-    json_file_name = data['library'] + '.json'
+    json_file_name = data.library + '.json'
     json_file_path = path.join(output_dir, json_file_name)
+    lib_dict = data.to_dict()
+    if store is not None:
+        map_lib_docstrings(lib_dict, store.add)
+        lib_dict['docstringStore'] = DOCSTRING_STORE_FILE_NAME
     with open(path.join(output_dir, json_file_name), 'w') as fp:
-        json.dump(data, fp, indent=2)
+        json.dump(lib_dict, fp, indent=2)
     return json_file_path
 
-def read_json(file_path: str) -> JSONIntermediateLib:
+def read_json(file_path: str, docstrings: str = 'full') -> IRLib:
     with open(file_path) as fp:
-        return json.load(fp)
+        lib_dict = json.load(fp)
+    return IRLib.from_dict(resolve_lib_docstrings(lib_dict, path.dirname(file_path), docstrings))
+
+
+def get_intermediate_file_name(library: str, intermediate_format: str = 'json') -> str:
+    return library + INTERMEDIATE_FORMATS[intermediate_format]
+
+
+def get_intermediate_outputs(file_path: str) -> list[str]:
+    # The docstring store is part of every intermediate of its directory, once
+    # a library with docstrings created it
+    store_path = get_docstring_store_path(path.dirname(file_path))
+    return [file_path, store_path] if path.exists(store_path) else [file_path]
+
+
+def is_intermediate_file(file_name: str) -> bool:
+    # Hidden files, such as the build manifest, are not intermediates
+    return not file_name.startswith('.') and path.splitext(file_name)[1] in INTERMEDIATE_FORMATS.values()
+
+
+def write_intermediate(data: IRLib, output_dir: str, intermediate_format: str = 'json') -> str:
+    with profiler.stage(data.library, 'write_intermediate'):
+        # Docstrings are shared by the intermediates of the directory
+        with DocstringStore(get_docstring_store_path(output_dir)) as store:
+            if intermediate_format == 'binary':
+                file_path = write_binary(data, output_dir, store)
+            else:
+                file_path = write_json(data, output_dir, store)
+
+    # Only keep the latest intermediate of a library
+    for other_format in INTERMEDIATE_FORMATS:
+        other_path = path.join(
+            output_dir, get_intermediate_file_name(data.library, other_format))
+        if other_path != file_path and path.exists(other_path):
+            remove(other_path)
+    return file_path
+
+
+def read_intermediate(file_path: str, docstrings: str = 'full') -> IRLib:
+    """
+    Read an intermediate with its docstrings in the given mode, see
+    DOCSTRING_MODES.
+    """
+    library = path.splitext(path.basename(file_path))[0]
+    with profiler.stage(library, 'read_intermediate'):
+        if file_path.endswith(BINARY_EXTENSION):
+            return read_binary(file_path, docstrings)
+        return read_json(file_path, docstrings)
+
+
+def convert_docstrings(data: IRLib, docstrings: str = 'full') -> IRLib:
+    """
+    Return a library extracted in memory with its docstrings in the given
+    mode, like read_intermediate() would.
+    """
+    if docstrings == 'full':
+        return data
+    convert = summarize if docstrings == 'summary' else (lambda _: '')
+    return IRLib.from_dict(map_lib_docstrings(data.to_dict(), convert))
@@ -1,42 +1,59 @@
 
-from gidocgen.gir.ast import Repository, Type, Parameter
-from gidocgen.gir.parser import GirParser
+from typing import TYPE_CHECKING, Optional
 
-from .types import JSONIntermediateLib, LibConstant, LibEnum, LibFunction, LibClass, LibFunctionArg, make_constant, make_enum, make_function, make_class, doc2str
-from .aliased_types import is_aliased_type, get_aliased_matching_type
+from ..gir_index import get_gir_dirs
+from ..profiling import profiler
+from .model import (
+    IRLib, IRConstant, IREnum, IRFunction, IRClass, IRFunctionArg, make_arg, make_constant, make_enum,
+    make_function, make_class, count_symbols)
+from .types import doc2str
+
+# Backends, and gidocgen, are only loaded when a library is extracted with
+# them, so that entry points stay fast when every output is up to date
+if TYPE_CHECKING:
+    from gidocgen.gir.ast import Repository, Type, Parameter
+    from .type_table import TypeTable
 
 
 GIR_DIR = '/usr/share/gir-1.0'
 OUTPUT_DIR = '.intermediate'
+# gidocgen parses the whole GIR, and the GIRs of its includes, to an AST,
+# while streaming reads the GIR incrementally, see streaming.py. typelib reads
+# the compiled typelib instead of the GIR, see typelib.py
+EXTRACTOR_BACKENDS = ('gidocgen', 'streaming', 'typelib')
+
+
+def get_input_extension(backend: str) -> str:
+    return 'typelib' if backend == 'typelib' else 'gir'
+
 
+def get_default_input_dirs(backend: str) -> list[str]:
+    if backend == 'typelib':
+        from .typelib import get_typelib_dirs
+        return get_typelib_dirs()
+    return get_gir_dirs() or [GIR_DIR]
 
-def _load_gir_parser(library_path: str) -> Repository:
-    parser = GirParser([GIR_DIR])
-    parser.parse(library_path)
-    repo = parser.get_repository()
-    assert(repo is not None and repo.namespace is not None)
-    return repo
 
+def _load_gir_parser(library_path: str, search_paths: Optional[list[str]] = None) -> 'Repository':
+    from .repository_cache import load_repository
 
-def _get_type_str(t: Type | None, lib_name: str) -> str:
-    if t is None or t.name is None or t.name == 'None':
-        # We can't infer the type, so we return the most generic type
-        return 'object'
+    # Repositories (and their includes) are parsed once per process
+    return load_repository(library_path, search_paths if search_paths else [GIR_DIR])
 
-    if is_aliased_type(t.name):
-        at = get_aliased_matching_type(t.name)
-        if at == 'None':
-            return 'object'
-        return at
 
-    if t.name.startswith(f"{lib_name}."):
-        # E.g. Gtk.Window => Window
-        return '.'.join(t.name.split('.')[1:])
+def _get_type_str(t: 'Type | None', type_table: 'TypeTable') -> str:
+    return type_table.get_type_str(t)
 
-    return t.name
 
+def _get_local_name(name: str, lib_name: str) -> str:
+    # Resolving other repositories against a cached one qualifies the names
+    # of its classes in place, e.g. Object => GObject.Object
+    if name.startswith(f"{lib_name}."):
+        return name[len(lib_name) + 1:]
+    return name
 
-def _get_constants(repo: Repository) -> list[LibConstant]:
+
+def _get_constants(repo: 'Repository') -> list[IRConstant]:
     if repo.namespace is None:
         return []
 
@@ -51,7 +68,7 @@ def _get_constants(repo: Repository) -> list[LibConstant]:
     ]
 
 
-def _get_enums(repo: Repository) -> list[LibEnum]:
+def _get_enums(repo: 'Repository') -> list[IREnum]:
     if repo.namespace is None:
         return []
 
@@ -74,24 +91,24 @@ def _get_enums(repo: Repository) -> list[LibEnum]:
     ]
 
 
-def _prepare_arg(arg: Parameter, lib_name: str) -> LibFunctionArg:
+def _prepare_arg(arg: 'Parameter', type_table: 'TypeTable') -> IRFunctionArg:
     if arg.name == '...':
-        return {
-            'name': '*args',
-            'type': _get_type_str(arg.target, lib_name),
-            'is_optional': False,
-            'is_nullable': False
-        }
-
-    return {
-        'name': arg.name if arg.name else 'MISSING_NAME',
-        'type': _get_type_str(arg.target, lib_name),
-        'is_optional': arg.optional,
-        'is_nullable': arg.nullable
-    }
-
-
-def _get_functions(repo: Repository, lib_name: str) -> list[LibFunction]:
+        return make_arg(
+            name='*args',
+            type=_get_type_str(arg.target, type_table),
+            is_optional=False,
+            is_nullable=False
+        )
+
+    return make_arg(
+        name=arg.name if arg.name else 'MISSING_NAME',
+        type=_get_type_str(arg.target, type_table),
+        is_optional=arg.optional,
+        is_nullable=arg.nullable
+    )
+
+
+def _get_functions(repo: 'Repository', type_table: 'TypeTable') -> list[IRFunction]:
     if repo.namespace is None:
         return []
 
@@ -99,13 +116,13 @@ def _get_functions(repo: Repository, lib_name: str) -> list[LibFunction]:
         make_function(
             name=fun.name,
             args=[
-                _prepare_arg(arg, lib_name)
+                _prepare_arg(arg, type_table)
                 for arg in fun.parameters
                 if arg.name is not None
             ],
-            return_type=_get_type_str(fun.return_value.target, lib_name)
+            return_type=_get_type_str(fun.return_value.target, type_table)
             if fun.return_value is not None
-            else _get_type_str(None, lib_name),
+            else _get_type_str(None, type_table),
             docstring=doc2str(fun.doc)
         )
         for fun in list(repo.namespace.get_functions())
@@ -113,52 +130,34 @@ def _get_functions(repo: Repository, lib_name: str) -> list[LibFunction]:
     ]
 
 
-def _get_classes(repo: Repository, lib_name: str) -> list[LibClass]:
+def _get_classes(repo: 'Repository', type_table: 'TypeTable') -> list[IRClass]:
     if repo.namespace is None:
         return []
 
-    self_arg: LibFunctionArg = {
-        'name': 'self',
-        'type': '',
-        'is_optional': False,
-        'is_nullable': False
-    }
-
-    cls_arg: LibFunctionArg = {
-        'name': 'cls',
-        'type': '',
-        'is_optional': False,
-        'is_nullable': False
-    }
+    self_arg = make_arg(name='self', type='', is_optional=False, is_nullable=False)
+    cls_arg = make_arg(name='cls', type='', is_optional=False, is_nullable=False)
+    init_args = [
+        self_arg,
+        make_arg(name='*args', type='object', is_optional=False, is_nullable=False),
+        make_arg(name='**kwargs', type='object', is_optional=False, is_nullable=False)
+    ]
 
     return [
         make_class(
-            name=cls.name,
+            name=_get_local_name(cls.name, type_table.lib_name),
             docstring=doc2str(cls.doc),
             is_abstract=cls.abstract,
             inherited_classes=[
-                _get_type_str(cls.parent, lib_name)
+                _get_type_str(cls.parent, type_table)
             ] + [
-                _get_type_str(im, lib_name)
+                _get_type_str(im, type_table)
                 for im in cls.implements
             ],
             constructors=[
                 # __init__
                 make_function(
                     name='__init__',
-                    args=[self_arg] + [
-                        {
-                            'name': '*args',
-                            'type': 'object',
-                            'is_optional': False,
-                            'is_nullable': False
-                        }, {
-                            'name': '**kwargs',
-                            'type': 'object',
-                            'is_optional': False,
-                            'is_nullable': False
-                        }
-                    ],
+                    args=init_args,
                     return_type='None',
                     docstring=''
                 )
@@ -167,13 +166,13 @@ def _get_classes(repo: Repository, lib_name: str) -> list[LibClass]:
                 make_function(
                     name=c.name,
                     args=[cls_arg] + [
-                        _prepare_arg(arg, lib_name)
+                        _prepare_arg(arg, type_table)
                         for arg in c.parameters
                         if arg.name is not None
                     ],
-                    return_type=_get_type_str(c.return_value.target, lib_name)
+                    return_type=_get_type_str(c.return_value.target, type_table)
                     if c.return_value is not None
-                    else f"'{cls.name}'",
+                    else f"'{_get_local_name(cls.name, type_table.lib_name)}'",
                     docstring=doc2str(c.doc)
                 ) for c in cls.constructors
                 if c.name is not None
@@ -182,13 +181,13 @@ def _get_classes(repo: Repository, lib_name: str) -> list[LibClass]:
                 make_function(
                     name=m.name,
                     args=[self_arg] + [
-                        _prepare_arg(arg, lib_name)
+                        _prepare_arg(arg, type_table)
                         for arg in m.parameters
                         if arg.name is not None
                     ],
-                    return_type=_get_type_str(m.return_value.target, lib_name)
+                    return_type=_get_type_str(m.return_value.target, type_table)
                     if m.return_value is not None
-                    else _get_type_str(None, lib_name),
+                    else _get_type_str(None, type_table),
                     docstring=doc2str(m.doc)
                 ) for m in cls.methods
                 if m.name is not None
@@ -198,18 +197,62 @@ def _get_classes(repo: Repository, lib_name: str) -> list[LibClass]:
     ]
 
 
-def generate_intermediate_json(library: str,  library_path: str, package: str = 'gi.repository') -> JSONIntermediateLib:
+def generate_intermediate_json(
+    library: str,
+    library_path: str,
+    package: str = 'gi.repository',
+    search_paths: Optional[list[str]] = None,
+    backend: str = 'gidocgen'
+) -> IRLib:
+    with profiler.stage(library, 'extract') as record:
+        if backend == 'streaming':
+            from .streaming import stream_intermediate
+            print(f'Streaming {library}...', end=' ')
+            data = stream_intermediate(
+                library, library_path, package, search_paths if search_paths else [GIR_DIR])
+            print('Done')
+        elif backend == 'typelib':
+            from .typelib import get_typelib_dirs, typelib_intermediate
+            print(f'Reading the typelib of {library}...', end=' ')
+            data = typelib_intermediate(
+                library, library_path, package,
+                search_paths if search_paths else get_typelib_dirs(), [GIR_DIR])
+            print('Done')
+        else:
+            data = _generate_intermediate_json(library, library_path, package, search_paths)
+        record['symbols'] = count_symbols(data)
+    return data
+
+
+def _generate_intermediate_json(
+    library: str,
+    library_path: str,
+    package: str,
+    search_paths: Optional[list[str]]
+) -> IRLib:
     name, version = library.split('-')
     gir_lib_path = f'{library_path}/{library}.gir'
 
     print(f'Loading parser for {library}...', end=' ')
-    repo: Repository = _load_gir_parser(gir_lib_path)
+    with profiler.stage(library, 'parse'):
+        repo: 'Repository' = _load_gir_parser(gir_lib_path, search_paths)
     print('Done')
 
-    library_constants = _get_constants(repo)
-    library_enums = _get_enums(repo)
-    library_functions = _get_functions(repo, name)
-    library_classes = _get_classes(repo, name)
+    with profiler.stage(library, 'get_constants') as record:
+        library_constants = _get_constants(repo)
+        record['symbols'] = len(library_constants)
+    with profiler.stage(library, 'get_enums') as record:
+        library_enums = _get_enums(repo)
+        record['symbols'] = len(library_enums)
+    with profiler.stage(library, 'type_table'):
+        from .type_table import get_type_table
+        type_table = get_type_table(repo)
+    with profiler.stage(library, 'get_functions') as record:
+        library_functions = _get_functions(repo, type_table)
+        record['symbols'] = len(library_functions)
+    with profiler.stage(library, 'get_classes') as record:
+        library_classes = _get_classes(repo, type_table)
+        record['symbols'] = len(library_classes)
     library_imports = list(repo.includes.keys())
     library_import_girs = [
         lib.girfile if lib.girfile is not None else ''
@@ -265,20 +308,20 @@ def generate_intermediate_json(library: str,  library_path: str, package: str =
     # print(list(repo.namespace.get_classes())[0].parent)
     # exit()
 
-    data: JSONIntermediateLib = {
-        'library': library,
-        'libraryPath': gir_lib_path,
-        'name': name,
-        'version': version,
-        'package': package,
-        'imports': library_imports,
-        'import_girs': library_import_girs,
-        'docstring': '',
-
-        'constants': library_constants,
-        'functions': library_functions,
-        'classes': library_classes,
-        'enums': library_enums
-    }
+    data = IRLib(
+        library=library,
+        library_path=gir_lib_path,
+        name=name,
+        version=version,
+        package=package,
+        imports=tuple(library_imports),
+        import_girs=tuple(library_import_girs),
+        docstring='',
+
+        constants=tuple(library_constants),
+        functions=tuple(library_functions),
+        classes=tuple(library_classes),
+        enums=tuple(library_enums)
+    )
 
     return data
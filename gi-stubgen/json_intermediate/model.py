@@ -0,0 +1,293 @@
+from dataclasses import dataclass
+from sys import intern
+from typing import TYPE_CHECKING
+
+from .types import JSONIntermediateLib, LibConstant, LibEnum, LibFunctionArg, LibFunction, LibClass
+from .utils import infer_type, to_inferred_type
+
+if TYPE_CHECKING:
+    from gidocgen.gir.ast import Member
+
+
+# In-memory intermediate representation (IR) of a library. The classes are
+# immutable and slotted to keep large namespaces small in memory, names and
+# types are interned, and they convert losslessly to and from the JSON
+# intermediate described in types.py.
+
+
+@dataclass(frozen=True, slots=True)
+class IRConstant:
+    name: str
+    value: str | float | int
+    value_type: str
+    docstring: str
+
+    def to_dict(self) -> LibConstant:
+        return {
+            'type': 'constant',
+            'name': self.name,
+            'value': self.value,
+            'value_type': self.value_type,
+            'docstring': self.docstring
+        }
+
+    @classmethod
+    def from_dict(cls, data: LibConstant) -> 'IRConstant':
+        return cls(
+            name=intern(data['name']),
+            value=data['value'],
+            value_type=intern(data['value_type']),
+            docstring=data['docstring']
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class IREnum:
+    name: str
+    docstring: str
+    members: tuple[IRConstant, ...]
+
+    def to_dict(self) -> LibEnum:
+        return {
+            'type': 'enum',
+            'name': self.name,
+            'docstring': self.docstring,
+            'members': [member.to_dict() for member in self.members]
+        }
+
+    @classmethod
+    def from_dict(cls, data: LibEnum) -> 'IREnum':
+        return cls(
+            name=intern(data['name']),
+            docstring=data['docstring'],
+            members=tuple(IRConstant.from_dict(member) for member in data['members'])
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class IRFunctionArg:
+    name: str
+    type: str
+    is_optional: bool  # Optional[type]
+    is_nullable: bool  # Union[type, None]
+
+    def to_dict(self) -> LibFunctionArg:
+        return {
+            'name': self.name,
+            'type': self.type,
+            'is_optional': self.is_optional,
+            'is_nullable': self.is_nullable
+        }
+
+    @classmethod
+    def from_dict(cls, data: LibFunctionArg) -> 'IRFunctionArg':
+        return make_arg(
+            name=data['name'],
+            type=data['type'],
+            is_optional=data['is_optional'],
+            is_nullable=data['is_nullable']
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class IRFunction:
+    name: str
+    docstring: str
+    args: tuple[IRFunctionArg, ...]
+    return_type: str
+
+    def to_dict(self) -> LibFunction:
+        return {
+            'type': 'function',
+            'name': self.name,
+            'docstring': self.docstring,
+            'args': [arg.to_dict() for arg in self.args],
+            'return_type': self.return_type
+        }
+
+    @classmethod
+    def from_dict(cls, data: LibFunction) -> 'IRFunction':
+        return cls(
+            name=intern(data['name']),
+            docstring=data['docstring'],
+            args=tuple(IRFunctionArg.from_dict(arg) for arg in data['args']),
+            return_type=intern(data['return_type'])
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class IRClass:
+    name: str
+    docstring: str
+    inherited_classes: tuple[str, ...]
+    is_abstract: bool
+    constructors: tuple[IRFunction, ...]
+    methods: tuple[IRFunction, ...]
+
+    def to_dict(self) -> LibClass:
+        return {
+            'type': 'class',
+            'name': self.name,
+            'inherited_classes': list(self.inherited_classes),
+            'docstring': self.docstring,
+            'is_abstract': self.is_abstract,
+            'constructors': [c.to_dict() for c in self.constructors],
+            'methods': [m.to_dict() for m in self.methods]
+        }
+
+    @classmethod
+    def from_dict(cls, data: LibClass) -> 'IRClass':
+        return cls(
+            name=intern(data['name']),
+            docstring=data['docstring'],
+            inherited_classes=tuple(intern(c) for c in data['inherited_classes']),
+            is_abstract=data['is_abstract'],
+            constructors=tuple(IRFunction.from_dict(c) for c in data['constructors']),
+            methods=tuple(IRFunction.from_dict(m) for m in data['methods'])
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class IRLib:
+    library: str
+    library_path: str
+    name: str
+    version: str
+    package: str
+    imports: tuple[str, ...]
+    import_girs: tuple[str, ...]
+    docstring: str
+    constants: tuple[IRConstant, ...]
+    functions: tuple[IRFunction, ...]
+    classes: tuple[IRClass, ...]
+    enums: tuple[IREnum, ...]
+
+    def to_dict(self) -> JSONIntermediateLib:
+        return {
+            'library': self.library,
+            'libraryPath': self.library_path,
+            'name': self.name,
+            'version': self.version,
+            'package': self.package,
+            'imports': list(self.imports),
+            'import_girs': list(self.import_girs),
+            'docstring': self.docstring,
+
+            'constants': [c.to_dict() for c in self.constants],
+            'functions': [f.to_dict() for f in self.functions],
+            'classes': [c.to_dict() for c in self.classes],
+            'enums': [e.to_dict() for e in self.enums]
+        }
+
+    @classmethod
+    def from_dict(cls, data: JSONIntermediateLib) -> 'IRLib':
+        return cls(
+            library=data['library'],
+            library_path=data['libraryPath'],
+            name=data['name'],
+            version=data['version'],
+            package=data['package'],
+            imports=tuple(data['imports']),
+            import_girs=tuple(data['import_girs']),
+            docstring=data['docstring'],
+            constants=tuple(IRConstant.from_dict(c) for c in data['constants']),
+            functions=tuple(IRFunction.from_dict(f) for f in data['functions']),
+            classes=tuple(IRClass.from_dict(c) for c in data['classes']),
+            enums=tuple(IREnum.from_dict(e) for e in data['enums'])
+        )
+
+
+# Arguments are mostly repeated, e.g. self, so equal ones are shared
+_ARGS: dict[tuple[str, str, bool, bool], IRFunctionArg] = {}
+
+
+def make_arg(name: str, type: str, is_optional: bool, is_nullable: bool) -> IRFunctionArg:
+    key = (name, type, is_optional, is_nullable)
+    arg = _ARGS.get(key)
+    if arg is None:
+        arg = _ARGS[key] = IRFunctionArg(
+            intern(name), intern(type), is_optional, is_nullable)
+    return arg
+
+
+def make_constant(name: str, value: str, docstring: str = '') -> IRConstant:
+    return IRConstant(
+        name=intern(name),
+        value=to_inferred_type(value),
+        value_type=intern(infer_type(value)),
+        docstring=docstring
+    )
+
+
+def make_enum(name: str, members: list['Member'], docstring: str) -> IREnum:
+    return IREnum(
+        name=intern(name),
+        docstring=docstring,
+        members=tuple(
+            make_constant(
+                name=member.name,
+                value=member.value,
+            )
+            for member in members if member and member.name
+        )
+    )
+
+
+def make_function(
+    name: str,
+    args: list[IRFunctionArg],
+    return_type: str,
+    docstring: str
+) -> IRFunction:
+    return IRFunction(
+        name=intern(name),
+        docstring=docstring,
+        args=tuple(args),
+        return_type=intern(return_type)
+    )
+
+
+def make_class(
+        name: str,
+        is_abstract: bool,
+        inherited_classes: list[str],
+        constructors: list[IRFunction],
+        methods: list[IRFunction],
+        docstring: str
+) -> IRClass:
+    return IRClass(
+        name=intern(name),
+        docstring=docstring,
+        inherited_classes=tuple(intern(c) for c in inherited_classes),
+        is_abstract=is_abstract,
+        constructors=tuple(constructors),
+        methods=tuple(methods)
+    )
+
+
+def count_symbols(lib: IRLib) -> int:
+    return (
+        len(lib.constants)
+        + sum(1 + len(enum.members) for enum in lib.enums)
+        + len(lib.functions)
+        + sum(
+            1 + len(cls.constructors) + len(cls.methods)
+            for cls in lib.classes
+        )
+    )
+
+
+def get_types(lib: IRLib) -> set[str]:
+    """
+    Return the types used by the functions and classes of a library.
+    """
+    types: set[str] = set()
+    functions = list(lib.functions)
+    for cls in lib.classes:
+        types.update(cls.inherited_classes)
+        functions.extend(cls.constructors)
+        functions.extend(cls.methods)
+    for fun in functions:
+        types.add(fun.return_type)
+        types.update(arg.type for arg in fun.args)
+    return types
@@ -0,0 +1,256 @@
+from os import path
+from typing import NamedTuple, Optional
+
+from gidocgen.gir.ast import Include, Repository, Type
+from gidocgen.gir.parser import GirParser
+
+from ..memory import get_memory_budget
+from ..utils import read_gir_includes
+
+
+class CachedRepository(NamedTuple):
+    repository: Repository
+    # Direct includes of the GIR, in document order
+    includes: list[Include]
+    # Types looked up by the parser while this GIR was parsed
+    seen_types: dict[str, list[Type]]
+
+
+# Process-wide caches, keyed by (real GIR path, mtime).
+# Dependencies only went through the parser's light resolution pass, while
+# repositories have been fully resolved as the root of a parse.
+_DEPENDENCY_CACHE: dict[tuple[str, float], CachedRepository] = {}
+_REPOSITORY_CACHE: dict[tuple[str, float], Repository] = {}
+
+# A parsed repository takes about this many times the size of its GIR
+REPOSITORY_SIZE_FACTOR = 3
+# Real GIR path => estimated bytes of its cached repositories, least
+# recently used first
+_SIZES: dict[str, int] = {}
+
+
+def _cache_key(gir_path: str) -> tuple[str, float]:
+    real_path = path.realpath(gir_path)
+    return real_path, path.getmtime(real_path)
+
+
+def get_cached_size() -> int:
+    return sum(_SIZES.values())
+
+
+def _touch(real_path: str):
+    size = _SIZES.pop(real_path, None)
+    if size is None:
+        size = path.getsize(real_path) * REPOSITORY_SIZE_FACTOR
+    _SIZES[real_path] = size
+
+
+def _enforce_budget(keep: Repository):
+    # Past the memory budget, the least recently used repositories are
+    # evicted, but for the one just loaded and its includes, which it holds
+    # anyway. Repositories whose eviction would cascade to them are kept too
+    budget = get_memory_budget()
+    if budget is None:
+        return
+    kept = {
+        path.realpath(repository.girfile)
+        for repository in [keep, *keep.includes.values()]
+        if repository.girfile
+    }
+    while get_cached_size() > budget:
+        for real_path in _SIZES:
+            if real_path in kept:
+                continue
+            evicted = _get_evicted({real_path})
+            if all(key[0] not in kept for key in evicted):
+                _evict(evicted, {real_path})
+                break
+        else:
+            return
+
+
+def _add_types(seen_types: dict[str, list[Type]], fqtn: str, types: list[Type]):
+    known_types = seen_types.setdefault(fqtn, [])
+    known_ids = {id(t) for t in known_types}
+    known_types.extend(t for t in types if id(t) not in known_ids)
+
+
+class CachingGirParser(GirParser):
+    """
+    A GirParser that takes already-parsed dependencies from a process-wide
+    cache instead of re-reading and re-parsing their GIR files.
+    """
+
+    def __init__(self, search_paths: list[str], error: bool = False):
+        # Without error, a missing dependency raises a RuntimeError instead of
+        # exiting, so that only the library including it fails
+        super().__init__(search_paths, error)
+        # One entry per dependency currently being parsed
+        self._recorded_types: list[dict[str, list[Type]]] = []
+
+    def _lookup_type(self, name: str, ctype: Optional[str] = None) -> Type:
+        t = super()._lookup_type(name, ctype)
+        for recorded_types in self._recorded_types:
+            _add_types(recorded_types, t.name, [t])
+        return t
+
+    def _find_dependency(self, include: Include) -> Optional[str]:
+        for base_path in self._search_paths:
+            gir_file = path.join(base_path, include.girfile())
+            if path.isfile(gir_file):
+                return gir_file
+        return None
+
+    def _register_cached(self, cached: CachedRepository):
+        # Register the includes first, so that the order of the dependencies
+        # matches the one of a full parse
+        for include in cached.includes:
+            self._parse_dependency(include)
+
+        for fqtn, types in cached.seen_types.items():
+            _add_types(self._seen_types, fqtn, types)
+            for recorded_types in self._recorded_types:
+                _add_types(recorded_types, fqtn, types)
+
+    def _parse_dependency(self, include: Include) -> None:
+        if self._dependencies.get(include.name, None) is not None:
+            return
+
+        gir_file = self._find_dependency(include)
+        if gir_file is None:
+            # Let the parser report the missing dependency
+            return super()._parse_dependency(include)
+
+        key = _cache_key(gir_file)
+        cached = _DEPENDENCY_CACHE.get(key)
+        if cached is None:
+            self._recorded_types.append({})
+            try:
+                super()._parse_dependency(include)
+            finally:
+                seen_types = self._recorded_types.pop()
+            repository = self._dependencies.get(include.name)
+            if repository is not None:
+                _touch(key[0])
+                _DEPENDENCY_CACHE[key] = CachedRepository(
+                    repository=repository,
+                    includes=[
+                        Include(name, version if version else None)
+                        for name, version in read_gir_includes(gir_file)
+                    ],
+                    seen_types=seen_types
+                )
+            return
+
+        _touch(key[0])
+        self._register_cached(cached)
+        namespace = cached.repository.namespace
+        assert(namespace is not None)
+        self._dependencies[namespace.name] = cached.repository
+
+    def parse_cached(self, gir_path: str, cached: CachedRepository) -> None:
+        """
+        Promote a repository parsed as a dependency to the root of this parser,
+        running the same resolution steps as GirParser.parse.
+        """
+        self._register_cached(cached)
+        repository = cached.repository
+        repository.girfile = gir_path
+        repository.includes = self._dependencies
+        self._repository = repository
+        self._repository.resolve_empty_ctypes(self._seen_types)
+        self._repository.resolve_class_ctype()
+        self._repository.resolve_class_implements()
+        self._repository.resolve_class_ancestors()
+        self._repository.resolve_class_descendants()
+        self._repository.resolve_interface_requires()
+        self._repository.resolve_interface_implementations()
+
+
+def load_repository(gir_path: str, search_paths: list[str]) -> Repository:
+    key = _cache_key(gir_path)
+    repo = _REPOSITORY_CACHE.get(key)
+    if repo is not None:
+        _touch(key[0])
+        return repo
+
+    parser = CachingGirParser(list(search_paths))
+    cached = _DEPENDENCY_CACHE.get(key)
+    if cached is not None:
+        parser.parse_cached(gir_path, cached)
+    else:
+        parser.parse(gir_path)
+    repo = parser.get_repository()
+    assert(repo is not None and repo.namespace is not None)
+    _REPOSITORY_CACHE[key] = repo
+    _touch(key[0])
+    _enforce_budget(keep=repo)
+    return repo
+
+
+def preload_repositories(gir_paths: list[str], search_paths: list[str]):
+    """
+    Parse the given GIRs, in order, as the dependencies of the libraries to
+    load, e.g. before forking workers that inherit them.
+    """
+    parser = CachingGirParser(list(search_paths))
+    for gir_path in gir_paths:
+        name, _, version = path.splitext(path.basename(gir_path))[0].rpartition('-')
+        parser._parse_dependency(Include(name, version))
+
+
+def clear_repository_cache():
+    _DEPENDENCY_CACHE.clear()
+    _REPOSITORY_CACHE.clear()
+    _SIZES.clear()
+
+
+def _get_includes(key: tuple[str, float]) -> set[str]:
+    # Namespaces a cached repository was resolved against
+    if key in _REPOSITORY_CACHE:
+        return set(_REPOSITORY_CACHE[key].includes.keys())
+    return {include.name for include in _DEPENDENCY_CACHE[key].includes}
+
+
+def _get_namespace(key: tuple[str, float]) -> str:
+    cached = _REPOSITORY_CACHE.get(key)
+    repository = cached if cached is not None else _DEPENDENCY_CACHE[key].repository
+    assert(repository.namespace is not None)
+    return repository.namespace.name
+
+
+def evict_repositories(gir_paths: list[str]):
+    """
+    Forget the repositories parsed from the given GIRs, whatever their mtime,
+    and the cached repositories including them, directly or not, as they
+    hold the ones they were resolved against.
+    """
+    real_paths = {path.realpath(gir_path) for gir_path in gir_paths}
+    _evict(_get_evicted(real_paths), real_paths)
+
+
+def _get_evicted(real_paths: set[str]) -> set[tuple[str, float]]:
+    # Keys of the repositories parsed from the given GIRs and of the ones
+    # including them, directly or not
+    keys = set(_DEPENDENCY_CACHE) | set(_REPOSITORY_CACHE)
+    evicted = {key for key in keys if key[0] in real_paths}
+    namespaces = {_get_namespace(key) for key in evicted}
+    while True:
+        including = {
+            key for key in keys - evicted
+            if not _get_includes(key).isdisjoint(namespaces)
+        }
+        if len(including) == 0:
+            break
+        evicted |= including
+        namespaces |= {_get_namespace(key) for key in including}
+    return evicted
+
+
+def _evict(evicted: set[tuple[str, float]], real_paths: set[str]):
+    for key in evicted:
+        _DEPENDENCY_CACHE.pop(key, None)
+        _REPOSITORY_CACHE.pop(key, None)
+        _SIZES.pop(key[0], None)
+    for real_path in real_paths:
+        _SIZES.pop(real_path, None)
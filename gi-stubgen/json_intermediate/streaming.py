@@ -0,0 +1,488 @@
+from os import path
+from sys import intern
+from typing import Iterator, NamedTuple, Optional
+from xml.etree.ElementTree import Element, iterparse
+
+from gidocgen.gir.parser import FUNDAMENTAL_TYPES, GLIB_ALIASES
+
+from ..utils import GIR_CORE_NS, read_gir_header
+from .model import (
+    IRLib, IRClass, IREnum, IRFunction, IRFunctionArg,
+    make_arg, make_class, make_constant, make_function)
+from .repository_cache import _cache_key
+from .type_table import TypeTable, get_array_name
+
+
+# Extracts the intermediate of a library straight from its GIR, reading it
+# incrementally instead of building the gidocgen AST of the library and of all
+# its includes. Each element of the namespace is dropped once extracted, and
+# includes are only read when one of their types is looked up.
+#
+# The output matches the one of the gidocgen backend, so names and types
+# follow the same rules, see gidocgen.gir.parser.
+
+
+GLIB_NS = '{http://www.gtk.org/introspection/glib/1.0}'
+C_TYPE = '{http://www.gtk.org/introspection/c/1.0}type'
+
+NAMESPACE = f'{GIR_CORE_NS}namespace'
+DOC = f'{GIR_CORE_NS}doc'
+TYPE = f'{GIR_CORE_NS}type'
+ARRAY = f'{GIR_CORE_NS}array'
+MEMBER = f'{GIR_CORE_NS}member'
+PARAMETER = f'{GIR_CORE_NS}parameters/{GIR_CORE_NS}parameter'
+RETURN_VALUE = f'{GIR_CORE_NS}return-value'
+IMPLEMENTS = f'{GIR_CORE_NS}implements'
+CONSTRUCTOR = f'{GIR_CORE_NS}constructor'
+METHOD = f'{GIR_CORE_NS}method'
+METHOD_INLINE = f'{GIR_CORE_NS}method-inline'
+
+# Tags of the types that functions can be moved to, see resolve_moved_to
+_REAL_TYPE_TAGS = {
+    f'{GIR_CORE_NS}{tag}' for tag in (
+        'alias', 'callback', 'constant', 'class', 'interface', 'record', 'union')
+}
+
+
+class _Callable(NamedTuple):
+    name: Optional[str]
+    docstring: str
+    # (name, type name, is_optional, is_nullable)
+    args: list[tuple[str, Optional[str], bool, bool]]
+    return_type: Optional[str]
+
+
+class _Class(NamedTuple):
+    name: str
+    docstring: str
+    is_abstract: bool
+    parent: Optional[str]
+    implements: list[str]
+    constructors: list[_Callable]
+    methods: list[_Callable]
+
+
+class NamespaceIndex(NamedTuple):
+    name: str
+    # Alias name => target name, as spelled in the GIR
+    aliases: dict[str, str]
+    classes: frozenset[str]
+    interfaces: frozenset[str]
+
+
+# Process-wide, keyed by (real GIR path, mtime)
+_INDEX_CACHE: dict[tuple[str, float], NamespaceIndex] = {}
+
+
+def clear_index_cache():
+    _INDEX_CACHE.clear()
+
+
+def evict_indexes(gir_paths: list[str]):
+    real_paths = {path.realpath(gir_path) for gir_path in gir_paths}
+    for key in [key for key in _INDEX_CACHE if key[0] in real_paths]:
+        del _INDEX_CACHE[key]
+
+
+def _iter_gir(gir_path: str) -> Iterator[Element]:
+    """
+    Yield the includes of a GIR and the elements of its namespace once they
+    are fully parsed, then drop them. The namespace element itself is yielded
+    as soon as it starts, with its attributes only.
+    """
+    depth = 0
+    namespace: Optional[Element] = None
+    for event, element in iterparse(gir_path, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and element.tag == NAMESPACE:
+                namespace = element
+                yield element
+            continue
+
+        depth -= 1
+        if depth == 1 and element.tag != NAMESPACE:
+            yield element
+        elif depth == 2 and namespace is not None:
+            yield element
+            element.clear()
+            namespace.remove(element)
+
+
+def _lookup_name(name: str, namespace: str) -> str:
+    # Same as GirParser._lookup_type
+    if name in FUNDAMENTAL_TYPES:
+        return GLIB_ALIASES.get(name, name)
+    if name == 'GType':
+        return 'GObject.Type'
+    if '.' in name:
+        return name
+    return f'{namespace}.{name}'
+
+
+def _get_type_name(element: Element, namespace: str) -> Optional[str]:
+    # Name of the type that GirParser._parse_ctype would return
+    array = element.find(ARRAY)
+    if array is not None:
+        name = array.get('name')
+        return name if name is not None else get_array_name(_get_value_name(array, namespace))
+
+    child = element.find(TYPE)
+    if child is None:
+        # Varargs or no type at all
+        return 'none'
+    name = child.get('name')
+    c_type = child.get(C_TYPE)
+    if name is None:
+        return c_type.replace('*', '') if c_type is not None else 'none'
+    if name == 'none' and c_type == 'void':
+        return 'none'
+    return _lookup_name(name, namespace)
+
+
+def _get_value_name(array: Element, namespace: str) -> str:
+    # Name of the element type that GirParser._parse_array would return,
+    # which is none for elements without a name
+    child = array.find(TYPE)
+    name = child.get('name') if child is not None else None
+    if child is None or name is None or (name == 'none' and child.get(C_TYPE) == 'void'):
+        return 'none'
+    return _lookup_name(name, namespace)
+
+
+def _get_doc(element: Element) -> str:
+    doc = element.find(DOC)
+    return doc.text or '' if doc is not None else ''
+
+
+def _parse_callable(element: Element, namespace: str) -> _Callable:
+    return_value = element.find(RETURN_VALUE)
+    return _Callable(
+        name=element.get('name'),
+        docstring=_get_doc(element),
+        args=[
+            (
+                name,
+                _get_type_name(parameter, namespace),
+                parameter.get('optional', '0') == '1',
+                parameter.get('nullable', '0') == '1'
+            )
+            for parameter in element.iterfind(PARAMETER)
+            for name in [parameter.get('name')]
+            if name is not None
+        ],
+        return_type=_get_type_name(return_value, namespace)
+        if return_value is not None else None
+    )
+
+
+def _parse_class(element: Element, namespace: str) -> _Class:
+    parent = element.get('parent')
+    return _Class(
+        name=element.attrib['name'],
+        docstring=_get_doc(element),
+        is_abstract=element.get('abstract', '0') == '1',
+        parent=_lookup_name(parent, namespace) if parent is not None else None,
+        implements=[
+            _lookup_name(implements.attrib['name'], namespace)
+            for implements in element.iterfind(IMPLEMENTS)
+        ],
+        constructors=[
+            _parse_callable(constructor, namespace)
+            for constructor in element.iterfind(CONSTRUCTOR)
+        ],
+        methods=[
+            _parse_callable(method, namespace)
+            for tag in (METHOD, METHOD_INLINE)
+            for method in element.iterfind(tag)
+        ]
+    )
+
+
+def read_namespace_index(gir_path: str) -> NamespaceIndex:
+    """
+    The aliases, classes and interfaces of the namespace of a GIR, which is
+    all that resolving the types of the libraries including it needs.
+    """
+    key = _cache_key(gir_path)
+    index = _INDEX_CACHE.get(key)
+    if index is not None:
+        return index
+
+    name = ''
+    aliases: dict[str, str] = {}
+    classes: set[str] = set()
+    interfaces: set[str] = set()
+    for element in _iter_gir(gir_path):
+        tag = element.tag
+        if tag == NAMESPACE:
+            name = element.attrib['name']
+        elif tag == f'{GIR_CORE_NS}alias':
+            target = element.find(TYPE)
+            if target is not None and target.get('name') is not None:
+                aliases[element.attrib['name']] = target.attrib['name']
+        elif tag == f'{GIR_CORE_NS}class':
+            classes.add(element.attrib['name'])
+        elif tag == f'{GIR_CORE_NS}interface':
+            interfaces.add(element.attrib['name'])
+
+    index = _INDEX_CACHE[key] = NamespaceIndex(
+        name, aliases, frozenset(classes), frozenset(interfaces))
+    return index
+
+
+def read_docstrings(gir_path: str) -> dict[tuple[str, ...], str]:
+    """
+    The docstrings of a GIR, by (name,) for the elements of its namespace and
+    by (class name, name) for the constructors and methods of its classes.
+    """
+    docstrings: dict[tuple[str, ...], str] = {}
+    for element in _iter_gir(gir_path):
+        name = element.get('name')
+        if name is None or element.tag == NAMESPACE:
+            continue
+        docstring = _get_doc(element)
+        if docstring:
+            docstrings[(name,)] = docstring
+        if element.tag == f'{GIR_CORE_NS}class':
+            for tag in (CONSTRUCTOR, METHOD, METHOD_INLINE):
+                for method in element.iterfind(tag):
+                    docstring = _get_doc(method)
+                    if docstring and method.get('name') is not None:
+                        docstrings[(name, method.attrib['name'])] = docstring
+    return docstrings
+
+
+class LazyTypeTable(TypeTable):
+    """
+    A type table that reads the aliases of an include only when one of its
+    types is resolved.
+    """
+
+    def __init__(self, lib_name: str, includes: dict[str, str]):
+        super().__init__(lib_name)
+        # Namespace => GIR path
+        self._includes = includes
+        self._indexes: dict[str, Optional[NamespaceIndex]] = {}
+
+    def get_index(self, namespace: str) -> Optional[NamespaceIndex]:
+        if namespace not in self._indexes:
+            gir_path = self._includes.get(namespace)
+            index = self._indexes[namespace] = (
+                read_namespace_index(gir_path) if gir_path is not None else None)
+            if index is not None:
+                self.add_aliases(namespace, index.aliases.items())
+        return self._indexes[namespace]
+
+    def _get_alias_target(self, name: str) -> Optional[str]:
+        if '.' in name:
+            self.get_index(name.split('.')[0])
+        return super()._get_alias_target(name)
+
+
+def _find_gir(name: str, version: str, search_paths: list[str]) -> Optional[str]:
+    gir_file_name = f'{name}-{version}.gir' if version else f'{name}.gir'
+    for search_path in search_paths:
+        gir_file = path.join(search_path, gir_file_name)
+        if path.isfile(gir_file):
+            return gir_file
+    return None
+
+
+def _add_includes(
+    includes: list[tuple[str, str]],
+    search_paths: list[str],
+    dependencies: dict[str, str]
+):
+    # Same order as the dependencies of GirParser, each include comes after
+    # the ones it includes
+    for name, version in includes:
+        if name in dependencies:
+            continue
+        gir_file = _find_gir(name, version, search_paths)
+        if gir_file is None:
+            raise RuntimeError(
+                f'Could not find GIR dependency in the search paths: {name}-{version}')
+        header = read_gir_header(gir_file)
+        _add_includes(header.includes, search_paths, dependencies)
+        dependencies[header.namespace] = gir_file
+
+
+def _make_args(
+    args: list[tuple[str, Optional[str], bool, bool]],
+    type_table: TypeTable
+) -> list[IRFunctionArg]:
+    return [
+        make_arg(name='*args', type=type_table.get_name_str(type_name),
+                 is_optional=False, is_nullable=False)
+        if name == '...'
+        else make_arg(name=name, type=type_table.get_name_str(type_name),
+                      is_optional=is_optional, is_nullable=is_nullable)
+        for name, type_name, is_optional, is_nullable in args
+    ]
+
+
+def _make_function(
+    fun: _Callable,
+    type_table: TypeTable,
+    first_args: list[IRFunctionArg]
+) -> IRFunction:
+    assert(fun.name is not None)
+    return make_function(
+        name=fun.name,
+        args=first_args + _make_args(fun.args, type_table),
+        return_type=type_table.get_name_str(fun.return_type),
+        docstring=fun.docstring
+    )
+
+
+def _make_class(
+    cls: _Class,
+    type_table: LazyTypeTable,
+    interfaces: frozenset[str]
+) -> IRClass:
+    self_arg = make_arg(name='self', type='', is_optional=False, is_nullable=False)
+    cls_arg = make_arg(name='cls', type='', is_optional=False, is_nullable=False)
+    init_args = [
+        self_arg,
+        make_arg(name='*args', type='object', is_optional=False, is_nullable=False),
+        make_arg(name='**kwargs', type='object', is_optional=False, is_nullable=False)
+    ]
+
+    # Like resolve_class_implements, only the interfaces found are kept
+    implements: list[str] = []
+    for name in cls.implements:
+        namespace, _, local_name = name.rpartition('.')
+        if namespace == type_table.lib_name:
+            found = local_name in interfaces
+        else:
+            index = type_table.get_index(namespace)
+            found = index is not None and local_name in index.interfaces
+        if found:
+            implements.append(type_table.get_name_str(name))
+
+    return make_class(
+        name=cls.name,
+        docstring=cls.docstring,
+        is_abstract=cls.is_abstract,
+        inherited_classes=[type_table.get_name_str(cls.parent)] + implements,
+        constructors=[
+            make_function(name='__init__', args=init_args, return_type='None', docstring='')
+        ] + [
+            _make_function(c, type_table, [cls_arg])
+            for c in cls.constructors
+            if c.name is not None
+        ],
+        methods=[
+            _make_function(m, type_table, [self_arg])
+            for m in cls.methods
+            if m.name is not None
+        ]
+    )
+
+
+def stream_intermediate(
+    library: str,
+    library_path: str,
+    package: str,
+    search_paths: list[str]
+) -> IRLib:
+    name, version = library.split('-')
+    gir_lib_path = f'{library_path}/{library}.gir'
+
+    namespace = name
+    includes: list[tuple[str, str]] = []
+    aliases: dict[str, str] = {}
+    constants: dict[str, tuple[str, str]] = {}
+    enums: dict[str, tuple[str, list[tuple[str, str]]]] = {}
+    bitfields: dict[str, tuple[str, list[tuple[str, str]]]] = {}
+    functions: dict[Optional[str], tuple[_Callable, Optional[str]]] = {}
+    classes: dict[str, _Class] = {}
+    interfaces: set[str] = set()
+    real_types: set[str] = set()
+
+    for element in _iter_gir(gir_lib_path):
+        tag = element.tag
+        element_name = element.get('name')
+        if tag == f'{GIR_CORE_NS}include':
+            includes.append((element.attrib['name'], element.get('version', '')))
+        elif tag == NAMESPACE:
+            namespace = element.attrib['name']
+        elif tag in (f'{GIR_CORE_NS}function', f'{GIR_CORE_NS}function-inline'):
+            functions[element_name] = (
+                _parse_callable(element, namespace), element.get('moved-to'))
+        elif tag in (f'{GIR_CORE_NS}enumeration', f'{GIR_CORE_NS}bitfield'):
+            members = [
+                (member.get('name'), member.get('value'))
+                for member in element.iterfind(MEMBER)
+            ]
+            if len(members) == 0 or not element_name:
+                continue
+            real_types.add(element_name)
+            if element.get(f'{GLIB_NS}error-domain') is not None:
+                # Error domains are not part of the enums
+                continue
+            enum = (_get_doc(element), [(n, v) for n, v in members if n])
+            if tag == f'{GIR_CORE_NS}bitfield':
+                bitfields[element_name] = enum
+            else:
+                enums[element_name] = enum
+        elif tag in _REAL_TYPE_TAGS:
+            real_types.add(element_name)
+            if tag == f'{GIR_CORE_NS}alias':
+                target = element.find(TYPE)
+                if target is not None and target.get('name') is not None:
+                    aliases[element_name] = target.attrib['name']
+            elif tag == f'{GIR_CORE_NS}constant':
+                constants[element_name] = (element.get('value'), _get_doc(element))
+            elif tag == f'{GIR_CORE_NS}class':
+                classes[element_name] = _parse_class(element, namespace)
+            elif tag == f'{GIR_CORE_NS}interface':
+                interfaces.add(element_name)
+
+    dependencies: dict[str, str] = {}
+    _add_includes(includes, search_paths, dependencies)
+    type_table = LazyTypeTable(namespace, dependencies)
+    type_table.add_aliases(namespace, aliases.items())
+
+    library_functions: list[IRFunction] = []
+    for fun, moved_to in functions.values():
+        # Functions moved to a type of the namespace are methods of that type
+        if moved_to is not None and moved_to.split('.')[0] in real_types:
+            continue
+        if fun.name is not None:
+            library_functions.append(_make_function(fun, type_table, []))
+
+    library_enums: list[IREnum] = [
+        IREnum(
+            name=intern(enum_name),
+            docstring=docstring,
+            members=tuple(
+                make_constant(name=member_name, value=value)
+                for member_name, value in members
+            )
+        )
+        for enum_name, (docstring, members) in [*enums.items(), *bitfields.items()]
+    ]
+
+    return IRLib(
+        library=library,
+        library_path=gir_lib_path,
+        name=name,
+        version=version,
+        package=package,
+        imports=tuple(dependencies.keys()),
+        import_girs=tuple(dependencies.values()),
+        docstring='',
+        constants=tuple(
+            make_constant(name=constant_name, value=value, docstring=docstring)
+            for constant_name, (value, docstring) in constants.items()
+            if constant_name and value
+        ),
+        functions=tuple(library_functions),
+        classes=tuple(
+            _make_class(cls, type_table, frozenset(interfaces))
+            for cls in classes.values()
+        ),
+        enums=tuple(library_enums)
+    )
@@ -0,0 +1,137 @@
+from typing import Iterable, Optional
+from weakref import WeakKeyDictionary
+
+from gidocgen.gir.ast import ArrayType, Namespace, Repository, Type
+from gidocgen.gir.parser import FUNDAMENTAL_TYPES
+
+from .aliased_types import is_aliased_type, get_aliased_matching_type
+
+
+# Suffix of the names of C arrays, which have none in the GIR, e.g. utf8[]
+# for a strv. Named arrays, such as GLib.PtrArray, keep their name
+ARRAY_SUFFIX = '[]'
+
+
+def get_array_name(value_name: Optional[str]) -> str:
+    return f'{value_name or "none"}{ARRAY_SUFFIX}'
+
+
+def _qualify(name: str, namespace: str) -> str:
+    if '.' in name or is_aliased_type(name) or name in FUNDAMENTAL_TYPES:
+        return name
+    return f'{namespace}.{name}'
+
+
+class TypeTable:
+    """
+    Maps the GIR type names used by a library to their spelling in its stub,
+    resolving aliases to their targets, and C arrays to lists of their
+    elements. Aliases are followed through the table rather than with
+    Namespace.find_real_type(), as the streaming and typelib backends have
+    no parsed namespace.
+    """
+
+    def __init__(self, lib_name: str):
+        self.lib_name = lib_name
+        # Qualified alias name => qualified target name
+        self._aliases: dict[str, str] = {}
+        # Type name => spelling in the stub
+        self._table: dict[str, str] = {}
+
+    def add_aliases(self, namespace: str, aliases: Iterable[tuple[str, str]]):
+        # (alias name, target name) as spelled in the GIR of the namespace
+        for name, target in aliases:
+            self._aliases[_qualify(name, namespace)] = _qualify(target, namespace)
+
+    def _get_alias_target(self, name: str) -> Optional[str]:
+        return self._aliases.get(name)
+
+    def _resolve(self, name: str) -> str:
+        if name.endswith(ARRAY_SUFFIX):
+            return f'list[{self.get_name_str(name[:-len(ARRAY_SUFFIX)])}]'
+
+        seen: set[str] = set()
+        target = self._get_alias_target(name)
+        while target is not None and name not in seen:
+            seen.add(name)
+            name = target
+            target = self._get_alias_target(name)
+
+        if is_aliased_type(name):
+            at = get_aliased_matching_type(name)
+            # We can't infer the type, so we return the most generic type
+            return 'object' if at == 'None' else at
+
+        if name.startswith(f'{self.lib_name}.'):
+            # E.g. Gtk.Window => Window
+            return name[len(self.lib_name) + 1:]
+        return name
+
+    def resolve(self, name: str) -> str:
+        resolved = self._table.get(name)
+        if resolved is None:
+            resolved = self._table[name] = self._resolve(name)
+        return resolved
+
+    def get_name_str(self, name: Optional[str]) -> str:
+        if name is None or name == 'None':
+            # We can't infer the type, so we return the most generic type
+            return 'object'
+        return self.resolve(name)
+
+    def get_type_str(self, t: Optional[Type]) -> str:
+        return self.get_name_str(_get_type_name(t))
+
+
+def _get_type_name(t: Optional[Type]) -> Optional[str]:
+    # Name of a type parsed by gidocgen in the table
+    if isinstance(t, ArrayType) and t.name is None:
+        return get_array_name(_get_type_name(t.value_type))
+    return t.name if t is not None else None
+
+
+def make_type_table(repo: Repository) -> TypeTable:
+    """
+    Build the type table of a parsed repository, with the types of the
+    repository and of all its includes resolved upfront.
+    """
+    assert(repo.namespace is not None)
+    type_table = TypeTable(repo.namespace.name)
+
+    namespaces: list[Namespace] = [repo.namespace] + [
+        include.namespace for include in repo.includes.values()
+        if include.namespace is not None
+    ]
+    for namespace in namespaces:
+        type_table.add_aliases(namespace.name, [
+            (alias.name, alias.target.name)
+            for alias in namespace.get_aliases()
+            if alias.target is not None and alias.target.name is not None
+        ])
+
+    for name in type_table._aliases:
+        type_table.resolve(name)
+    for namespace in namespaces:
+        for types in (
+            namespace.get_classes(),
+            namespace.get_interfaces(),
+            namespace.get_records(),
+            namespace.get_unions(),
+            namespace.get_enumerations(),
+            namespace.get_bitfields(),
+            namespace.get_callbacks()
+        ):
+            for t in types:
+                type_table.resolve(_qualify(t.name, namespace.name))
+    return type_table
+
+
+_TYPE_TABLES: 'WeakKeyDictionary[Repository, TypeTable]' = WeakKeyDictionary()
+
+
+def get_type_table(repo: Repository) -> TypeTable:
+    # Built once per repository, which are themselves cached per process
+    type_table = _TYPE_TABLES.get(repo)
+    if type_table is None:
+        type_table = _TYPE_TABLES[repo] = make_type_table(repo)
+    return type_table
@@ -0,0 +1,481 @@
+from mmap import mmap, ACCESS_READ
+from os import environ, path, pathsep
+from struct import Struct
+from sys import intern
+from sysconfig import get_config_var
+from typing import NamedTuple, Optional
+
+from .model import (
+    IRLib, IRClass, IRConstant, IREnum, IRFunction, IRFunctionArg,
+    make_arg, make_class, make_constant, make_function)
+from .streaming import _lookup_name, read_docstrings
+from .type_table import TypeTable, get_array_name
+
+
+# Reads the compiled typelibs that ship with every GObject introspection
+# runtime, so that stubs can be generated without the GIR development files.
+# The layout is the one of gitypelib-internal.h, version 4. Typelibs only keep
+# the introspectable API and lose the C spelling of types, e.g. gint64 and
+# gsize are both 64 bits integers, and they have no documentation, which is
+# taken from the GIR when one is found.
+
+
+TYPELIB_MAGIC = b'GOBJ\nMETADATA\r\n\x1a'
+TYPELIB_MAJOR_VERSION = 4
+
+BLOB_TYPE_FUNCTION = 1
+BLOB_TYPE_STRUCT = 3
+BLOB_TYPE_BOXED = 4
+BLOB_TYPE_ENUM = 5
+BLOB_TYPE_FLAGS = 6
+BLOB_TYPE_OBJECT = 7
+BLOB_TYPE_INTERFACE = 8
+BLOB_TYPE_CONSTANT = 9
+BLOB_TYPE_UNION = 11
+
+TYPE_TAG_VOID = 0
+TYPE_TAG_BOOLEAN = 1
+TYPE_TAG_FLOAT = 10
+TYPE_TAG_DOUBLE = 11
+TYPE_TAG_UTF8 = 13
+TYPE_TAG_FILENAME = 14
+TYPE_TAG_ARRAY = 15
+TYPE_TAG_INTERFACE = 16
+
+# Spelling of the basic types in a GIR. Typelibs have no aliases, so types
+# that the GIRs spell with one are spelled with its target, e.g. GType, and
+# 64 bits integers, mostly gsize in GIRs, are spelled as such
+_BASIC_TYPE_NAMES = {
+    1: 'gboolean',
+    2: 'gint8',
+    3: 'guint8',
+    4: 'gint16',
+    5: 'guint16',
+    6: 'gint32',
+    7: 'guint32',
+    8: 'gssize',
+    9: 'gsize',
+    10: 'gfloat',
+    11: 'gdouble',
+    12: 'gsize',
+    13: 'utf8',
+    14: 'filename',
+    17: 'GLib.List',
+    18: 'GLib.SList',
+    19: 'GLib.HashTable',
+    20: 'GLib.Error',
+    21: 'gunichar',
+}
+# By array type, C arrays have no name
+_ARRAY_NAMES = [None, 'GLib.Array', 'GLib.PtrArray', 'GLib.ByteArray']
+# Formats of the constant values by type tag
+_VALUE_FORMATS = {
+    1: '<i', 2: '<b', 3: '<B', 4: '<h', 5: '<H', 6: '<i', 7: '<I', 8: '<q', 9: '<Q',
+    10: '<f', 11: '<d', 21: '<I'
+}
+
+_HEADER = Struct('<16sBBHHHIIIIIIIII18HI')
+_U16 = Struct('<H')
+_U32 = Struct('<I')
+_I32 = Struct('<i')
+_ENTRY = Struct('<HHII')
+
+
+def get_typelib_dirs() -> list[str]:
+    """
+    Directories where typelibs are installed, the ones of GI_TYPELIB_PATH
+    first, like the GObject introspection runtime.
+    """
+    typelib_dirs = [
+        typelib_dir for typelib_dir in environ.get('GI_TYPELIB_PATH', '').split(pathsep)
+        if typelib_dir
+    ]
+    multiarch = get_config_var('MULTIARCH')
+    if multiarch:
+        typelib_dirs.append(f'/usr/lib/{multiarch}/girepository-1.0')
+    typelib_dirs += ['/usr/lib64/girepository-1.0', '/usr/lib/girepository-1.0']
+    return [typelib_dir for typelib_dir in typelib_dirs if path.isdir(typelib_dir)]
+
+
+class DirEntry(NamedTuple):
+    blob_type: int
+    local: bool
+    name: str
+    # Offset of the blob if local, otherwise namespace of the entry
+    offset: int
+    namespace: str
+
+
+class Typelib:
+    """
+    A memory-mapped typelib, whose blobs are decoded on demand.
+    """
+
+    def __init__(self, typelib_path: str):
+        self.typelib_path = typelib_path
+        with open(typelib_path, 'rb') as fp:
+            self._data = mmap(fp.fileno(), 0, access=ACCESS_READ)
+
+        (magic, major_version, _, _, n_entries, n_local_entries, directory, _, _,
+         dependencies, _, namespace, nsversion, _, _, *blob_sizes, _) = _HEADER.unpack_from(self._data)
+        if magic != TYPELIB_MAGIC or major_version != TYPELIB_MAJOR_VERSION:
+            self.close()
+            raise ValueError(f'{typelib_path} is not a version {TYPELIB_MAJOR_VERSION} typelib')
+
+        (self._entry_size, self._function_size, self._callback_size, _, _, self._arg_size,
+         self._property_size, self._field_size, self._value_size, _, _, _,
+         self._signature_size, self._enum_size, self._struct_size, self._object_size,
+         self._interface_size, self._union_size) = blob_sizes
+
+        self.namespace = self.get_string(namespace)
+        self.version = self.get_string(nsversion)
+        # Direct includes, e.g. GObject-2.0
+        self.dependencies: list[str] = (
+            self.get_string(dependencies).split('|') if dependencies else [])
+        self.entries = [
+            self._read_entry(directory + i * self._entry_size, i < n_local_entries)
+            for i in range(n_entries)
+        ]
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self) -> 'Typelib':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def get_string(self, offset: int) -> str:
+        return self._data[offset:self._data.find(b'\0', offset)].decode()
+
+    def _u16(self, offset: int) -> int:
+        return _U16.unpack_from(self._data, offset)[0]
+
+    def _u32(self, offset: int) -> int:
+        return _U32.unpack_from(self._data, offset)[0]
+
+    def _read_entry(self, offset: int, local: bool) -> DirEntry:
+        blob_type, _, name, entry_offset = _ENTRY.unpack_from(self._data, offset)
+        return DirEntry(
+            blob_type=blob_type,
+            local=local,
+            name=self.get_string(name),
+            offset=entry_offset,
+            namespace=self.namespace if local else self.get_string(entry_offset)
+        )
+
+    def get_type_name(self, offset: int) -> Optional[str]:
+        """
+        Name of the type at offset, as it would be looked up in the GIR.
+        """
+        value = self._u32(offset)
+        if value & 0xffffff == 0:
+            # Basic type, stored in place
+            tag = value >> 27
+            if tag == TYPE_TAG_VOID:
+                return 'gpointer' if (value >> 24) & 1 else 'none'
+        else:
+            # Offset of a complex type
+            flags = self._u16(value)
+            tag = (flags >> 3) & 0x1f
+            if tag == TYPE_TAG_ARRAY:
+                # C arrays are followed by the type of their elements
+                name = _ARRAY_NAMES[(flags >> 11) & 0x3]
+                return name if name is not None else get_array_name(self.get_type_name(value + 4))
+            if tag == TYPE_TAG_INTERFACE:
+                entry = self.entries[self._u16(value + 2) - 1]
+                return f'{entry.namespace}.{entry.name}'
+        type_name = _BASIC_TYPE_NAMES.get(tag)
+        return _lookup_name(type_name, self.namespace) if type_name is not None else None
+
+    def get_constant_value(self, offset: int) -> str:
+        # As spelled in the value attribute of the GIR
+        tag = self._u32(offset + 8) >> 27
+        size = self._u32(offset + 12)
+        value_offset = self._u32(offset + 16)
+        if tag in (TYPE_TAG_UTF8, TYPE_TAG_FILENAME):
+            return self._data[value_offset:value_offset + size].rstrip(b'\0').decode()
+        value_format = _VALUE_FORMATS.get(tag)
+        if value_format is None:
+            return ''
+        value = Struct(value_format).unpack_from(self._data, value_offset)[0]
+        if tag == TYPE_TAG_BOOLEAN:
+            return 'true' if value else 'false'
+        if tag in (TYPE_TAG_FLOAT, TYPE_TAG_DOUBLE):
+            return repr(value)
+        return str(value)
+
+    def get_function_offsets(self, offset: int, count: int) -> list[int]:
+        return [offset + i * self._function_size for i in range(count)]
+
+    def get_object_methods(self, offset: int) -> list[int]:
+        n_interfaces = self._u16(offset + 20)
+        methods_offset = (
+            offset + self._object_size
+            + (n_interfaces + n_interfaces % 2) * 2
+            + self._u16(offset + 22) * self._field_size
+            + self._u16(offset + 34) * self._callback_size
+            + self._u16(offset + 24) * self._property_size
+        )
+        return self.get_function_offsets(methods_offset, self._u16(offset + 26))
+
+    def _skip_fields(self, offset: int, n_fields: int) -> int:
+        for _ in range(n_fields):
+            # Callback fields are followed by the callback
+            has_embedded_type = self._data[offset + 4] & 0x4
+            offset += self._field_size
+            if has_embedded_type:
+                offset += self._callback_size
+        return offset
+
+    def get_type_functions(self, entry: DirEntry) -> list[int]:
+        # Methods, constructors and functions of a type
+        offset = entry.offset
+        if entry.blob_type == BLOB_TYPE_OBJECT:
+            return self.get_object_methods(offset)
+        if entry.blob_type in (BLOB_TYPE_STRUCT, BLOB_TYPE_BOXED, BLOB_TYPE_UNION):
+            size = self._union_size if entry.blob_type == BLOB_TYPE_UNION else self._struct_size
+            methods_offset = self._skip_fields(offset + size, self._u16(offset + 20))
+            return self.get_function_offsets(methods_offset, self._u16(offset + 22))
+        if entry.blob_type == BLOB_TYPE_INTERFACE:
+            n_prerequisites = self._u16(offset + 18)
+            methods_offset = (
+                offset + self._interface_size
+                + (n_prerequisites + n_prerequisites % 2) * 2
+                + self._u16(offset + 20) * self._property_size
+            )
+            return self.get_function_offsets(methods_offset, self._u16(offset + 22))
+        if entry.blob_type in (BLOB_TYPE_ENUM, BLOB_TYPE_FLAGS):
+            methods_offset = offset + self._enum_size + self._u16(offset + 16) * self._value_size
+            return self.get_function_offsets(methods_offset, self._u16(offset + 18))
+        return []
+
+    def get_symbol(self, offset: int) -> str:
+        return self.get_string(self._u32(offset + 8))
+
+    def get_object_interfaces(self, offset: int) -> list[str]:
+        interfaces_offset = offset + self._object_size
+        return [
+            f'{entry.namespace}.{entry.name}'
+            for i in range(self._u16(offset + 20))
+            for entry in [self.entries[self._u16(interfaces_offset + i * 2) - 1]]
+        ]
+
+    def get_object_parent(self, offset: int) -> Optional[str]:
+        parent = self._u16(offset + 16)
+        if parent == 0:
+            return None
+        entry = self.entries[parent - 1]
+        return f'{entry.namespace}.{entry.name}'
+
+    def is_abstract(self, offset: int) -> bool:
+        return bool(self._u16(offset + 2) & 0x2)
+
+    def is_constructor(self, offset: int) -> bool:
+        return bool(self._u16(offset + 2) & 0x8)
+
+    def is_static(self, offset: int) -> bool:
+        return bool(self._u16(offset + 16) & 0x1)
+
+    def get_blob_name(self, offset: int) -> str:
+        return self.get_string(self._u32(offset + 4))
+
+    def get_signature(self, offset: int) -> tuple[Optional[str], list[tuple[str, Optional[str], bool, bool]]]:
+        """
+        Return type and (name, type, is_optional, is_nullable) arguments of
+        the function at offset.
+        """
+        signature = self._u32(offset + 12)
+        args: list[tuple[str, Optional[str], bool, bool]] = []
+        arg_offset = signature + self._signature_size
+        for _ in range(self._u16(signature + 6)):
+            flags = self._u32(arg_offset + 4)
+            args.append((
+                self.get_string(self._u32(arg_offset)),
+                self.get_type_name(arg_offset + 12),
+                bool(flags & 0x10),
+                bool(flags & 0x8)
+            ))
+            arg_offset += self._arg_size
+        return self.get_type_name(signature), args
+
+    def get_enum_members(self, offset: int) -> list[tuple[str, str]]:
+        members: list[tuple[str, str]] = []
+        value_offset = offset + self._enum_size
+        for _ in range(self._u16(offset + 16)):
+            unsigned = self._u32(value_offset) & 0x2
+            value = (_U32 if unsigned else _I32).unpack_from(self._data, value_offset + 8)[0]
+            members.append((self.get_string(self._u32(value_offset + 4)), str(value)))
+            value_offset += self._value_size
+        return members
+
+    def is_error_domain(self, offset: int) -> bool:
+        return self._u32(offset + 20) != 0
+
+
+def find_typelib(library: str, typelib_dirs: list[str]) -> Optional[str]:
+    for typelib_dir in typelib_dirs:
+        typelib_path = path.join(typelib_dir, f'{library}.typelib')
+        if path.isfile(typelib_path):
+            return typelib_path
+    return None
+
+
+def read_typelib_dependencies(typelib_path: str) -> list[str]:
+    with Typelib(typelib_path) as typelib:
+        return typelib.dependencies
+
+
+def _add_dependencies(
+    libraries: list[str],
+    typelib_dirs: list[str],
+    dependencies: dict[str, str]
+):
+    # Each dependency comes after its own ones, like the includes of a GIR
+    for library in libraries:
+        namespace = library.rsplit('-', 1)[0]
+        if namespace in dependencies:
+            continue
+        typelib_path = find_typelib(library, typelib_dirs)
+        if typelib_path is None:
+            raise RuntimeError(f'Could not find typelib dependency in the search paths: {library}')
+        _add_dependencies(read_typelib_dependencies(typelib_path), typelib_dirs, dependencies)
+        dependencies[namespace] = typelib_path
+
+
+def _make_function(
+    typelib: Typelib,
+    offset: int,
+    type_table: TypeTable,
+    first_args: list[IRFunctionArg],
+    docstring: str
+) -> IRFunction:
+    return_type, args = typelib.get_signature(offset)
+    return make_function(
+        name=typelib.get_blob_name(offset),
+        args=first_args + [
+            make_arg(name=name, type=type_table.get_name_str(type_name),
+                     is_optional=is_optional, is_nullable=is_nullable)
+            for name, type_name, is_optional, is_nullable in args
+        ],
+        return_type=type_table.get_name_str(return_type),
+        docstring=docstring
+    )
+
+
+def _make_class(
+    typelib: Typelib,
+    entry: DirEntry,
+    type_table: TypeTable,
+    docstrings: dict[tuple[str, ...], str]
+) -> IRClass:
+    self_arg = make_arg(name='self', type='', is_optional=False, is_nullable=False)
+    cls_arg = make_arg(name='cls', type='', is_optional=False, is_nullable=False)
+    init_args = [
+        self_arg,
+        make_arg(name='*args', type='object', is_optional=False, is_nullable=False),
+        make_arg(name='**kwargs', type='object', is_optional=False, is_nullable=False)
+    ]
+
+    constructors: list[IRFunction] = [
+        make_function(name='__init__', args=init_args, return_type='None', docstring='')
+    ]
+    methods: list[IRFunction] = []
+    for method in typelib.get_object_methods(entry.offset):
+        docstring = docstrings.get((entry.name, typelib.get_blob_name(method)), '')
+        if typelib.is_constructor(method):
+            constructors.append(_make_function(typelib, method, type_table, [cls_arg], docstring))
+        elif not typelib.is_static(method):
+            methods.append(_make_function(typelib, method, type_table, [self_arg], docstring))
+
+    parent = typelib.get_object_parent(entry.offset)
+    return make_class(
+        name=entry.name,
+        docstring=docstrings.get((entry.name,), ''),
+        is_abstract=typelib.is_abstract(entry.offset),
+        inherited_classes=[type_table.get_name_str(parent)] + [
+            type_table.get_name_str(interface)
+            for interface in typelib.get_object_interfaces(entry.offset)
+        ],
+        constructors=constructors,
+        methods=methods
+    )
+
+
+def typelib_intermediate(
+    library: str,
+    library_path: str,
+    package: str,
+    search_paths: list[str],
+    gir_dirs: list[str]
+) -> IRLib:
+    name, version = library.split('-')
+    typelib_path = f'{library_path}/{library}.typelib'
+
+    docstrings: dict[tuple[str, ...], str] = {}
+    for gir_dir in gir_dirs:
+        gir_path = path.join(gir_dir, f'{library}.gir')
+        if path.isfile(gir_path):
+            docstrings = read_docstrings(gir_path)
+            break
+
+    with Typelib(typelib_path) as typelib:
+        type_table = TypeTable(typelib.namespace)
+        dependencies: dict[str, str] = {}
+        _add_dependencies(typelib.dependencies, search_paths, dependencies)
+
+        local_entries = [entry for entry in typelib.entries if entry.local]
+        # Functions moved to a type are kept in the namespace too, under the
+        # same symbol, see resolve_moved_to
+        type_symbols = {
+            typelib.get_symbol(function)
+            for entry in local_entries
+            for function in typelib.get_type_functions(entry)
+        }
+        constants: list[IRConstant] = []
+        functions: list[IRFunction] = []
+        classes: list[IRClass] = []
+        enums: list[IREnum] = []
+        bitfields: list[IREnum] = []
+        for entry in local_entries:
+            if entry.blob_type == BLOB_TYPE_CONSTANT:
+                value = typelib.get_constant_value(entry.offset)
+                if value:
+                    constants.append(make_constant(
+                        name=entry.name, value=value,
+                        docstring=docstrings.get((entry.name,), '')))
+            elif entry.blob_type == BLOB_TYPE_FUNCTION:
+                if typelib.get_symbol(entry.offset) in type_symbols:
+                    continue
+                functions.append(_make_function(
+                    typelib, entry.offset, type_table, [], docstrings.get((entry.name,), '')))
+            elif entry.blob_type == BLOB_TYPE_OBJECT:
+                classes.append(_make_class(typelib, entry, type_table, docstrings))
+            elif entry.blob_type in (BLOB_TYPE_ENUM, BLOB_TYPE_FLAGS):
+                members = typelib.get_enum_members(entry.offset)
+                if len(members) == 0 or typelib.is_error_domain(entry.offset):
+                    continue
+                enum = IREnum(
+                    name=intern(entry.name),
+                    docstring=docstrings.get((entry.name,), ''),
+                    members=tuple(
+                        make_constant(name=member_name, value=value)
+                        for member_name, value in members if member_name
+                    ))
+                (enums if entry.blob_type == BLOB_TYPE_ENUM else bitfields).append(enum)
+
+    return IRLib(
+        library=library,
+        library_path=typelib_path,
+        name=name,
+        version=version,
+        package=package,
+        imports=tuple(dependencies.keys()),
+        import_girs=tuple(dependencies.values()),
+        docstring='',
+        constants=tuple(constants),
+        functions=tuple(functions),
+        classes=tuple(classes),
+        enums=tuple(enums + bitfields)
+    )
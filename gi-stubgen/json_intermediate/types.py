@@ -1,14 +1,18 @@
-from typing import TypedDict, Literal
-from gidocgen.gir.ast import Doc, Member
-from .utils import infer_type, to_inferred_type
+from typing import TYPE_CHECKING, TypedDict, Literal
 
+if TYPE_CHECKING:
+    from gidocgen.gir.ast import Doc
 
-def doc2str(doc: Doc | None) -> str:
+
+def doc2str(doc: 'Doc | None') -> str:
     if doc and doc.content:
         return doc.content
     return ''
 
 
+# Layout of the JSON intermediate, see model.py for the in-memory one
+
+
 class LibConstant(TypedDict):
     type: Literal['constant']
     name: str
@@ -17,16 +21,6 @@ class LibConstant(TypedDict):
     docstring: str
 
 
-def make_constant(name: str, value: str, docstring: str = '') -> LibConstant:
-    return {
-        'type': 'constant',
-        'name': name,
-        'value': to_inferred_type(value),
-        'value_type': infer_type(value),
-        'docstring': docstring
-    }
-
-
 class LibEnum(TypedDict):
     type: Literal['enum']
     docstring: str
@@ -34,21 +28,6 @@ class LibEnum(TypedDict):
     members: list[LibConstant]
 
 
-def make_enum(name: str, members: list[Member], docstring: str) -> LibEnum:
-    return {
-        'type': 'enum',
-        'name': name,
-        'docstring': docstring,
-        'members': [
-            make_constant(
-                name=member.name,
-                value=member.value,
-            )
-            for member in members if member and member.name
-        ]
-    }
-
-
 class LibFunctionArg(TypedDict):
     name: str
     type: str
@@ -64,21 +43,6 @@ class LibFunction(TypedDict):
     return_type: str
 
 
-def make_function(
-    name: str,
-    args: list[LibFunctionArg],
-    return_type: str,
-    docstring: str
-) -> LibFunction:
-    return {
-        'type': 'function',
-        'name': name,
-        'docstring': docstring,
-        'args': args,
-        'return_type': return_type
-    }
-
-
 class LibClass(TypedDict):
     type: Literal['class']
     docstring: str
@@ -89,26 +53,15 @@ class LibClass(TypedDict):
     methods: list[LibFunction]
 
 
-def make_class(
-        name: str,
-        is_abstract: bool,
-        inherited_classes: list[str],
-        constructors: list[LibFunction],
-        methods: list[LibFunction],
-        docstring: str
-) -> LibClass:
-    return {
-        'type': 'class',
-        'name': name,
-        'inherited_classes': inherited_classes,
-        'docstring': docstring,
-        'is_abstract': is_abstract,
-        'constructors': constructors,
-        'methods': methods
-    }
-
-
-class JSONIntermediateLib(TypedDict):
+# Keys of the intermediate that may be missing. NotRequired is only in typing
+# from Python 3.11
+class _JSONIntermediateLibOptional(TypedDict, total=False):
+    # Docstring store the docstrings are ids in, see docstring_store.py, if
+    # they are not inline
+    docstringStore: str
+
+
+class JSONIntermediateLib(_JSONIntermediateLibOptional):
     library: str
     libraryPath: str
     name: str
@@ -1,54 +1,128 @@
 #!/usr/bin/env python3
-from os import path
+from argparse import ArgumentParser
+from os import cpu_count, path
 from typing import Optional
-from .json_intermediate.main import generate_intermediate_json
-from .json_intermediate.io import write_json
+from .dependency_graph import IncludeGraph, get_build_order, resolve_include_graph
+from .gir_index import GirIndex
+from .json_intermediate.main import (
+    EXTRACTOR_BACKENDS, generate_intermediate_json, get_default_input_dirs, get_input_extension)
+from .json_intermediate.io import (
+    INTERMEDIATE_FORMATS, get_intermediate_file_name, get_intermediate_outputs, write_intermediate)
+from .manifest import BuildManifest
+from .memory import ReleaseTracker, add_memory_arguments, release_girs, set_memory_budget
+from .parallel import parallel_generation
+from .profiling import add_profile_arguments, finish_profiling, start_profiling
 
 
 OUTPUT_DIR = '.intermediate'
-DEFAULT_GIR_DIR = '/usr/share/gir-1.0'
 
 
 def main():
+    parser = ArgumentParser(
+        description='Generate the intermediates of a library and its dependencies.')
+    parser.add_argument('library', nargs='?', default='Gtk-3.0',
+                        help='library to generate, e.g. Gtk-3.0, or Gtk for its latest version')
+    parser.add_argument('--gir-dir',
+                        help='directory containing the GIR of the library, or its typelib '
+                             'with --backend typelib')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, 0 to use all CPUs')
+    parser.add_argument('--force', action='store_true',
+                        help='regenerate intermediates even if they are up to date')
+    parser.add_argument('--format', choices=list(INTERMEDIATE_FORMATS), default='json',
+                        help='format of the intermediates')
+    parser.add_argument('--backend', choices=list(EXTRACTOR_BACKENDS), default='gidocgen',
+                        help='how GIRs are read, streaming reads them incrementally and '
+                             'typelib reads the compiled typelibs instead')
+    add_memory_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    start_profiling(args)
+    set_memory_budget(args.max_memory)
+    manifest = BuildManifest(OUTPUT_DIR)
+    if args.force:
+        manifest.entries.clear()
+
     missing_libs: list[str] = list()
-    # gir_mapping = get_gir_mappings(DEFAULT_GIR_DIR)
-    generation_loop('Gtk-3.0')
+    failed_libs: list[str] = list()
+    jobs = args.jobs if args.jobs > 0 else (cpu_count() or 1)
+    extension = get_input_extension(args.backend)
+    input_dirs = [args.gir_dir] if args.gir_dir else get_default_input_dirs(args.backend)
+    gir = GirIndex(input_dirs, extension).find(args.library)
+    library = gir.library if gir is not None else args.library
+    try:
+        graph = resolve_include_graph([library], input_dirs, extension)
+        release = ReleaseTracker(graph, graph.girs)
+        missing_libs.extend(graph.missing)
+        if jobs > 1:
+            failed_libs.extend(parallel_generation(
+                graph, OUTPUT_DIR, jobs, manifest, search_paths=input_dirs,
+                intermediate_format=args.format, backend=args.backend, release=release,
+                full_graph=graph))
+        else:
+            failed_libs.extend(generation_loop(
+                graph, manifest, args.format, args.backend, release, input_dirs))
+    finally:
+        manifest.save()
+        finish_profiling(args)
 
     print('Generation completed!')
     if len(missing_libs) > 0:
         print('Could not find girs for:', missing_libs)
+    if len(failed_libs) > 0:
+        print('Could not generate:', failed_libs)
 
 
-def generation_loop(lib: str, gir_dir: str = '', missing_libs: Optional[list[str]] = None):
-    if missing_libs is None:
-        missing_libs = []
-
-    data = generate_intermediate_json(
-        lib, gir_dir if gir_dir else DEFAULT_GIR_DIR)
-    json_file_path = write_json(data, OUTPUT_DIR)
-    print(f'Generated {json_file_path}\n')
-
-    print('Retrieving deps for ' + lib)
-    for dep_gir_path in data['import_girs']:
-        if path.exists(dep_gir_path):
-            dep_name, dep_gir_dir = '', ''
-            if path.sep in dep_gir_path:
-                dep_gir_dir = path.sep.join(dep_gir_path.split(path.sep)[:-1])
-                dep_gir_file_name = dep_gir_path.split(path.sep)[-1]
-                dep_name = '.'.join(dep_gir_file_name.split('.')[:-1])
-
-            gir_intermediate_file = dep_name + '.json'
-            if not path.exists(path.join(OUTPUT_DIR, gir_intermediate_file)):
-                print(
-                    f'- Generating intermediates for {gir_intermediate_file}...')
-                generation_loop(dep_name, dep_gir_dir, missing_libs)
-            else:
-                print(f'- {gir_intermediate_file} already exists. Skipping...')
+def generation_loop(
+    graph: IncludeGraph,
+    manifest: Optional[BuildManifest] = None,
+    intermediate_format: str = 'json',
+    backend: str = 'gidocgen',
+    release: Optional[ReleaseTracker] = None,
+    search_paths: Optional[list[str]] = None
+) -> list[str]:
+    """
+    Generate the intermediates of every library in the include graph whose
+    intermediate is missing or out of date, includes first, and return the
+    libraries that failed.
+    """
+    failed: list[str] = []
+    for lib in get_build_order(graph):
+        gir_lib_path = graph.girs[lib]
+        intermediate_file = get_intermediate_file_name(lib, intermediate_format)
+        intermediate_path = path.join(OUTPUT_DIR, intermediate_file)
+        try:
+            if manifest is not None:
+                if manifest.is_fresh(lib, [gir_lib_path], [intermediate_path]):
+                    print(f'- {intermediate_file} is up to date. Skipping...')
+                    continue
+            elif path.exists(intermediate_path):
+                print(f'- {intermediate_file} already exists. Skipping...')
+                continue
 
-        else:
-            print('- Could not find ' + dep_gir_path)
-            if dep_gir_path not in missing_libs:
-                missing_libs.append(dep_gir_path)
+            print(f'- {intermediate_file} is missing or out of date. Generating...')
+            try:
+                data = generate_intermediate_json(
+                    lib, path.dirname(gir_lib_path), search_paths=search_paths, backend=backend)
+            except Exception as e:
+                print(f'- Failed to generate {lib}: {e}')
+                failed.append(lib)
+                continue
+            intermediate_file_path = write_intermediate(data, OUTPUT_DIR, intermediate_format)
+            print(f'Generated {intermediate_file_path}\n')
+            if manifest is not None:
+                manifest.record(
+                    lib, [data.library_path, *data.import_girs],
+                    get_intermediate_outputs(intermediate_file_path))
+            # The intermediate is on disk, instead of in memory while the
+            # next libraries are generated
+            del data
+        finally:
+            # Repositories no library left includes
+            if release is not None:
+                release_girs(release.done(lib))
+    return failed
 
 
 if __name__ == '__main__':
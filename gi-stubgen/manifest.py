@@ -0,0 +1,128 @@
+from hashlib import sha256
+from os import listdir, makedirs, path, replace, stat
+from typing import Optional, TypedDict
+
+import json
+
+
+# Bump the revision whenever a change to the generator changes its output,
+# so that existing outputs are rebuilt
+GENERATOR_VERSION = '0.0.1'
+GENERATOR_REVISION = 5
+MANIFEST_FILE_NAME = '.manifest.json'
+TEMPLATES_DIR = path.join(path.dirname(__file__), 'stubs', 'templates')
+
+# (path, mtime, size) => digest, so that each file is hashed once per run
+_HASH_CACHE: dict[tuple[str, int, int], str] = {}
+
+
+class ManifestEntry(TypedDict):
+    generator: str
+    # Options the outputs depend on besides the inputs, e.g. an output mode
+    options: str
+    # Input file => content hash, in the order they were recorded
+    inputs: dict[str, str]
+    outputs: list[str]
+
+
+def file_hash(file_path: str) -> str:
+    try:
+        file_stat = stat(file_path)
+    except OSError:
+        return ''
+
+    key = (path.realpath(file_path), file_stat.st_mtime_ns, file_stat.st_size)
+    digest = _HASH_CACHE.get(key)
+    if digest is None:
+        with open(file_path, 'rb') as fp:
+            digest = sha256(fp.read()).hexdigest()
+        _HASH_CACHE[key] = digest
+    return digest
+
+
+def remember_file_hash(file_path: str, digest: str):
+    # Digest of a file that was just written, so that it is not read back
+    try:
+        file_stat = stat(file_path)
+    except OSError:
+        return
+    _HASH_CACHE[(path.realpath(file_path), file_stat.st_mtime_ns, file_stat.st_size)] = digest
+
+
+def _get_generator_id() -> str:
+    return f'{GENERATOR_VERSION}-{GENERATOR_REVISION}'
+
+
+def get_template_files() -> list[str]:
+    return [
+        path.join(TEMPLATES_DIR, template)
+        for template in sorted(listdir(TEMPLATES_DIR))
+    ]
+
+
+class BuildManifest:
+    """
+    Records the content hashes of the inputs each output was built from,
+    so that only outputs whose inputs changed are rebuilt.
+    """
+
+    def __init__(self, output_dir: str):
+        self.manifest_path = path.join(output_dir, MANIFEST_FILE_NAME)
+        self.entries: dict[str, ManifestEntry] = {}
+        if path.isfile(self.manifest_path):
+            with open(self.manifest_path) as fp:
+                self.entries = json.load(fp)
+
+    def get_inputs(self, target: str) -> list[str]:
+        entry = self.entries.get(target)
+        return list(entry['inputs'].keys()) if entry is not None else []
+
+    def is_fresh(
+        self,
+        target: str,
+        inputs: list[str],
+        outputs: Optional[list[str]] = None,
+        options: str = ''
+    ) -> bool:
+        entry = self.entries.get(target)
+        if entry is None or entry['generator'] != _get_generator_id():
+            return False
+
+        if entry.get('options', '') != options:
+            return False
+
+        if any(output not in entry['outputs'] for output in outputs or []):
+            return False
+
+        if any(not path.exists(output) for output in entry['outputs']):
+            return False
+
+        recorded_inputs = entry['inputs']
+        if any(input_path not in recorded_inputs for input_path in inputs):
+            return False
+
+        return all(
+            file_hash(input_path) == digest
+            for input_path, digest in recorded_inputs.items()
+        )
+
+    def record(self, target: str, inputs: list[str], outputs: list[str], options: str = ''):
+        self.entries[target] = {
+            'generator': _get_generator_id(),
+            'options': options,
+            'inputs': {
+                input_path: file_hash(input_path)
+                for input_path in inputs
+                if input_path
+            },
+            'outputs': outputs
+        }
+
+    def save(self):
+        manifest_dir = path.dirname(self.manifest_path)
+        if not path.isdir(manifest_dir):
+            makedirs(manifest_dir)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.entries, fp, indent=2)
+        replace(tmp_path, self.manifest_path)
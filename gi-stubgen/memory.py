@@ -0,0 +1,91 @@
+from argparse import ArgumentParser, ArgumentTypeError
+from typing import Iterable, Optional
+
+import sys
+
+from .dependency_graph import IncludeGraph, get_include_closure
+
+
+# Bytes the parsed repositories of each process may take by default, so that
+# a run of every GIR fits in a build runner with 2 GB of RAM
+DEFAULT_MEMORY_BUDGET = 512 << 20
+
+_SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+# Bytes the cached repositories may take in this process, None for no limit,
+# see repository_cache.py
+_MEMORY_BUDGET: Optional[int] = DEFAULT_MEMORY_BUDGET
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a number of bytes, e.g. 512M or 2G, 0 meaning no limit.
+    """
+    size = size.strip().upper().removesuffix('B')
+    unit = size[-1:] if size[-1:] in _SIZE_UNITS else ''
+    try:
+        value = int(float(size[:len(size) - len(unit)]) * _SIZE_UNITS[unit])
+    except (ValueError, OverflowError):
+        raise ArgumentTypeError(f'invalid size: {size}')
+    if value < 0:
+        raise ArgumentTypeError(f'negative size: {size}')
+    return value
+
+
+def add_memory_arguments(parser: ArgumentParser):
+    parser.add_argument('--max-memory', type=parse_size, default=DEFAULT_MEMORY_BUDGET,
+                        help='memory the parsed GIRs may take in each process, e.g. 512M or 2G, '
+                             'past it the least recently used ones are evicted, 0 for no limit')
+
+
+def set_memory_budget(budget: Optional[int]):
+    global _MEMORY_BUDGET
+    _MEMORY_BUDGET = budget if budget else None
+
+
+def get_memory_budget() -> Optional[int]:
+    return _MEMORY_BUDGET
+
+
+def release_girs(gir_paths: list[str]):
+    """
+    Evict the repositories and indexes parsed from the given GIRs.
+    """
+    if len(gir_paths) == 0:
+        return
+    # Nothing was parsed by backends that were never loaded, and loading them
+    # would import gidocgen
+    package = __name__.rsplit('.', 1)[0]
+    repository_cache = sys.modules.get(f'{package}.json_intermediate.repository_cache')
+    if repository_cache is not None:
+        repository_cache.evict_repositories(gir_paths)
+    streaming = sys.modules.get(f'{package}.json_intermediate.streaming')
+    if streaming is not None:
+        streaming.evict_indexes(gir_paths)
+
+
+class ReleaseTracker:
+    """
+    Tracks which libraries the ones left to generate include, directly or
+    not, so that the repositories of the others can be released.
+    """
+
+    def __init__(self, graph: IncludeGraph, libraries: Iterable[str]):
+        self._girs = graph.girs
+        self._closures = {library: get_include_closure(graph, library) for library in libraries}
+        self._users: dict[str, int] = {}
+        for closure in self._closures.values():
+            for library in closure:
+                self._users[library] = self._users.get(library, 0) + 1
+
+    def done(self, library: str) -> list[str]:
+        """
+        Mark a library as generated, skipped or failed, and return the GIRs
+        that no pending library needs anymore.
+        """
+        released: list[str] = []
+        for include in sorted(self._closures.pop(library, set())):
+            self._users[include] -= 1
+            if self._users[include] == 0 and include in self._girs:
+                released.append(self._girs[include])
+        return released
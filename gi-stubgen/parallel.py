@@ -0,0 +1,295 @@
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import get_all_start_methods, get_context
+from os import path
+from typing import Iterable, Iterator, Optional
+
+import sys
+
+from .dependency_graph import IncludeGraph, get_build_order, get_dependents, get_include_closure
+from .json_intermediate.main import GIR_DIR, generate_intermediate_json
+from .json_intermediate.io import get_intermediate_file_name, get_intermediate_outputs, write_intermediate
+from .json_intermediate.model import IRLib
+from .manifest import BuildManifest
+from .memory import ReleaseTracker, get_memory_budget, release_girs, set_memory_budget
+from .profiling import StageRecord, profiler
+
+
+# Namespaces nearly every library includes, which the main process parses
+# once for the workers it forks to inherit
+PRELOADED_NAMESPACES = ('GLib', 'GObject', 'Gio')
+
+
+def get_preloaded_girs(graph: IncludeGraph, libraries: Iterable[str]) -> list[str]:
+    """
+    Return the GIRs of the preloaded namespaces that the given libraries
+    include, directly or not, in build order.
+    """
+    included: set[str] = set()
+    for library in libraries:
+        included |= get_include_closure(graph, library)
+    return [
+        graph.girs[library] for library in get_build_order(graph)
+        if library in included and library.rpartition('-')[0] in PRELOADED_NAMESPACES
+    ]
+
+
+def preload_girs(gir_paths: list[str], search_paths: Optional[list[str]], backend: str):
+    """
+    Parse the given GIRs in this process, into the caches the backend reads
+    them from. Typelibs are memory-mapped, and not worth preloading.
+    """
+    for gir_path in gir_paths:
+        library = path.splitext(path.basename(gir_path))[0]
+        with profiler.stage(library, 'preload'):
+            if backend == 'streaming':
+                from .json_intermediate.streaming import read_namespace_index
+                read_namespace_index(gir_path)
+            elif backend == 'gidocgen':
+                from .json_intermediate.repository_cache import preload_repositories
+                preload_repositories([gir_path], search_paths if search_paths else [GIR_DIR])
+
+
+def _get_stale_libraries(
+    graph: IncludeGraph,
+    output_dir: str,
+    manifest: BuildManifest,
+    intermediate_format: str
+) -> list[str]:
+    # Whether a library is up to date only depends on its own inputs
+    return [
+        library for library in graph.girs
+        if not manifest.is_fresh(library, [graph.girs[library]], [
+            path.join(output_dir, get_intermediate_file_name(library, intermediate_format))])
+    ]
+
+
+def _make_executor(
+    jobs: int,
+    search_paths: Optional[list[str]],
+    backend: str,
+    preload: Optional[list[str]]
+) -> ProcessPoolExecutor:
+    # Once the GIRs are preloaded, the workers are forked so that they inherit
+    # them copy-on-write instead of each parsing them again. Fork is not safe
+    # on macOS, where they are spawned and parse them themselves
+    context = None
+    if preload and 'fork' in get_all_start_methods() and sys.platform != 'darwin':
+        try:
+            preload_girs(preload, search_paths, backend)
+        except Exception as e:
+            print(f'- Failed to preload the base namespaces: {e}', flush=True)
+        context = get_context('fork')
+        # Or the workers would print what is buffered again
+        sys.stdout.flush()
+    return ProcessPoolExecutor(
+        max_workers=jobs, mp_context=context, initializer=_init_worker,
+        initargs=(profiler.get_settings(), get_memory_budget()))
+
+
+def _init_worker(profiler_settings: Optional[tuple[bool, bool]], memory_budget: Optional[int]):
+    profiler.reset(profiler_settings)
+    set_memory_budget(memory_budget)
+
+
+def _generate_library(
+    library: str,
+    gir_path: str,
+    output_dir: str,
+    search_paths: Optional[list[str]],
+    intermediate_format: str,
+    backend: str,
+    released: list[str]
+) -> tuple[str, list[str], tuple[list[StageRecord], Optional[dict]]]:
+    # Workers have their own caches, where the repositories that no pending
+    # library includes are dropped before parsing the next library
+    release_girs(released)
+    profiler.resume()
+    data = generate_intermediate_json(
+        library, path.dirname(gir_path), search_paths=search_paths, backend=backend)
+    intermediate_file_path = write_intermediate(data, output_dir, intermediate_format)
+    # Send what was profiled back to the main process
+    return intermediate_file_path, [data.library_path, *data.import_girs], profiler.take()
+
+
+def _extract_library(
+    library: str,
+    gir_path: str,
+    search_paths: Optional[list[str]],
+    backend: str,
+    released: list[str]
+) -> tuple[IRLib, tuple[list[StageRecord], Optional[dict]]]:
+    release_girs(released)
+    profiler.resume()
+    data = generate_intermediate_json(
+        library, path.dirname(gir_path), search_paths=search_paths, backend=backend)
+    return data, profiler.take()
+
+
+def parallel_extraction(
+    graph: IncludeGraph,
+    output_dir: str,
+    jobs: int,
+    manifest: BuildManifest,
+    search_paths: Optional[list[str]] = None,
+    intermediate_format: str = 'json',
+    backend: str = 'gidocgen',
+    release: Optional[ReleaseTracker] = None,
+    failed: Optional[list[str]] = None,
+    full_graph: Optional[IncludeGraph] = None
+) -> Iterator[IRLib]:
+    """
+    Extract the libraries of the graph whose intermediate is out of date on a
+    process pool, and yield them as they are done. At most twice as many
+    libraries as jobs are extracted ahead of the consumer, so that a slow
+    consumer bounds the memory they take. The ones that fail are appended to
+    failed. The base namespaces that the out of date libraries include are
+    parsed once, before forking the workers, see get_preloaded_girs(), from
+    full_graph, the graph of the libraries and of all their includes.
+    """
+    pending = get_build_order(graph)
+    # GIRs no pending library includes anymore
+    released: list[str] = []
+    # Runs where every library is up to date preload nothing
+    preload: list[str] = []
+    if full_graph is not None:
+        preload = get_preloaded_girs(
+            full_graph, _get_stale_libraries(graph, output_dir, manifest, intermediate_format))
+
+    def done(library: str):
+        if release is not None:
+            released.extend(release.done(library))
+
+    with _make_executor(jobs, search_paths, backend, preload) as executor:
+        running: dict[Future, str] = {}
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < 2 * jobs:
+                library = pending.pop(0)
+                intermediate_file = get_intermediate_file_name(library, intermediate_format)
+                intermediate_file_path = path.join(output_dir, intermediate_file)
+                if manifest.is_fresh(library, [graph.girs[library]], [intermediate_file_path]):
+                    print(f'- {intermediate_file} is up to date. Skipping...', flush=True)
+                    done(library)
+                    continue
+                print(f'- Extracting {library}...', flush=True)
+                future = executor.submit(
+                    _extract_library, library, graph.girs[library], search_paths, backend,
+                    list(released))
+                running[future] = library
+            if len(running) == 0:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                library = running.pop(future)
+                try:
+                    data, profile = future.result()
+                    profiler.merge(*profile)
+                except Exception as e:
+                    print(f'- Failed to generate {library}: {e}', flush=True)
+                    if failed is not None:
+                        failed.append(library)
+                    done(library)
+                    continue
+                yield data
+                done(library)
+
+    # The workers are done with the preloaded GIRs
+    if release is not None and preload:
+        release_girs(preload)
+
+
+def parallel_generation(
+    graph: IncludeGraph,
+    output_dir: str,
+    jobs: int,
+    manifest: BuildManifest,
+    search_paths: Optional[list[str]] = None,
+    generated: Optional[list[str]] = None,
+    intermediate_format: str = 'json',
+    backend: str = 'gidocgen',
+    release: Optional[ReleaseTracker] = None,
+    full_graph: Optional[IncludeGraph] = None
+) -> list[str]:
+    """
+    Generate the intermediates of every library in the graph on a process
+    pool, scheduling each library as soon as all of its includes are done.
+    The base namespaces that the out of date libraries include are parsed
+    once, before forking the workers, see get_preloaded_girs(), from
+    full_graph, the graph of the libraries and of all their includes.
+
+    Libraries whose intermediate is up to date in the manifest are skipped.
+    Returns the libraries that failed, while the generated ones are appended
+    to generated.
+    """
+    dependents = get_dependents(graph)
+    remaining_includes = {
+        library: len([i for i in includes if i in graph.girs])
+        for library, includes in graph.includes.items()
+    }
+    failed: list[str] = []
+    scheduled: set[str] = set()
+    # GIRs no pending library includes anymore
+    released: list[str] = []
+    # Runs where every library is up to date preload nothing
+    preload: list[str] = []
+    if full_graph is not None:
+        preload = get_preloaded_girs(
+            full_graph, _get_stale_libraries(graph, output_dir, manifest, intermediate_format))
+
+    with _make_executor(jobs, search_paths, backend, preload) as executor:
+        running: dict[Future, str] = {}
+
+        def schedule(library: str):
+            scheduled.add(library)
+            intermediate_file = get_intermediate_file_name(library, intermediate_format)
+            intermediate_file_path = path.join(output_dir, intermediate_file)
+            if manifest.is_fresh(library, [graph.girs[library]], [intermediate_file_path]):
+                print(f'- {intermediate_file} is up to date. Skipping...', flush=True)
+                done(library)
+                return
+            print(f'- Generating intermediates for {intermediate_file}...', flush=True)
+            future = executor.submit(
+                _generate_library, library, graph.girs[library], output_dir,
+                search_paths, intermediate_format, backend, list(released))
+            running[future] = library
+
+        def done(library: str):
+            if release is not None:
+                released.extend(release.done(library))
+            for dependent in dependents[library]:
+                remaining_includes[dependent] -= 1
+                if remaining_includes[dependent] == 0:
+                    schedule(dependent)
+
+        # Scheduling an up to date library schedules its dependents at once,
+        # so the roots are listed before any of them is scheduled
+        for library in [library for library, count in remaining_includes.items() if count == 0]:
+            schedule(library)
+
+        while len(running) > 0:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                library = running.pop(future)
+                try:
+                    intermediate_file_path, inputs, profile = future.result()
+                    profiler.merge(*profile)
+                    manifest.record(
+                        library, inputs, get_intermediate_outputs(intermediate_file_path))
+                    if generated is not None:
+                        generated.append(library)
+                    print(f'Generated {intermediate_file_path}', flush=True)
+                except Exception as e:
+                    print(f'- Failed to generate {library}: {e}', flush=True)
+                    failed.append(library)
+                done(library)
+
+    # The workers are done with the preloaded GIRs
+    if release is not None and preload:
+        release_girs(preload)
+
+    for library in graph.girs:
+        if library not in scheduled:
+            print(f'- Could not schedule {library}: its includes form a cycle', flush=True)
+            failed.append(library)
+
+    return failed
@@ -0,0 +1,214 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from os import makedirs, path
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+from typing import Any, Callable, Iterator, Optional
+
+from .batch import (
+    INTERMEDIATE_DIR, STUBS_DIR, BatchSummary, extract_libraries, remove_unresolved, select_graph)
+from .json_intermediate.io import (
+    convert_docstrings, get_intermediate_file_name, get_intermediate_outputs, write_intermediate)
+from .json_intermediate.main import get_input_extension
+from .json_intermediate.model import IRLib, count_symbols
+from .manifest import BuildManifest, get_template_files
+from .memory import ReleaseTracker
+from .parallel import parallel_extraction
+from .stub_gen import generate_stubs, get_stub_options, write_lib_stubs
+from .stubs.io import write_counts
+from .symbol_index import SymbolIndex, get_stub_imports
+
+
+# Libraries extracted ahead of the slowest stage, which are kept in memory
+# until both stages are done with them
+PIPELINE_QUEUE_SIZE = 2
+
+
+class _Stage(Thread):
+    """
+    Thread handling the libraries put in its queue, in order, until None is
+    put. The queue is bounded, so that extraction waits for the stage instead
+    of piling up libraries.
+    """
+
+    def __init__(self, name: str, handle: Callable[[IRLib], Any]):
+        super().__init__(name=name, daemon=True)
+        self.handle = handle
+        self.queue: 'Queue[Optional[IRLib]]' = Queue(PIPELINE_QUEUE_SIZE)
+        # Library => what handle() returned
+        self.results: dict[str, Any] = {}
+        self.failed: list[str] = []
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                return
+            try:
+                self.results[data.library] = self.handle(data)
+            except Exception as e:
+                print(f'- Failed to {self.name} {data.library}: {e}', flush=True)
+                self.failed.append(data.library)
+
+    def close(self):
+        if self.ident is None:
+            return
+        self.queue.put(None)
+        self.join()
+
+
+def pipeline_generation(
+    gir_dirs: list[str],
+    allow: list[str],
+    deny: list[str],
+    jobs: int = 1,
+    force: bool = False,
+    intermediate_format: str = 'json',
+    fast_path: bool = False,
+    backend: str = 'gidocgen',
+    split: bool = False,
+    docstrings: str = 'full'
+) -> BatchSummary:
+    """
+    Generate the intermediates and stubs of the selected libraries like
+    batch_generation(), but as a pipeline: while the next libraries are
+    extracted, each extracted library is written to its intermediate by one
+    thread and rendered to its stub by another, from memory instead of from
+    its intermediate. Stubs of intermediates that are up to date are
+    rendered afterwards, as in a batch run.
+    """
+    start = perf_counter()
+    write_counts.take()
+    full_graph, graph = select_graph(gir_dirs, allow, deny, get_input_extension(backend))
+    unresolved = remove_unresolved(full_graph, graph)
+
+    intermediate_manifest = BuildManifest(INTERMEDIATE_DIR)
+    stubs_manifest = BuildManifest(STUBS_DIR)
+    if force:
+        intermediate_manifest.entries.clear()
+        stubs_manifest.entries.clear()
+
+    # Stubs import the namespaces that have an intermediate, the indexed ones
+    # and the ones of this run. The index itself stays in this thread, as
+    # SQLite connections can not be shared
+    makedirs(INTERMEDIATE_DIR, exist_ok=True)
+    with SymbolIndex(INTERMEDIATE_DIR) as index:
+        index.update()
+        known = index.get_namespaces()
+    known.update(library.rpartition('-')[0] for library in graph.girs)
+
+    # Large libraries are rendered in units on a pool, see stubs/generator.py.
+    # Its workers are started by the render thread, while the other threads
+    # run, so they come from a fork server instead of forking this process
+    render_executor: Optional[ProcessPoolExecutor] = None
+    if jobs > 1:
+        start_method = 'forkserver' if 'forkserver' in get_all_start_methods() else 'spawn'
+        render_executor = ProcessPoolExecutor(
+            max_workers=jobs, mp_context=get_context(start_method))
+
+    def persist(data: IRLib) -> str:
+        intermediate_file_path = write_intermediate(data, INTERMEDIATE_DIR, intermediate_format)
+        print(f'Generated {intermediate_file_path}', flush=True)
+        return intermediate_file_path
+
+    def render(data: IRLib) -> list[str]:
+        stub_file_paths = write_lib_stubs(
+            convert_docstrings(data, docstrings), STUBS_DIR, fast_path, split,
+            lambda lib: get_stub_imports(lib, known), render_executor)
+        print(f'Generated {stub_file_paths[0]}', flush=True)
+        return stub_file_paths
+
+    failed = list(unresolved)
+    # Library => GIRs its intermediate was extracted from
+    inputs: dict[str, list[str]] = {}
+    symbols: dict[str, int] = {}
+    release = ReleaseTracker(full_graph, graph.girs)
+    libraries: Iterator[IRLib]
+    if jobs > 1:
+        libraries = parallel_extraction(
+            graph, INTERMEDIATE_DIR, jobs, intermediate_manifest, gir_dirs, intermediate_format,
+            backend, release, failed, full_graph)
+    else:
+        libraries = extract_libraries(
+            graph, INTERMEDIATE_DIR, intermediate_manifest, gir_dirs, intermediate_format,
+            backend, release, failed)
+
+    persist_stage = _Stage('persist', persist)
+    render_stage = _Stage('render', render)
+    try:
+        for data in libraries:
+            # Started with the first library, once the extraction workers are
+            # forked, as forking a process with running threads is unsafe
+            if render_stage.ident is None:
+                persist_stage.start()
+                render_stage.start()
+            inputs[data.library] = [data.library_path, *data.import_girs]
+            symbols[data.library] = count_symbols(data)
+            persist_stage.queue.put(data)
+            render_stage.queue.put(data)
+    finally:
+        persist_stage.close()
+        render_stage.close()
+        if render_executor is not None:
+            render_executor.shutdown()
+
+    # The manifests hash the outputs, so they are recorded once written
+    template_files = get_template_files()
+    options = get_stub_options(split, docstrings)
+    stubs = 0
+    rendered_symbols = 0
+    try:
+        for library in inputs:
+            if library in persist_stage.failed:
+                failed.append(library)
+                continue
+            intermediate_file_path = persist_stage.results[library]
+            intermediate_manifest.record(
+                library, inputs[library], get_intermediate_outputs(intermediate_file_path))
+            if library in render_stage.failed:
+                failed.append(library)
+                continue
+            stubs_manifest.record(
+                path.basename(intermediate_file_path), [intermediate_file_path] + template_files,
+                render_stage.results[library], options)
+            stubs += 1
+            rendered_symbols += symbols[library]
+    finally:
+        intermediate_manifest.save()
+        stubs_manifest.save()
+
+    # Index the intermediates written, as a batch run does when rendering
+    with SymbolIndex(INTERMEDIATE_DIR) as index:
+        index.update()
+
+    try:
+        stub_failures: list[str] = []
+        results = generate_stubs(
+            INTERMEDIATE_DIR, STUBS_DIR, stubs_manifest,
+            intermediate_files=[
+                get_intermediate_file_name(library, intermediate_format)
+                for library in graph.girs
+                if library not in inputs and library not in failed
+            ],
+            failed=stub_failures,
+            fast_path=fast_path,
+            split=split,
+            docstrings=docstrings,
+            jobs=jobs
+        )
+        failed.extend(path.splitext(file_name)[0] for file_name in stub_failures)
+    finally:
+        stubs_manifest.save()
+
+    written, unchanged = write_counts.take()
+    return BatchSummary(
+        libraries=len(graph.girs) + len(unresolved),
+        intermediates=len(inputs) - len(persist_stage.failed),
+        stubs=stubs + len(results),
+        stub_files_written=written,
+        stub_files_unchanged=unchanged,
+        symbols=rendered_symbols + sum(result.symbols for result in results),
+        failed=failed,
+        seconds=perf_counter() - start
+    )
@@ -0,0 +1,284 @@
+from argparse import ArgumentParser, Namespace
+from contextlib import contextmanager
+from os import getpid, makedirs, path, replace
+from time import perf_counter, process_time
+from typing import TYPE_CHECKING, Any, Iterator, Optional, TypedDict
+
+import json
+import threading
+import tracemalloc
+
+# cProfile and pstats are only loaded when functions are profiled
+if TYPE_CHECKING:
+    from cProfile import Profile
+    from pstats import Stats
+
+
+# Stages that are not part of another one, they add up to the time spent on
+# a library
+TOP_LEVEL_STAGES = {'preload', 'extract', 'write_intermediate', 'read_intermediate', 'render'}
+
+
+class StageRecord(TypedDict):
+    library: str
+    stage: str
+    pid: int
+    # Seconds
+    wall: float
+    cpu: float
+    # Bytes allocated at the peak of the stage, above what was allocated when
+    # it started, or 0 if memory is not traced
+    peak_memory: int
+    # Symbols produced by the stage, if any
+    symbols: int
+
+
+class _OpenStage:
+    def __init__(self, start_memory: int):
+        self.start_memory = start_memory
+        # Highest peak of the nested stages, which reset the tracemalloc one
+        self.peak_seen = 0
+
+
+def _load_profile(raw_stats: dict[Any, Any]) -> 'Profile':
+    """
+    A profile with the stats that take() returned in another process, which
+    pstats loads as they are.
+    """
+    from cProfile import Profile
+
+    class LoadedProfile(Profile):
+        def create_stats(self):
+            # Instead of replacing the stats with the ones of this profile
+            pass
+
+    profile = LoadedProfile()
+    profile.stats = raw_stats
+    return profile
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time, peak allocation and symbols of each
+    stage of the generation of a library. Disabled by default, in which case
+    stages cost next to nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.cprofile = False
+        self.records: list[StageRecord] = []
+        # Stages nest within a thread, e.g. the ones of pipeline.py
+        self._local = threading.local()
+        self._profile: Optional['Profile'] = None
+        self._stats: Optional['Stats'] = None
+
+    def enable(self, trace_memory: bool = True, cprofile: bool = False):
+        self.enabled = True
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.resume()
+
+    def resume(self):
+        # Profile the functions again after take()
+        if self.enabled and self.cprofile and self._profile is None:
+            from cProfile import Profile
+            self._profile = Profile()
+            self._profile.enable()
+
+    def get_settings(self) -> Optional[tuple[bool, bool]]:
+        # What enable() was called with, if enabled
+        return (self.trace_memory, self.cprofile) if self.enabled else None
+
+    def reset(self, settings: Optional[tuple[bool, bool]] = None):
+        """
+        Start over with the given settings, e.g. in a worker process that
+        inherited the state of the main one.
+        """
+        if self._profile is not None:
+            self._profile.disable()
+        self.__init__()
+        if settings is not None:
+            trace_memory, cprofile = settings
+            self.enable(trace_memory)
+            # Functions are only profiled while running a task, see resume()
+            self.cprofile = cprofile
+
+    def disable(self):
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if self._profile is not None:
+            self._profile.disable()
+            self._add_stats(self._profile)
+            self._profile = None
+
+    def _get_open_stages(self) -> list[_OpenStage]:
+        if not hasattr(self._local, 'open_stages'):
+            self._local.open_stages = []
+        return self._local.open_stages
+
+    @contextmanager
+    def stage(self, library: str, stage: str) -> Iterator[StageRecord]:
+        """
+        Record a stage, the caller can set the symbols of the yielded record.
+        """
+        record: StageRecord = {
+            'library': library,
+            'stage': stage,
+            'pid': getpid(),
+            'wall': 0.0,
+            'cpu': 0.0,
+            'peak_memory': 0,
+            'symbols': 0
+        }
+        if not self.enabled:
+            yield record
+            return
+
+        open_stages = self._get_open_stages()
+        trace_memory = self.trace_memory and tracemalloc.is_tracing()
+        start_memory = 0
+        if trace_memory:
+            start_memory, peak = tracemalloc.get_traced_memory()
+            if open_stages:
+                parent = open_stages[-1]
+                parent.peak_seen = max(parent.peak_seen, peak)
+            tracemalloc.reset_peak()
+        open_stage = _OpenStage(start_memory)
+        open_stages.append(open_stage)
+
+        start_wall, start_cpu = perf_counter(), process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = perf_counter() - start_wall
+            record['cpu'] = process_time() - start_cpu
+            open_stages.pop()
+            if trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], open_stage.peak_seen)
+                record['peak_memory'] = max(peak - start_memory, 0)
+                if open_stages:
+                    parent = open_stages[-1]
+                    parent.peak_seen = max(parent.peak_seen, peak)
+            self.records.append(record)
+
+    def _add_stats(self, profile: 'Profile'):
+        from pstats import Stats
+        if self._stats is None:
+            self._stats = Stats()
+        self._stats.add(profile)
+
+    def take(self) -> tuple[list[StageRecord], Optional[dict[Any, Any]]]:
+        """
+        Return and forget what was recorded so far, along with the raw
+        cProfile stats, e.g. to send them from a worker to the main process.
+        Functions are not profiled anymore until resume() is called.
+        """
+        records, self.records = self.records, []
+        raw_stats = None
+        if self._profile is not None:
+            # Disables the profile, and sets its stats
+            self._profile.create_stats()
+            raw_stats = self._profile.stats
+            self._profile = None
+        return records, raw_stats
+
+    def merge(self, records: list[StageRecord], raw_stats: Optional[dict[Any, Any]] = None):
+        self.records.extend(records)
+        if raw_stats:
+            self._add_stats(_load_profile(raw_stats))
+
+    def get_library_summaries(self) -> dict[str, dict[str, Any]]:
+        libraries: dict[str, dict[str, Any]] = {}
+        for record in self.records:
+            summary = libraries.setdefault(record['library'], {
+                'wall': 0.0, 'cpu': 0.0, 'peak_memory': 0, 'symbols': 0, 'stages': {}
+            })
+            summary['stages'][record['stage']] = summary['stages'].get(record['stage'], 0.0) + record['wall']
+            if record['stage'] in TOP_LEVEL_STAGES:
+                summary['wall'] += record['wall']
+                summary['cpu'] += record['cpu']
+            summary['symbols'] = max(summary['symbols'], record['symbols'])
+            summary['peak_memory'] = max(summary['peak_memory'], record['peak_memory'])
+        return libraries
+
+    def write_report(self, report_path: str):
+        _make_parent_dir(report_path)
+        tmp_path = report_path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump({
+                'libraries': self.get_library_summaries(),
+                'records': self.records
+            }, fp, indent=2)
+        replace(tmp_path, report_path)
+
+    def write_stats(self, stats_path: str):
+        if self._profile is not None:
+            self._profile.disable()
+            self._add_stats(self._profile)
+            self._profile = None
+        if self._stats is None:
+            return
+        _make_parent_dir(stats_path)
+        self._stats.dump_stats(stats_path)
+
+    def print_summary(self, limit: int = 10):
+        summaries = sorted(
+            self.get_library_summaries().items(),
+            key=lambda item: item[1]['wall'],
+            reverse=True
+        )
+        print('\nSlowest libraries:')
+        for library, summary in summaries[:limit]:
+            # The top level stages are made of the other ones
+            stages = {
+                stage: seconds for stage, seconds in summary['stages'].items()
+                if stage not in TOP_LEVEL_STAGES
+            } or summary['stages']
+            slowest_stage = max(stages.items(), key=lambda item: item[1])
+            print(
+                f'- {library}: {summary["wall"]:.2f}s wall, {summary["cpu"]:.2f}s CPU, '
+                f'{summary["peak_memory"] / (1 << 20):.1f}MiB peak, {summary["symbols"]} symbols '
+                f'(slowest stage: {slowest_stage[0]} {slowest_stage[1]:.2f}s)'
+            )
+
+
+def _make_parent_dir(file_path: str):
+    parent_dir = path.dirname(file_path)
+    if parent_dir and not path.isdir(parent_dir):
+        makedirs(parent_dir)
+
+
+# Shared by every stage of the process
+profiler = Profiler()
+
+
+def add_profile_arguments(parser: ArgumentParser):
+    parser.add_argument('--profile', metavar='REPORT',
+                        help='write the time, CPU time, peak memory and symbols of each stage '
+                             'of each library to this JSON file')
+    parser.add_argument('--profile-stats', metavar='FILE',
+                        help='also profile the functions with cProfile and write the pstats '
+                             'dump to this file')
+
+
+def start_profiling(args: Namespace):
+    if args.profile or args.profile_stats:
+        profiler.enable(trace_memory=bool(args.profile), cprofile=bool(args.profile_stats))
+
+
+def finish_profiling(args: Namespace):
+    if not profiler.enabled:
+        return
+    profiler.print_summary()
+    if args.profile:
+        profiler.write_report(args.profile)
+        print(f'Wrote the profile to {args.profile}')
+    if args.profile_stats:
+        profiler.write_stats(args.profile_stats)
+        print(f'Wrote the pstats dump to {args.profile_stats}')
+    profiler.disable()
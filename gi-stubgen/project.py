@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count, getpid, makedirs, path, replace, stat, walk
+from typing import Any, NamedTuple, Optional
+
+import ast
+import json
+
+from .batch import batch_generation, print_summary
+from .dependency_graph import resolve_include_graph
+from .gir_index import GirIndex, get_version_key
+from .json_intermediate.io import INTERMEDIATE_FORMATS
+from .json_intermediate.main import (
+    EXTRACTOR_BACKENDS, get_default_input_dirs, get_input_extension)
+from .memory import add_memory_arguments, set_memory_budget
+from .profiling import add_profile_arguments, finish_profiling, start_profiling
+from .stub_gen import add_docstring_arguments
+from .utils import get_cache_dir
+
+
+SCAN_CACHE_FILE_NAME = 'project-scan.json'
+# Bump whenever what is extracted from a file changes, files are then scanned
+# again
+SCAN_CACHE_VERSION = 1
+# Files a worker scans at once
+SCAN_CHUNK_SIZE = 32
+
+# Neither sources of the project nor worth scanning
+_SKIPPED_DIRS = {'__pycache__', 'node_modules', 'site-packages'}
+# Files without any of these can not import from gi.repository
+_GI_MARKERS = (b'gi.repository', b'require_version')
+
+
+class FileImports(NamedTuple):
+    # Namespace => version required with gi.require_version()
+    versions: dict[str, str]
+    # Namespaces imported from gi.repository
+    namespaces: list[str]
+
+
+class ProjectImports(NamedTuple):
+    # Namespace => version, or '' if none is required
+    namespaces: dict[str, str]
+    # Namespace => the different versions the files require
+    conflicts: dict[str, list[str]]
+    files: int
+
+
+def _get_call_name(node: ast.Call) -> str:
+    # gi.require_version(...) or require_version(...)
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    return ''
+
+
+def _get_string(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def scan_source(source: bytes, file_name: str = '<unknown>') -> FileImports:
+    """
+    Find the gi.require_version() calls, gi.require_versions() too, and the
+    imports from gi.repository of a Python source.
+    """
+    imports = FileImports({}, [])
+    if not any(marker in source for marker in _GI_MARKERS):
+        return imports
+
+    def add_namespace(namespace: str):
+        if namespace not in imports.namespaces:
+            imports.namespaces.append(namespace)
+
+    for node in ast.walk(ast.parse(source, file_name)):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module is not None:
+            # from gi.repository import Gtk, or from gi.repository.Gtk import Window
+            if node.module == 'gi.repository':
+                for alias in node.names:
+                    add_namespace(alias.name)
+            elif node.module.startswith('gi.repository.'):
+                add_namespace(node.module.split('.')[2])
+        elif isinstance(node, ast.Import):
+            # import gi.repository.Gtk
+            for alias in node.names:
+                if alias.name.startswith('gi.repository.'):
+                    add_namespace(alias.name.split('.')[2])
+        elif isinstance(node, ast.Call):
+            name = _get_call_name(node)
+            if name == 'require_version' and len(node.args) == 2:
+                namespace, version = (_get_string(arg) for arg in node.args)
+                if namespace is not None and version is not None:
+                    imports.versions[namespace] = version
+            elif name == 'require_versions' and len(node.args) == 1 \
+                    and isinstance(node.args[0], ast.Dict):
+                for key, value in zip(node.args[0].keys, node.args[0].values):
+                    namespace = _get_string(key) if key is not None else None
+                    version = _get_string(value)
+                    if namespace is not None and version is not None:
+                        imports.versions[namespace] = version
+    return imports
+
+
+def scan_file(file_path: str) -> FileImports:
+    try:
+        with open(file_path, 'rb') as fp:
+            return scan_source(fp.read(), file_path)
+    except (OSError, SyntaxError, ValueError) as e:
+        # Scanned again only once changed
+        print(f'- Could not scan {file_path}: {e}')
+        return FileImports({}, [])
+
+
+def find_python_files(source_dirs: list[str]) -> list[str]:
+    file_paths: list[str] = []
+    for source_dir in source_dirs:
+        if not path.exists(source_dir):
+            print(f'- Could not find {source_dir}')
+            continue
+        if path.isfile(source_dir):
+            file_paths.append(path.realpath(source_dir))
+            continue
+        for dir_path, dir_names, file_names in walk(source_dir):
+            # Hidden directories, e.g. .git, and virtual environments
+            dir_names[:] = sorted(
+                dir_name for dir_name in dir_names
+                if not dir_name.startswith('.') and dir_name not in _SKIPPED_DIRS
+                and not path.isfile(path.join(dir_path, dir_name, 'pyvenv.cfg'))
+            )
+            file_paths.extend(
+                path.realpath(path.join(dir_path, file_name))
+                for file_name in sorted(file_names) if file_name.endswith(('.py', '.pyi'))
+            )
+    return file_paths
+
+
+def _load_scan_cache(cache_path: str) -> dict[str, Any]:
+    try:
+        with open(cache_path) as fp:
+            cache = json.load(fp)
+        if cache.get('version') == SCAN_CACHE_VERSION:
+            return cache['files']
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def _save_scan_cache(files: dict[str, Any], cache_path: str):
+    tmp_path = f'{cache_path}.{getpid()}.tmp'
+    try:
+        makedirs(path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'w') as fp:
+            json.dump({'version': SCAN_CACHE_VERSION, 'files': files}, fp)
+        replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def scan_project(
+    source_dirs: list[str],
+    jobs: int = 1,
+    cache_path: Optional[str] = None
+) -> ProjectImports:
+    """
+    Find the namespaces the Python files of the given directories import from
+    gi.repository, and the versions they require. Files are only parsed
+    again once changed, on jobs worker processes.
+    """
+    cache_path = cache_path if cache_path is not None \
+        else path.join(get_cache_dir(), SCAN_CACHE_FILE_NAME)
+    cached_files = _load_scan_cache(cache_path)
+    file_paths = find_python_files(source_dirs)
+
+    stats: dict[str, list[int]] = {}
+    stale: list[str] = []
+    for file_path in file_paths:
+        try:
+            file_stat = stat(file_path)
+        except OSError:
+            continue
+        stats[file_path] = [file_stat.st_mtime_ns, file_stat.st_size]
+        entry = cached_files.get(file_path)
+        if entry is None or entry[:2] != stats[file_path]:
+            stale.append(file_path)
+
+    # The cache is shared by all projects, so only the files of the scanned
+    # directories that were deleted or renamed since are forgotten
+    scanned_dirs = tuple(
+        path.join(path.realpath(source_dir), '') for source_dir in source_dirs if path.isdir(source_dir))
+    scanned_files = {path.realpath(source_dir) for source_dir in source_dirs if path.isfile(source_dir)}
+    removed = [
+        file_path for file_path in cached_files
+        if file_path not in stats and (file_path in scanned_files or file_path.startswith(scanned_dirs))
+    ]
+    for file_path in removed:
+        del cached_files[file_path]
+
+    if len(stale) > 0:
+        if jobs > 1 and len(stale) > SCAN_CHUNK_SIZE:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                scanned = list(executor.map(scan_file, stale, chunksize=SCAN_CHUNK_SIZE))
+        else:
+            scanned = [scan_file(file_path) for file_path in stale]
+        for file_path, imports in zip(stale, scanned):
+            cached_files[file_path] = stats[file_path] + [imports.versions, imports.namespaces]
+    if len(stale) > 0 or len(removed) > 0:
+        _save_scan_cache(cached_files, cache_path)
+
+    namespaces: dict[str, str] = {}
+    required: dict[str, set[str]] = {}
+    for file_path in stats:
+        _, _, versions, imported = cached_files[file_path]
+        for namespace in imported:
+            namespaces.setdefault(namespace, '')
+        for namespace, version in versions.items():
+            # Required versions count as imports, e.g. of modules that only
+            # import gi.repository from a helper
+            namespaces.setdefault(namespace, '')
+            required.setdefault(namespace, set()).add(version)
+
+    conflicts: dict[str, list[str]] = {}
+    for namespace, versions in required.items():
+        # A namespace only has one stub, in the latest version required
+        sorted_versions = sorted(versions, key=get_version_key, reverse=True)
+        namespaces[namespace] = sorted_versions[0]
+        if len(sorted_versions) > 1:
+            conflicts[namespace] = sorted_versions
+    return ProjectImports(dict(sorted(namespaces.items())), conflicts, len(stats))
+
+
+def resolve_project_libraries(
+    imports: ProjectImports,
+    gir_dirs: list[str],
+    extension: str = 'gir'
+) -> tuple[list[str], list[str]]:
+    """
+    Return the libraries of the namespaces a project imports, in the version
+    it requires or else the latest one, and the namespaces not found.
+    """
+    index = GirIndex(gir_dirs, extension)
+    libraries: list[str] = []
+    missing: list[str] = []
+    for namespace, version in imports.namespaces.items():
+        gir = index.resolve(namespace, version)
+        if gir is None:
+            missing.append(f'{namespace}-{version}' if version else namespace)
+        else:
+            libraries.append(gir.library)
+    return libraries, missing
+
+
+def main():
+    parser = ArgumentParser(
+        description='Generate the intermediates and stubs of the namespaces a Python project '
+                    'imports from gi.repository, and of their includes.')
+    parser.add_argument('source_dirs', nargs='*', default=['.'],
+                        help='directories, or files, of the project, the current directory '
+                             'by default')
+    parser.add_argument('--gir-dir', action='append',
+                        help='directories containing GIR files, or typelibs with --backend '
+                             'typelib, the first ones take precedence')
+    parser.add_argument('--list', action='store_true',
+                        help='only list the libraries the project needs')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, 0 to use all CPUs')
+    parser.add_argument('--force', action='store_true',
+                        help='regenerate outputs even if they are up to date')
+    parser.add_argument('--format', choices=list(INTERMEDIATE_FORMATS), default='json',
+                        help='format of the intermediates')
+    parser.add_argument('--backend', choices=list(EXTRACTOR_BACKENDS), default='gidocgen',
+                        help='how GIRs are read, streaming reads them incrementally and '
+                             'typelib reads the compiled typelibs instead')
+    parser.add_argument('--fast-path', action='store_true',
+                        help='render functions in Python instead of with their template macros')
+    parser.add_argument('--split', action='store_true',
+                        help='write each library as a package of smaller stubs')
+    add_docstring_arguments(parser)
+    add_memory_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    jobs = args.jobs if args.jobs > 0 else (cpu_count() or 1)
+    extension = get_input_extension(args.backend)
+    gir_dirs = args.gir_dir or get_default_input_dirs(args.backend)
+
+    imports = scan_project(args.source_dirs, jobs)
+    print(f'Scanned {imports.files} files, importing {len(imports.namespaces)} namespaces')
+    for namespace, versions in imports.conflicts.items():
+        print(f'- {namespace} is required in versions {", ".join(versions)}, using {versions[0]}')
+    libraries, missing = resolve_project_libraries(imports, gir_dirs, extension)
+    for namespace in missing:
+        print(f'- Could not find {namespace}')
+
+    graph = resolve_include_graph(libraries, gir_dirs, extension)
+    closure = sorted(graph.girs)
+    if len(closure) == 0:
+        print('No library to generate')
+        return
+    print(f'Libraries: {", ".join(closure)}')
+    if args.list:
+        return
+
+    start_profiling(args)
+    set_memory_budget(args.max_memory)
+    try:
+        summary = batch_generation(
+            gir_dirs, closure, [], jobs, args.force, args.format, args.fast_path,
+            args.backend, args.split, args.docstrings)
+    finally:
+        finish_profiling(args)
+
+    print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
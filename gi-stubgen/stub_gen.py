@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
-from os import path
-from .json_intermediate.io import read_json
-from .stubs.io import write_stub
+from argparse import ArgumentParser
+from concurrent.futures import Executor, ProcessPoolExecutor
+from os import cpu_count, path
+from typing import Callable, NamedTuple, Optional
+from .json_intermediate.docstring_store import DOCSTRING_MODES
+from .json_intermediate.io import is_intermediate_file, read_intermediate
+from .json_intermediate.model import IRLib, count_symbols
+from .manifest import BuildManifest, get_template_files
+from .profiling import add_profile_arguments, finish_profiling, start_profiling
+from .stubs.io import write_counts, write_stub, write_stub_package
+from .symbol_index import SymbolIndex
 from .utils import get_files
 
 
@@ -9,13 +17,144 @@ INPUT_DIR = '.intermediate'
 OUTPUT_DIR = '.stubs'
 
 
+class StubResult(NamedTuple):
+    intermediate_file: str
+    stub_file_path: str
+    symbols: int
+
+
+def add_docstring_arguments(parser: ArgumentParser):
+    parser.add_argument('--docstrings', choices=list(DOCSTRING_MODES), default='full',
+                        help='render docstrings whole, only their first paragraph, or not at all')
+    parser.add_argument('--no-docstrings', dest='docstrings', action='store_const', const='none',
+                        help='same as --docstrings=none')
+
+
+def get_stub_options(split: bool, docstrings: str) -> str:
+    # Options a stub is rendered with, recorded in the manifest
+    return f'{"split" if split else "single"} docstrings={docstrings}'
+
+
+def write_lib_stubs(
+    lib_data: IRLib,
+    output_dir: str,
+    fast_path: bool,
+    split: bool,
+    get_imports: Callable[[IRLib], list[str]],
+    executor: Optional[Executor] = None
+) -> list[str]:
+    """
+    Write the stub of a library, or its package with split, and return the
+    paths of the written files, the main one first.
+    """
+    package_dir = path.join(output_dir, lib_data.package.replace('.', path.sep))
+    if split:
+        return write_stub_package(lib_data, package_dir, fast_path, get_imports, executor)
+    return [write_stub(lib_data, package_dir, fast_path, get_imports(lib_data), executor)]
+
+
 def main():
-    json_intermediate_files = get_files(INPUT_DIR)
+    parser = ArgumentParser(
+        description='Generate the stubs of the intermediates.')
+    parser.add_argument('--force', action='store_true',
+                        help='regenerate stubs even if they are up to date')
+    parser.add_argument('--fast-path', action='store_true',
+                        help='render functions in Python instead of with their template macros')
+    parser.add_argument('--split', action='store_true',
+                        help='write each library as a package of smaller stubs')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes rendering large libraries, 0 to use '
+                             'all CPUs')
+    add_docstring_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    start_profiling(args)
+    manifest = BuildManifest(OUTPUT_DIR)
+    if args.force:
+        manifest.entries.clear()
+
+    try:
+        for result in generate_stubs(
+                INPUT_DIR, OUTPUT_DIR, manifest, fast_path=args.fast_path, split=args.split,
+                docstrings=args.docstrings, jobs=args.jobs if args.jobs > 0 else (cpu_count() or 1)):
+            print(f'Generated {result.stub_file_path}')
+    finally:
+        manifest.save()
+        finish_profiling(args)
+
+    written, unchanged = write_counts.take()
+    print(f'Wrote {written} stub files, {unchanged} unchanged')
+
+
+def generate_stubs(
+    input_dir: str,
+    output_dir: str,
+    manifest: BuildManifest,
+    intermediate_files: Optional[list[str]] = None,
+    failed: Optional[list[str]] = None,
+    fast_path: bool = False,
+    split: bool = False,
+    docstrings: str = 'full',
+    jobs: int = 1
+) -> list[StubResult]:
+    """
+    Render the stubs of the intermediates in input_dir that are out of date.
+    When failed is given, libraries that fail to render are collected there
+    instead of aborting the run. With split, each stub is written as a
+    package, see stubs/split.py, and docstrings are rendered in the given
+    mode, see DOCSTRING_MODES. With jobs, large libraries are rendered on
+    that many worker processes.
+    """
+    template_files = get_template_files()
+    if intermediate_files is None:
+        intermediate_files = [
+            file_name for file_name in get_files(input_dir)
+            if is_intermediate_file(file_name)
+        ]
+
+    results: list[StubResult] = []
+    # Opened with the first stub to render, runs where every stub is up to
+    # date do not need it
+    index: Optional[SymbolIndex] = None
+    # Started with the first stub to render too
+    executor: Optional[ProcessPoolExecutor] = None
+    try:
+        for intermediate_file in intermediate_files:
+            intermediate_file_path = path.join(input_dir, intermediate_file)
+            inputs = [intermediate_file_path] + template_files
+            options = get_stub_options(split, docstrings)
+            if manifest.is_fresh(intermediate_file, inputs, options=options):
+                continue
+
+            if index is None:
+                # Imports are resolved against the symbols of every intermediate
+                index = SymbolIndex(input_dir)
+                index.update()
+            if executor is None and jobs > 1:
+                executor = ProcessPoolExecutor(max_workers=jobs)
+
+            try:
+                lib_data = read_intermediate(intermediate_file_path, docstrings)
+                stub_file_paths = write_lib_stubs(
+                    lib_data, output_dir, fast_path, split, index.get_imports, executor)
+            except Exception as e:
+                if failed is None:
+                    raise
+                print(f'- Failed to generate the stub of {intermediate_file}: {e}')
+                failed.append(intermediate_file)
+                continue
+
+            manifest.record(intermediate_file, inputs, stub_file_paths, options)
+            results.append(StubResult(
+                intermediate_file, stub_file_paths[0], count_symbols(lib_data)))
+    finally:
+        if index is not None:
+            index.close()
+        if executor is not None:
+            executor.shutdown()
 
-    for json_file in json_intermediate_files:
-        lib_data = read_json(path.join(INPUT_DIR, json_file))
-        write_stub(lib_data, path.join(
-            OUTPUT_DIR, lib_data['package'].replace('.', path.sep)))
+    return results
 
 
 if __name__ == '__main__':
@@ -0,0 +1,29 @@
+from jinja2.filters import do_indent
+
+from ..json_intermediate.model import IRFunction, IRFunctionArg
+
+
+# Plain Python versions of the hottest macros of _function.py.jinja. They
+# must render exactly the same text as the macros they replace.
+
+
+def render_args(args: tuple[IRFunctionArg, ...]) -> str:
+    # Mirrors function_t.args_gen, where is_optional is undefined and so
+    # never wraps the type
+    return ', '.join(
+        f"{arg.name}: _T.Optional[{arg.type}]" if len(arg.type) > 0 and arg.is_nullable
+        else f"{arg.name}: {arg.type}" if len(arg.type) > 0
+        else arg.name
+        for arg in args
+    )
+
+
+def render_function(fun: IRFunction) -> str:
+    # Mirrors function_t.gen
+    rendered = f"def {fun.name}({render_args(fun.args)})"
+    if len(fun.return_type) > 0:
+        rendered += f" -> {fun.return_type}"
+    rendered += ':'
+    if len(fun.docstring) > 0:
+        rendered += f'\n    """\n    {do_indent(fun.docstring, width=4)}\n    """'
+    return rendered + '\n    ...'
@@ -1,27 +1,181 @@
-from jinja2 import Environment, PackageLoader
+from concurrent.futures import Executor
+from itertools import repeat
+from os import makedirs, path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional
 
-from ..json_intermediate.types import JSONIntermediateLib
+from ..json_intermediate.model import IRLib, count_symbols
+from ..utils import PKG_NAME, get_cache_dir
 
-PKG_NAME = 'gi-stubgen'
+# jinja2 is only loaded once a stub is rendered, see get_environment()
+if TYPE_CHECKING:
+    from jinja2 import BytecodeCache, Environment
 
-environment = Environment(loader=PackageLoader(
-    f'{PKG_NAME}.stubs', 'templates')
-)
+# Section of a library => template of its items, in the order of lib.py.jinja
+SECTION_TEMPLATES = {
+    'constants': '_constant.py.jinja',
+    'enums': '_enum.py.jinja',
+    'functions': '_function.py.jinja',
+    'classes': '_class.py.jinja',
+}
+# Smaller libraries are rendered in one go, as sending them to the workers
+# costs more than rendering them
+PARALLEL_RENDER_MIN_SYMBOLS = 2000
+# Symbols rendered together by a worker, e.g. the methods of a few classes
+RENDER_UNIT_SYMBOLS = 400
+# fast_path => environment, shared by every render of the process
+_ENVIRONMENTS: dict[bool, 'Environment'] = {}
 
 
-def generate_lib_stub(data: JSONIntermediateLib):
-    return environment.get_template('lib.py.jinja').render(
-        lib_name=data['name'],
-        gen_name=PKG_NAME,
-        constants=data['constants'],
-        enums=data['enums'],
-        functions=data['functions'],
-        classes=data['classes'],
-        imports=[{
-            'from': 'enum',
-            'imports': ['Enum']
-        }] + [{
+def _get_bytecode_cache() -> Optional['BytecodeCache']:
+    from jinja2 import FileSystemBytecodeCache
+
+    # Compiled templates are shared by every run and worker process
+    bytecode_dir = path.join(get_cache_dir(), 'templates')
+    try:
+        makedirs(bytecode_dir, exist_ok=True)
+    except OSError:
+        return None
+    return FileSystemBytecodeCache(bytecode_dir)
+
+
+def _make_environment(fast_path: bool) -> 'Environment':
+    from jinja2 import Environment, PackageLoader
+
+    env = Environment(
+        loader=PackageLoader(f'{PKG_NAME}.stubs', 'templates'),
+        bytecode_cache=_get_bytecode_cache()
+    )
+    if fast_path:
+        from .fast_path import render_function
+        env.globals['fast_function_gen'] = render_function
+    return env
+
+
+def get_environment(fast_path: bool = False) -> 'Environment':
+    env = _ENVIRONMENTS.get(fast_path)
+    if env is None:
+        env = _ENVIRONMENTS[fast_path] = _make_environment(fast_path)
+    return env
+
+
+def _get_item_size(item: Any) -> int:
+    # Symbols of a constant, enum, function or class, like count_symbols()
+    return 1 + sum(
+        len(getattr(item, field, ())) for field in ('members', 'constructors', 'methods'))
+
+
+def get_render_units(data: IRLib) -> list[tuple[str, tuple[Any, ...]]]:
+    """
+    Split a library into (section, items) render units of about
+    RENDER_UNIT_SYMBOLS symbols, in the order they are rendered.
+    """
+    units: list[tuple[str, tuple[Any, ...]]] = []
+    for section in SECTION_TEMPLATES:
+        items: list[Any] = []
+        size = 0
+        for item in getattr(data, section):
+            items.append(item)
+            size += _get_item_size(item)
+            if size >= RENDER_UNIT_SYMBOLS:
+                units.append((section, tuple(items)))
+                items, size = [], 0
+        if len(items) > 0:
+            units.append((section, tuple(items)))
+    return units
+
+
+def render_unit(section: str, items: tuple[Any, ...], fast_path: bool = False) -> str:
+    """
+    Render the items of a section like lib.py.jinja does, but for the blank
+    lines after the last one, which the template adds.
+    """
+    gen = get_environment(fast_path).get_template(SECTION_TEMPLATES[section]).module.gen
+    return '\n\n'.join(gen(item) for item in items)
+
+
+def _render_sections(
+    data: IRLib,
+    fast_path: bool,
+    executor: Executor
+) -> dict[str, Iterable[str]]:
+    units = get_render_units(data)
+    # In order, so that the template takes the units of each section as they
+    # come, while the next ones are still being rendered
+    rendered = executor.map(
+        render_unit, [section for section, _ in units], [items for _, items in units],
+        repeat(fast_path))
+
+    def take(count: int) -> Iterator[str]:
+        for _ in range(count):
+            yield next(rendered)
+
+    return {
+        section: take(len([unit for unit in units if unit[0] == section]))
+        for section in SECTION_TEMPLATES
+    }
+
+
+def _get_render_context(
+    data: IRLib,
+    imports: Optional[list[str]],
+    local_imports: Optional[dict[str, list[str]]],
+    sections: Optional[dict[str, Iterable[str]]] = None
+) -> dict[str, Any]:
+    # Without a symbol index, every include is imported
+    if imports is None:
+        imports = list(data.imports)
+    import_list = [{
+        'from': 'enum',
+        'imports': ['Enum']
+    }]
+    if len(imports) > 0:
+        import_list.append({
             'from': 'gi.repository',
-            'imports': data['imports']
-        }]
-    ) + '\n'
+            'imports': imports
+        })
+    # Modules of a split stub, see split.py
+    for module_name, names in (local_imports or {}).items():
+        import_list.append({
+            'from': f'.{module_name}',
+            'imports': names
+        })
+    # Sections rendered ahead are strings, which the template outputs as is
+    if sections is None:
+        sections = {section: getattr(data, section) for section in SECTION_TEMPLATES}
+    return {
+        'lib_name': data.name,
+        'gen_name': PKG_NAME,
+        **sections,
+        'imports': import_list
+    }
+
+
+def generate_lib_stub_chunks(
+    data: IRLib,
+    fast_path: bool = False,
+    imports: Optional[list[str]] = None,
+    local_imports: Optional[dict[str, list[str]]] = None,
+    executor: Optional[Executor] = None
+) -> Iterator[str]:
+    """
+    Render the stub of a library piece by piece, e.g. one class at a time,
+    without building the whole stub in memory. imports are the namespaces
+    to import, see SymbolIndex.get_imports(), and local_imports the names to
+    import from the other modules of a split stub. With an executor, large
+    libraries are rendered in units on its workers, to the same text.
+    """
+    sections = None
+    if executor is not None and count_symbols(data) >= PARALLEL_RENDER_MIN_SYMBOLS:
+        sections = _render_sections(data, fast_path, executor)
+    yield from get_environment(fast_path).get_template('lib.py.jinja').generate(
+        **_get_render_context(data, imports, local_imports, sections))
+    yield '\n'
+
+
+def generate_lib_stub(
+    data: IRLib,
+    fast_path: bool = False,
+    imports: Optional[list[str]] = None,
+    executor: Optional[Executor] = None
+):
+    return ''.join(generate_lib_stub_chunks(data, fast_path, imports, executor=executor))
@@ -1,14 +1,141 @@
-from os import makedirs, path
+from concurrent.futures import Executor
+from hashlib import sha256
+from os import getpid, listdir, makedirs, path, remove, replace, stat
+from shutil import rmtree
+from threading import get_ident
+from typing import Callable, Iterator, Optional
 
-from ..json_intermediate.types import JSONIntermediateLib
-from .generator import generate_lib_stub
+from ..json_intermediate.model import IRLib, count_symbols
+from ..manifest import file_hash, remember_file_hash
+from ..profiling import profiler
+from .generator import generate_lib_stub_chunks
+from .split import split_lib
 
 
-def write_stub(data: JSONIntermediateLib, output_dir: str) -> str:
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+class WriteCounts:
+    """
+    Counts the stub files written, and the ones left untouched as their
+    content did not change.
+    """
+
+    def __init__(self):
+        self.written = 0
+        self.unchanged = 0
+
+    def take(self) -> tuple[int, int]:
+        """
+        Return the (written, unchanged) counts and start over.
+        """
+        counts = (self.written, self.unchanged)
+        self.__init__()
+        return counts
+
+
+write_counts = WriteCounts()
+
+
+def _is_unchanged(stub_file_path: str, tmp_file_path: str, digest: str) -> bool:
+    try:
+        if stat(stub_file_path).st_size != stat(tmp_file_path).st_size:
+            return False
+    except OSError:
+        return False
+    return file_hash(stub_file_path) == digest
+
+
+def _write_chunks(chunks: Iterator[str], output_dir: str, stub_file_name: str) -> str:
+    stub_file_path = path.join(output_dir, stub_file_name)
+
+    # Stream the stub to a hidden temporary file and move it in place once
+    # complete, so that readers never see a partially written stub
+    tmp_file_path = path.join(
+        output_dir, f'.{stub_file_name}.{getpid()}.{get_ident()}.tmp')
+    try:
+        stub_hash = sha256()
+        with open(tmp_file_path, 'w', buffering=WRITE_BUFFER_SIZE) as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+                stub_hash.update(chunk.encode(fp.encoding))
+        digest = stub_hash.hexdigest()
+        # Stubs that did not change keep their mtime, so that the caches of
+        # type checkers stay valid
+        if _is_unchanged(stub_file_path, tmp_file_path, digest):
+            remove(tmp_file_path)
+            write_counts.unchanged += 1
+        else:
+            replace(tmp_file_path, stub_file_path)
+            remember_file_hash(stub_file_path, digest)
+            write_counts.written += 1
+    except BaseException:
+        if path.exists(tmp_file_path):
+            remove(tmp_file_path)
+        raise
+    return stub_file_path
+
+
+def write_stub(
+    data: IRLib,
+    output_dir: str,
+    fast_path: bool = False,
+    imports: Optional[list[str]] = None,
+    executor: Optional[Executor] = None
+) -> str:
     if not path.isdir(output_dir):
         makedirs(output_dir)
-    stub_file_name = data['name'] + '.pyi'
-    stub_file_path = path.join(output_dir, stub_file_name)
-    with open(path.join(output_dir, stub_file_name), 'w') as fp:
-        fp.write(generate_lib_stub(data))
+
+    with profiler.stage(data.library, 'render') as record:
+        stub_file_path = _write_chunks(
+            generate_lib_stub_chunks(data, fast_path, imports, executor=executor),
+            output_dir, data.name + '.pyi')
+        record['symbols'] = count_symbols(data)
+
+    # Only keep the latest layout of a library
+    package_dir = path.join(output_dir, data.name)
+    if path.isdir(package_dir):
+        rmtree(package_dir)
     return stub_file_path
+
+
+def write_stub_package(
+    data: IRLib,
+    output_dir: str,
+    fast_path: bool = False,
+    get_imports: Optional[Callable[[IRLib], list[str]]] = None,
+    executor: Optional[Executor] = None
+) -> list[str]:
+    """
+    Write the stub of a library as a package of modules, see split.py, and
+    return their paths, __init__.pyi first.
+    """
+    package_dir = path.join(output_dir, data.name)
+    if not path.isdir(package_dir):
+        makedirs(package_dir)
+
+    stub_file_paths: list[str] = []
+    with profiler.stage(data.library, 'render') as record:
+        for module in split_lib(data):
+            stub_file_paths.append(_write_chunks(
+                generate_lib_stub_chunks(
+                    module.data,
+                    fast_path,
+                    get_imports(module.data) if get_imports is not None else None,
+                    module.local_imports,
+                    executor
+                ),
+                package_dir,
+                module.name + '.pyi'
+            ))
+        record['symbols'] = count_symbols(data)
+
+    # Modules of classes that were removed, and the stub of the other layout
+    for file_name in listdir(package_dir):
+        file_path = path.join(package_dir, file_name)
+        if file_name.endswith('.pyi') and file_path not in stub_file_paths:
+            remove(file_path)
+    stub_file_path = path.join(output_dir, data.name + '.pyi')
+    if path.exists(stub_file_path):
+        remove(stub_file_path)
+    return stub_file_paths
@@ -0,0 +1,94 @@
+from dataclasses import replace
+from typing import NamedTuple
+
+import re
+
+from ..json_intermediate.model import IRClass, IRLib, get_types
+
+
+# A split stub is a package, e.g. gi/repository/Gtk/, where __init__.pyi
+# holds the constants and functions and re-exports the enums and classes,
+# which are in private submodules: enums in _enums.pyi and classes grouped by
+# their initial, e.g. Gtk.Window in _w.pyi. Groups only depend on the names
+# of the classes, so a class stays in the same module across versions.
+INIT_MODULE = '__init__'
+ENUMS_MODULE = '_enums'
+OTHER_MODULE = '_other'
+
+# A name used in a type without its namespace, e.g. Window in
+# _T.Optional[Window]
+_LOCAL_REFERENCE = re.compile(r'(?<![\w.])([A-Za-z_]\w*)(?![\w.])')
+
+
+class StubModule(NamedTuple):
+    name: str
+    # The part of the library defined in the module
+    data: IRLib
+    # Submodule => names imported from it, as name as name when re-exported
+    local_imports: dict[str, list[str]]
+
+
+def get_class_module(class_name: str) -> str:
+    initial = class_name[0].lower()
+    return f'_{initial}' if 'a' <= initial <= 'z' else OTHER_MODULE
+
+
+def _get_local_imports(
+    data: IRLib,
+    module_name: str,
+    defined_in: dict[str, str]
+) -> dict[str, list[str]]:
+    used = {
+        name
+        for type_str in get_types(data)
+        for name in _LOCAL_REFERENCE.findall(type_str)
+    }
+    local_imports: dict[str, list[str]] = {}
+    for name in sorted(used):
+        other_module = defined_in.get(name)
+        if other_module is not None and other_module != module_name:
+            local_imports.setdefault(other_module, []).append(name)
+    return dict(sorted(local_imports.items()))
+
+
+def split_lib(data: IRLib) -> list[StubModule]:
+    """
+    Split a library into the modules of its stub package, __init__ first and
+    then the submodules sorted by name.
+    """
+    empty = replace(data, constants=(), functions=(), classes=(), enums=())
+    groups: dict[str, list[IRClass]] = {}
+    for cls in data.classes:
+        groups.setdefault(get_class_module(cls.name), []).append(cls)
+
+    submodules: dict[str, IRLib] = {}
+    if len(data.enums) > 0:
+        submodules[ENUMS_MODULE] = replace(empty, enums=data.enums)
+    for module_name in sorted(groups):
+        submodules[module_name] = replace(empty, classes=tuple(groups[module_name]))
+    submodules = dict(sorted(submodules.items()))
+
+    defined_in: dict[str, str] = {}
+    for module_name, module_data in submodules.items():
+        for enum in module_data.enums:
+            defined_in[enum.name] = module_name
+        for cls in module_data.classes:
+            defined_in[cls.name] = module_name
+
+    # Every name of the submodules is re-exported, which also makes the
+    # classes and enums available to the functions of __init__
+    init = StubModule(
+        INIT_MODULE,
+        replace(empty, constants=data.constants, functions=data.functions),
+        {
+            module_name: [
+                f'{name} as {name}' for name in
+                [enum.name for enum in module_data.enums] + [cls.name for cls in module_data.classes]
+            ]
+            for module_name, module_data in submodules.items()
+        }
+    )
+    return [init] + [
+        StubModule(module_name, module_data, _get_local_imports(module_data, module_name, defined_in))
+        for module_name, module_data in submodules.items()
+    ]
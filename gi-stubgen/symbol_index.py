@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from os import path, stat
+from typing import Any, Iterable, NamedTuple, Optional
+
+import builtins
+import re
+import sqlite3
+
+from .json_intermediate.binary_io import BINARY_EXTENSION, read_binary
+from .json_intermediate.io import is_intermediate_file, read_json
+from .json_intermediate.model import IRLib, get_types
+from .utils import get_files
+
+
+INDEX_FILE_NAME = '.symbols.sqlite'
+# Bump whenever the schema changes, the index is then rebuilt
+INDEX_VERSION = 1
+
+_SCHEMA = '''
+CREATE TABLE libraries (
+    library TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    file TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE symbols (
+    name TEXT NOT NULL,
+    library TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    section TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    parent TEXT
+);
+CREATE INDEX symbols_name ON symbols (name);
+CREATE INDEX symbols_library ON symbols (library);
+CREATE TABLE bases (
+    name TEXT NOT NULL,
+    library TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    base TEXT NOT NULL
+);
+CREATE INDEX bases_name ON bases (name);
+CREATE INDEX bases_library ON bases (library);
+'''
+
+# A namespace used in a type, e.g. GObject in _T.Optional[GObject.Object]
+_NAMESPACE_REFERENCE = re.compile(r'(?<![\w.])([A-Za-z_]\w*)\.')
+
+
+class Symbol(NamedTuple):
+    # Qualified name, e.g. Gio.ListModel or Gio.ListModel.get_item
+    name: str
+    library: str
+    kind: str
+    # Intermediate file of the library
+    file: str
+    # Where the symbol is in the intermediate: its section, e.g. classes or
+    # classes.methods, and its position in the list of that section or of
+    # the parent symbol
+    section: str
+    position: int
+    parent: Optional[str]
+
+
+def _get_symbol_rows(lib: IRLib) -> Iterable[tuple[str, str, str, int, Optional[str]]]:
+    # (name, kind, section, position, parent)
+    for i, constant in enumerate(lib.constants):
+        yield f'{lib.name}.{constant.name}', 'constant', 'constants', i, None
+    for i, enum in enumerate(lib.enums):
+        enum_name = f'{lib.name}.{enum.name}'
+        yield enum_name, 'enum', 'enums', i, None
+        for j, member in enumerate(enum.members):
+            yield f'{enum_name}.{member.name}', 'member', 'enums.members', j, enum_name
+    for i, fun in enumerate(lib.functions):
+        yield f'{lib.name}.{fun.name}', 'function', 'functions', i, None
+    for i, cls in enumerate(lib.classes):
+        class_name = f'{lib.name}.{cls.name}'
+        yield class_name, 'class', 'classes', i, None
+        for j, constructor in enumerate(cls.constructors):
+            yield f'{class_name}.{constructor.name}', 'constructor', 'classes.constructors', j, class_name
+        for j, method in enumerate(cls.methods):
+            yield f'{class_name}.{method.name}', 'method', 'classes.methods', j, class_name
+
+
+def _resolve_base(base: str, lib: IRLib) -> str:
+    # Bases of the same library, e.g. interfaces, are not qualified in the
+    # intermediates, unlike those of other libraries and builtins, e.g. object
+    if '.' not in base and not hasattr(builtins, base):
+        return f'{lib.name}.{base}'
+    return base
+
+
+def get_referenced_namespaces(lib: IRLib) -> set[str]:
+    """
+    Return the namespaces used in the types of a library, its own included.
+    """
+    return {
+        namespace
+        for type_str in get_types(lib)
+        for namespace in _NAMESPACE_REFERENCE.findall(type_str)
+        if namespace != '_T'
+    }
+
+
+def get_stub_imports(lib: IRLib, known: set[str]) -> list[str]:
+    """
+    Return the namespaces a stub of the library has to import: the ones its
+    types use, if they are included or known, in the order of the includes.
+    """
+    referenced = get_referenced_namespaces(lib) - {lib.name}
+    return [namespace for namespace in lib.imports if namespace in referenced] + sorted(
+        namespace for namespace in referenced - set(lib.imports)
+        if namespace in known
+    )
+
+
+def _read_for_index(file_path: str) -> IRLib:
+    # Docstrings are not indexed
+    if file_path.endswith(BINARY_EXTENSION):
+        return read_binary(file_path, 'none')
+    return read_json(file_path, 'none')
+
+
+class SymbolIndex:
+    """
+    SQLite index of the symbols of the intermediates of a directory, mapping
+    every qualified name to its library, kind and position in the
+    intermediate, and every class to its resolved bases.
+    """
+
+    def __init__(self, intermediate_dir: str):
+        self.intermediate_dir = intermediate_dir
+        self.index_path = path.join(intermediate_dir, INDEX_FILE_NAME)
+        self.connection = sqlite3.connect(self.index_path, timeout=30)
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+            self._create()
+
+    def __enter__(self) -> 'SymbolIndex':
+        return self
+
+    def __exit__(self, *_: Any):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _create(self):
+        with self.connection:
+            for (table,) in self.connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                self.connection.execute(f'DROP TABLE {table}')
+            self.connection.executescript(_SCHEMA)
+            self.connection.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+
+    def _remove_library(self, library: str):
+        for table in ('libraries', 'symbols', 'bases'):
+            self.connection.execute(f'DELETE FROM {table} WHERE library = ?', (library,))
+
+    def _add_library(self, lib: IRLib, file_name: str, mtime_ns: int, size: int):
+        self.connection.execute(
+            'INSERT INTO libraries VALUES (?, ?, ?, ?, ?)',
+            (lib.library, lib.name, file_name, mtime_ns, size))
+        self.connection.executemany(
+            'INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?)',
+            ((name, lib.library, kind, section, position, parent)
+             for name, kind, section, position, parent in _get_symbol_rows(lib)))
+        self.connection.executemany(
+            'INSERT INTO bases VALUES (?, ?, ?, ?)',
+            ((f'{lib.name}.{cls.name}', lib.library, i, _resolve_base(base, lib))
+             for cls in lib.classes
+             for i, base in enumerate(cls.inherited_classes)))
+
+    def update(self) -> list[str]:
+        """
+        Index the intermediates added or changed since the last update, and
+        forget the removed ones. Return the libraries indexed.
+        """
+        indexed = {
+            library: (file_name, mtime_ns, size)
+            for library, file_name, mtime_ns, size in self.connection.execute(
+                'SELECT library, file, mtime_ns, size FROM libraries')
+        }
+        current: dict[str, tuple[str, int, int]] = {}
+        if path.isdir(self.intermediate_dir):
+            for file_name in get_files(self.intermediate_dir):
+                if not is_intermediate_file(file_name):
+                    continue
+                file_stat = stat(path.join(self.intermediate_dir, file_name))
+                current[path.splitext(file_name)[0]] = (
+                    file_name, file_stat.st_mtime_ns, file_stat.st_size)
+
+        updated: list[str] = []
+        with self.connection:
+            for library in indexed.keys() - current.keys():
+                self._remove_library(library)
+            for library, (file_name, mtime_ns, size) in sorted(current.items()):
+                if indexed.get(library) == (file_name, mtime_ns, size):
+                    continue
+                lib = _read_for_index(path.join(self.intermediate_dir, file_name))
+                self._remove_library(library)
+                self._add_library(lib, file_name, mtime_ns, size)
+                updated.append(library)
+        return updated
+
+    def find(self, pattern: str) -> list[Symbol]:
+        """
+        Find the symbols matching a qualified name, or a glob, e.g. Gio.*Model.
+        """
+        return [
+            Symbol(*row) for row in self.connection.execute(
+                '''SELECT s.name, s.library, s.kind, l.file, s.section, s.position, s.parent
+                   FROM symbols s JOIN libraries l ON s.library = l.library
+                   WHERE s.name GLOB ? ORDER BY s.name, s.library''',
+                (pattern,))
+        ]
+
+    def get_bases(self, name: str) -> list[str]:
+        return [
+            base for (base,) in self.connection.execute(
+                'SELECT base FROM bases WHERE name = ? ORDER BY library, position', (name,))
+        ]
+
+    def get_ancestors(self, name: str) -> list[str]:
+        """
+        Return every class a class inherits from, directly or not, across
+        libraries, nearest first.
+        """
+        ancestors: list[str] = []
+        pending = self.get_bases(name)
+        while len(pending) > 0:
+            base = pending.pop(0)
+            if base not in ancestors:
+                ancestors.append(base)
+                pending.extend(self.get_bases(base))
+        return ancestors
+
+    def get_namespaces(self) -> set[str]:
+        return {
+            namespace for (namespace,) in self.connection.execute(
+                'SELECT DISTINCT namespace FROM libraries')
+        }
+
+    def get_imports(self, lib: IRLib) -> list[str]:
+        return get_stub_imports(lib, self.get_namespaces())
+
+
+def main():
+    parser = ArgumentParser(
+        description='Look up symbols in the index of the intermediates.')
+    parser.add_argument('names', nargs='+',
+                        help='qualified names, or globs, e.g. Gio.ListModel or "Gio.*Model"')
+    parser.add_argument('--dir', default='.intermediate',
+                        help='directory of the intermediates')
+    parser.add_argument('--ancestors', action='store_true',
+                        help='also list every class the matching classes inherit from')
+    args = parser.parse_args()
+
+    with SymbolIndex(args.dir) as index:
+        index.update()
+        for pattern in args.names:
+            symbols = index.find(pattern)
+            if len(symbols) == 0:
+                print(f'- Could not find {pattern}')
+            for symbol in symbols:
+                print(
+                    f'{symbol.name}: {symbol.kind} of {symbol.library} '
+                    f'({symbol.file}, {symbol.section}[{symbol.position}])')
+                if symbol.kind == 'class':
+                    bases = index.get_ancestors(symbol.name) if args.ancestors \
+                        else index.get_bases(symbol.name)
+                    print(f'  {"Ancestors" if args.ancestors else "Bases"}: {", ".join(bases)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+from dataclasses import replace
+from importlib import import_module
+from os import environ, makedirs, path
+from subprocess import CompletedProcess, run
+from tempfile import TemporaryDirectory
+from typing import Any, Optional
+
+import sys
+import unittest
+
+
+PKG_NAME = __package__.split('.')[0]
+# Parent of the package, which the generators are run from
+ROOT_DIR = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+
+_GIR_TEMPLATE = '''<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0"
+            xmlns:glib="http://www.gtk.org/introspection/glib/1.0">
+{includes}
+  <namespace name="{name}" version="{version}" shared-library="lib{prefix}.so"
+             c:identifier-prefixes="{name}" c:symbol-prefixes="{prefix}">
+    <record name="Thing" c:type="{name}Thing"/>
+{functions}
+  </namespace>
+</repository>
+'''
+
+
+def write_gir(gir_dir: str, library: str, includes: Optional[list[str]] = None) -> str:
+    """
+    Write a minimal GIR, with a function returning the Thing record of each
+    include, and return its path.
+    """
+    name, version = library.split('-')
+    include_lines: list[str] = []
+    function_lines: list[str] = []
+    for include in includes or []:
+        include_name, include_version = include.split('-')
+        include_lines.append(f'  <include name="{include_name}" version="{include_version}"/>')
+        function_lines.append(
+            f'    <function name="get_{include_name.lower()}_thing" '
+            f'c:identifier="{name.lower()}_get_{include_name.lower()}_thing">\n'
+            f'      <return-value transfer-ownership="none">\n'
+            f'        <type name="{include_name}.Thing" c:type="{include_name}Thing*"/>\n'
+            f'      </return-value>\n'
+            f'    </function>'
+        )
+    gir_path = path.join(gir_dir, f'{library}.gir')
+    with open(gir_path, 'w') as fp:
+        fp.write(_GIR_TEMPLATE.format(
+            includes='\n'.join(include_lines), name=name, version=version, prefix=name.lower(),
+            functions='\n'.join(function_lines)))
+    return gir_path
+
+
+DOC = 'Does a thing.\n\nAt length, over\nseveral lines.'
+# Repeated, e.g. by the methods of several classes
+SHARED_DOC = 'Frees the thing.'
+
+
+def make_lib(library: str) -> Any:
+    """
+    Make the IRLib of a small library, with docstrings of several paragraphs
+    and repeated ones.
+    """
+    model = import_module(f'{PKG_NAME}.json_intermediate.model')
+    name, version = library.split('-')
+    free = model.make_function(
+        name='free', args=[model.make_arg(name='self', type='Thing', is_optional=False, is_nullable=False)],
+        return_type='None', docstring=SHARED_DOC)
+    return model.IRLib(
+        library=library,
+        library_path=f'/girs/{library}.gir',
+        name=name,
+        version=version,
+        package='gi.repository',
+        imports=('GLib',),
+        import_girs=('/girs/GLib-2.0.gir',),
+        docstring=f'The {name} library.',
+        constants=(model.make_constant(name='MAJOR', value='1', docstring='Major version.'),),
+        functions=(
+            model.make_function(
+                name='do_thing', args=[model.make_arg(name='count', type='int', is_optional=True, is_nullable=False)],
+                return_type='list[str]', docstring=DOC),
+            replace(free, name='free_all'),
+        ),
+        classes=(
+            model.make_class(
+                name='Thing', is_abstract=False, inherited_classes=['GObject.Object'], constructors=[],
+                methods=[free], docstring=DOC),
+        ),
+        enums=()
+    )
+
+
+def run_module(
+    module: str,
+    args: list[str],
+    cwd: str,
+    env: Optional[dict[str, str]] = None
+) -> CompletedProcess:
+    """
+    Run a module of the package in cwd, where it writes its outputs, with
+    its caches in cwd too and only the given GIR directories.
+    """
+    run_env = {
+        **environ,
+        'PYTHONPATH': ROOT_DIR,
+        'GI_STUBGEN_CACHE_DIR': path.join(cwd, '.cache'),
+        'GI_GIRPATH': '',
+        'XDG_DATA_HOME': path.join(cwd, '.local'),
+        'XDG_DATA_DIRS': path.join(cwd, '.share'),
+        **(env or {})
+    }
+    return run(
+        [sys.executable, '-m', f'{PKG_NAME}.{module}', *args],
+        cwd=cwd, env=run_env, capture_output=True, text=True)
+
+
+class GirTestCase(unittest.TestCase):
+    """
+    A test run in a temporary directory, with the GIRs that write_girs()
+    writes in gir_dir and the outputs of the generators in work_dir.
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.gir_dir = path.join(self.tmp_dir.name, 'girs')
+        self.work_dir = path.join(self.tmp_dir.name, 'work')
+        makedirs(self.gir_dir)
+        makedirs(self.work_dir)
+        self.write_girs()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_girs(self):
+        # Libraries of the test, see write_gir()
+        pass
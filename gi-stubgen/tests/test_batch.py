@@ -0,0 +1,39 @@
+from importlib import import_module
+from os import listdir, path
+
+import unittest
+
+from . import PKG_NAME, GirTestCase, run_module, write_gir
+
+
+class MissingIncludeTest(GirTestCase):
+    """
+    Libraries including a library without a GIR fail on their own, without
+    stopping the generation of the others.
+    """
+
+    def write_girs(self):
+        write_gir(self.gir_dir, 'Bar-1.0', ['Missing-1.0'])
+        write_gir(self.gir_dir, 'Foo-1.0', ['Bar-1.0'])
+        write_gir(self.gir_dir, 'Baz-1.0')
+
+    def test_batch(self):
+        for args in ([], ['-j', '2'], ['--pipeline'], ['--backend', 'streaming']):
+            with self.subTest(args=args):
+                result = run_module('batch', [self.gir_dir, '--force', *args], self.work_dir)
+                self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+                self.assertIn('- 2 failures\n  - Bar-1.0\n  - Foo-1.0\n', result.stdout)
+                self.assertEqual(
+                    [file_name for file_name in listdir(path.join(self.work_dir, '.intermediate'))
+                     if not file_name.startswith('.')],
+                    ['Baz-1.0.json'])
+
+    def test_parser_raises(self):
+        # Instead of exiting the process, like gidocgen does by default
+        main = import_module(f'{PKG_NAME}.json_intermediate.main')
+        with self.assertRaises(RuntimeError):
+            main.generate_intermediate_json('Bar-1.0', self.gir_dir, search_paths=[self.gir_dir])
+
+
+if __name__ == '__main__':
+    unittest.main()
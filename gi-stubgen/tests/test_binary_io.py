@@ -0,0 +1,41 @@
+from importlib import import_module
+from tempfile import TemporaryDirectory
+
+import unittest
+
+from . import DOC, PKG_NAME, SHARED_DOC, make_lib
+
+
+class RoundTripTest(unittest.TestCase):
+    """
+    Intermediates are read back as they were extracted, with their
+    docstrings in the mode asked for.
+    """
+
+    def setUp(self):
+        self.io = import_module(f'{PKG_NAME}.json_intermediate.io')
+        self.docstring_store = import_module(f'{PKG_NAME}.json_intermediate.docstring_store')
+        self.tmp_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        data = make_lib('Foo-1.0')
+        for intermediate_format in self.io.INTERMEDIATE_FORMATS:
+            file_path = self.io.write_intermediate(data, self.tmp_dir.name, intermediate_format)
+            for docstrings in self.docstring_store.DOCSTRING_MODES:
+                with self.subTest(intermediate_format=intermediate_format, docstrings=docstrings):
+                    self.assertEqual(
+                        self.io.read_intermediate(file_path, docstrings),
+                        self.io.convert_docstrings(data, docstrings))
+
+    def test_convert_docstrings(self):
+        data = self.io.convert_docstrings(make_lib('Foo-1.0'), 'summary')
+        self.assertEqual(data.functions[0].docstring, DOC.split('\n\n')[0])
+        self.assertEqual(data.functions[1].docstring, SHARED_DOC)
+        self.assertEqual(self.io.convert_docstrings(data, 'none').classes[0].docstring, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+from contextlib import closing
+from importlib import import_module
+from tempfile import TemporaryDirectory
+
+import sqlite3
+import unittest
+
+from . import DOC, PKG_NAME, SHARED_DOC, make_lib
+
+
+class DeduplicationTest(unittest.TestCase):
+    """
+    Docstrings are kept once in the store of a directory, whichever
+    intermediates and formats they are repeated in.
+    """
+
+    def setUp(self):
+        self.io = import_module(f'{PKG_NAME}.json_intermediate.io')
+        self.docstring_store = import_module(f'{PKG_NAME}.json_intermediate.docstring_store')
+        self.tmp_dir = TemporaryDirectory()
+        self.store_path = self.docstring_store.get_docstring_store_path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_add(self):
+        with self.docstring_store.DocstringStore(self.store_path) as store:
+            self.assertEqual(store.add(DOC), store.add(DOC))
+            self.assertNotEqual(store.add(DOC), store.add(SHARED_DOC))
+            self.assertEqual(store.add(''), '')
+        with self.docstring_store.DocstringStore(self.store_path) as store:
+            doc_id = self.docstring_store.get_docstring_id(DOC)
+            self.assertEqual(store.get([doc_id, doc_id, '']), {doc_id: DOC})
+
+    def test_intermediates(self):
+        self.io.write_intermediate(make_lib('Foo-1.0'), self.tmp_dir.name, 'binary')
+        self.io.write_intermediate(make_lib('Bar-1.0'), self.tmp_dir.name, 'json')
+        with closing(sqlite3.connect(self.store_path)) as connection:
+            docstrings = [row[0] for row in connection.execute('SELECT docstring FROM docstrings')]
+        self.assertEqual(
+            sorted(docstrings),
+            sorted([DOC, SHARED_DOC, 'Major version.', 'The Foo library.', 'The Bar library.']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from importlib import import_module
+
+import unittest
+
+from . import PKG_NAME, make_lib
+
+
+class ParallelRenderTest(unittest.TestCase):
+    """
+    Stubs rendered in units on a pool are the same as the ones rendered at
+    once.
+    """
+
+    def setUp(self):
+        self.generator = import_module(f'{PKG_NAME}.stubs.generator')
+        self.thresholds = (self.generator.PARALLEL_RENDER_MIN_SYMBOLS, self.generator.RENDER_UNIT_SYMBOLS)
+
+    def tearDown(self):
+        self.generator.PARALLEL_RENDER_MIN_SYMBOLS, self.generator.RENDER_UNIT_SYMBOLS = self.thresholds
+
+    def test_units(self):
+        data = make_lib('Foo-1.0')
+        data = replace(data, classes=tuple(
+            replace(cls, name=f'{cls.name}{i}', methods=cls.methods * i)
+            for i in range(1, 6) for cls in data.classes))
+        # Units are cut in this process, and rendered by the workers
+        self.generator.PARALLEL_RENDER_MIN_SYMBOLS = 1
+        with ProcessPoolExecutor(2) as executor:
+            for unit_symbols in (1, 3, 7):
+                for fast_path in (False, True):
+                    with self.subTest(unit_symbols=unit_symbols, fast_path=fast_path):
+                        self.generator.RENDER_UNIT_SYMBOLS = unit_symbols
+                        self.assertGreater(len(self.generator.get_render_units(data)), 1)
+                        self.assertEqual(
+                            self.generator.generate_lib_stub(data, fast_path, executor=executor),
+                            self.generator.generate_lib_stub(data, fast_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+from os import listdir, path, remove
+from typing import Optional
+
+import unittest
+
+from . import GirTestCase, run_module, write_gir
+
+
+class GirDirTest(GirTestCase):
+    """
+    Libraries and their includes are read from the given GIR directories,
+    not only from /usr/share/gir-1.0.
+    """
+
+    def write_girs(self):
+        write_gir(self.gir_dir, 'Bar-1.0')
+        write_gir(self.gir_dir, 'Foo-1.0', ['Bar-1.0'])
+
+    def assert_generated(self, args: list[str], env: Optional[dict[str, str]] = None):
+        result = run_module('main', args, self.work_dir, env)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertNotIn('Could not', result.stdout)
+        self.assertEqual(
+            sorted(file_name for file_name in listdir(path.join(self.work_dir, '.intermediate'))
+                   if not file_name.startswith('.')),
+            ['Bar-1.0.json', 'Foo-1.0.json'])
+
+    def test_gir_path(self):
+        for backend in ('gidocgen', 'streaming'):
+            for jobs in ('1', '2'):
+                with self.subTest(backend=backend, jobs=jobs):
+                    self.assert_generated(
+                        ['Foo-1.0', '--force', '--backend', backend, '-j', jobs],
+                        {'GI_GIRPATH': self.gir_dir})
+
+    def test_gir_dir(self):
+        self.assert_generated(['Foo-1.0', '--gir-dir', self.gir_dir])
+
+    def test_up_to_date(self):
+        # Without docstrings, no docstring store is created
+        self.assert_generated(['Foo-1.0', '--gir-dir', self.gir_dir])
+        result = run_module('main', ['Foo-1.0', '--gir-dir', self.gir_dir], self.work_dir)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertNotIn('Generated', result.stdout)
+
+
+class TransitiveIncludeTest(GirTestCase):
+    """
+    Includes of includes are regenerated when out of date, even if the
+    libraries in between are up to date.
+    """
+
+    def write_girs(self):
+        write_gir(self.gir_dir, 'Baz-1.0')
+        write_gir(self.gir_dir, 'Bar-1.0', ['Baz-1.0'])
+        write_gir(self.gir_dir, 'Foo-1.0', ['Bar-1.0'])
+
+    def test_stale_include(self):
+        for jobs in ('1', '2'):
+            with self.subTest(jobs=jobs):
+                args = ['Foo-1.0', '--gir-dir', self.gir_dir, '-j', jobs]
+                result = run_module('main', args, self.work_dir)
+                self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+                remove(path.join(self.work_dir, '.intermediate', 'Baz-1.0.json'))
+                result = run_module('main', args, self.work_dir)
+                self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+                self.assertIn('Generated .intermediate/Baz-1.0.json', result.stdout)
+                self.assertNotIn('Generated .intermediate/Foo-1.0.json', result.stdout)
+
+    def test_up_to_date(self):
+        # Bar is resolved after Baz, and scheduled as soon as Baz is up to date
+        write_gir(self.gir_dir, 'Foo-1.0', ['Bar-1.0', 'Baz-1.0'])
+        args = ['Foo-1.0', '--gir-dir', self.gir_dir, '-j', '2']
+        result = run_module('main', args, self.work_dir)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        result = run_module('main', args, self.work_dir)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertEqual(result.stdout.count('is up to date'), 3, result.stdout)
+
+    def test_missing_include(self):
+        # Only the libraries including it, directly or not, fail
+        write_gir(self.gir_dir, 'Baz-1.0', ['Missing-1.0'])
+        for jobs in ('1', '2'):
+            with self.subTest(jobs=jobs):
+                result = run_module(
+                    'main', ['Foo-1.0', '--gir-dir', self.gir_dir, '--force', '-j', jobs],
+                    self.work_dir)
+                self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+                self.assertIn("Could not find girs for: ['Missing-1.0']", result.stdout)
+                self.assertIn("Could not generate: ['Baz-1.0', 'Bar-1.0', 'Foo-1.0']", result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+from importlib import import_module
+from os import makedirs, path, remove
+from tempfile import TemporaryDirectory
+
+import json
+import unittest
+
+from . import PKG_NAME
+
+
+class ScanSourceTest(unittest.TestCase):
+    """
+    The namespaces a Python source imports from gi.repository, and the
+    versions it requires.
+    """
+
+    def setUp(self):
+        self.project = import_module(f'{PKG_NAME}.project')
+
+    def test_require_version(self):
+        imports = self.project.scan_source(b'''
+import gi
+gi.require_version('Gtk', '4.0')
+gi.require_versions({'Adw': '1', 'Gdk': '4.0'})
+from gi import require_version
+require_version('Soup', '3.0')
+''')
+        self.assertEqual(imports.versions, {'Gtk': '4.0', 'Adw': '1', 'Gdk': '4.0', 'Soup': '3.0'})
+        self.assertEqual(imports.namespaces, [])
+
+    def test_require_version_not_literal(self):
+        imports = self.project.scan_source(b'''
+import gi
+gi.require_version('Gtk', VERSION)
+gi.require_versions(VERSIONS)
+''')
+        self.assertEqual(imports.versions, {})
+
+    def test_imports(self):
+        imports = self.project.scan_source(b'''
+from gi.repository import Gtk, GLib as G
+from gi.repository.Gio import File
+import gi.repository.Pango
+from gi.repository import Gtk
+from .gi.repository import Local
+''')
+        self.assertEqual(imports.namespaces, ['Gtk', 'GLib', 'Gio', 'Pango'])
+
+    def test_no_gi(self):
+        # Sources that never mention gi are not parsed, even if invalid
+        imports = self.project.scan_source(b'def (:')
+        self.assertEqual(imports, self.project.FileImports({}, []))
+
+
+class ScanCacheTest(unittest.TestCase):
+    """
+    The scan cache forgets the files of the scanned directories that were
+    deleted, and only them.
+    """
+
+    def setUp(self):
+        self.project = import_module(f'{PKG_NAME}.project')
+        self.tmp_dir = TemporaryDirectory()
+        self.cache_path = path.join(self.tmp_dir.name, 'project-scan.json')
+        self.app_dir = path.join(self.tmp_dir.name, 'app')
+        self.other_dir = path.join(self.tmp_dir.name, 'app-other')
+        for source_dir in (self.app_dir, self.other_dir):
+            makedirs(source_dir)
+            for module in ('a', 'b'):
+                with open(path.join(source_dir, f'{module}.py'), 'w') as fp:
+                    fp.write(f"from gi.repository import {module.upper()}\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_cached_files(self) -> list[str]:
+        with open(self.cache_path) as fp:
+            return sorted(path.relpath(file_path, self.tmp_dir.name) for file_path in json.load(fp)['files'])
+
+    def test_removed_files(self):
+        self.project.scan_project([self.app_dir, self.other_dir], cache_path=self.cache_path)
+        remove(path.join(self.app_dir, 'b.py'))
+        remove(path.join(self.other_dir, 'b.py'))
+        imports = self.project.scan_project([self.app_dir], cache_path=self.cache_path)
+        self.assertEqual(imports.namespaces, {'A': ''})
+        self.assertEqual(
+            self.get_cached_files(),
+            sorted([path.join('app', 'a.py'), path.join('app-other', 'a.py'), path.join('app-other', 'b.py')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+from argparse import ArgumentTypeError
+from importlib import import_module
+from os import path
+
+import unittest
+
+from . import PKG_NAME, GirTestCase, write_gir
+
+
+class BudgetTest(GirTestCase):
+    """
+    Past the memory budget, the repository just loaded and its includes stay
+    cached, while the others are evicted.
+    """
+
+    def setUp(self):
+        self.repository_cache = import_module(f'{PKG_NAME}.json_intermediate.repository_cache')
+        self.memory = import_module(f'{PKG_NAME}.memory')
+        super().setUp()
+        self.repository_cache.clear_repository_cache()
+
+    def tearDown(self):
+        self.repository_cache.clear_repository_cache()
+        self.memory.set_memory_budget(self.memory.DEFAULT_MEMORY_BUDGET)
+        super().tearDown()
+
+    def write_girs(self):
+        write_gir(self.gir_dir, 'Bar-1.0')
+        write_gir(self.gir_dir, 'Foo-1.0', ['Bar-1.0'])
+        write_gir(self.gir_dir, 'Baz-1.0')
+
+    def test_keep_loaded(self):
+        self.memory.set_memory_budget(1)
+        self.repository_cache.load_repository(path.join(self.gir_dir, 'Baz-1.0.gir'), [self.gir_dir])
+        repo = self.repository_cache.load_repository(
+            path.join(self.gir_dir, 'Foo-1.0.gir'), [self.gir_dir])
+        self.assertEqual(list(repo.includes.keys()), ['Bar'])
+        self.assertEqual(
+            sorted(path.basename(real_path) for real_path in self.repository_cache._SIZES),
+            ['Bar-1.0.gir', 'Foo-1.0.gir'])
+        self.assertIs(
+            self.repository_cache.load_repository(
+                path.join(self.gir_dir, 'Foo-1.0.gir'), [self.gir_dir]),
+            repo)
+
+
+class ParseSizeTest(unittest.TestCase):
+    """
+    Memory budgets given on the command line.
+    """
+
+    def setUp(self):
+        self.memory = import_module(f'{PKG_NAME}.memory')
+
+    def test_sizes(self):
+        self.assertEqual(self.memory.parse_size('512M'), 512 << 20)
+        self.assertEqual(self.memory.parse_size('1.5kb'), 1536)
+        self.assertEqual(self.memory.parse_size('0'), 0)
+
+    def test_invalid(self):
+        for size in ('-1', '-2G', 'lots', 'infG'):
+            with self.subTest(size=size):
+                with self.assertRaises(ArgumentTypeError):
+                    self.memory.parse_size(size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+from importlib import import_module
+from os import path
+
+import unittest
+
+from . import PKG_NAME, GirTestCase
+
+
+_GIR = '''<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0">
+  <namespace name="Arrays" version="1.0" shared-library="libarrays.so"
+             c:identifier-prefixes="Arrays" c:symbol-prefixes="arrays">
+    <record name="Thing" c:type="ArraysThing"/>
+    <function name="get_names" c:identifier="arrays_get_names">
+      <return-value transfer-ownership="full">
+        <array c:type="gchar**">
+          <type name="utf8"/>
+        </array>
+      </return-value>
+    </function>
+    <function name="get_things" c:identifier="arrays_get_things">
+      <return-value transfer-ownership="container">
+        <array name="GLib.PtrArray" c:type="GPtrArray*">
+          <type name="Thing"/>
+        </array>
+      </return-value>
+    </function>
+  </namespace>
+</repository>
+'''
+
+
+class ArrayTest(GirTestCase):
+    """
+    C arrays are lists of their elements, while named arrays keep their name.
+    """
+
+    def write_girs(self):
+        with open(path.join(self.gir_dir, 'Arrays-1.0.gir'), 'w') as fp:
+            fp.write(_GIR)
+
+    def test_arrays(self):
+        main = import_module(f'{PKG_NAME}.json_intermediate.main')
+        for backend in ('gidocgen', 'streaming'):
+            with self.subTest(backend=backend):
+                data = main.generate_intermediate_json(
+                    'Arrays-1.0', self.gir_dir, search_paths=[self.gir_dir], backend=backend)
+                return_types = {function.name: function.return_type for function in data.functions}
+                self.assertEqual(return_types['get_names'], 'list[str]')
+                self.assertEqual(return_types['get_things'], 'GLib.PtrArray')
+
+
+if __name__ == '__main__':
+    unittest.main()
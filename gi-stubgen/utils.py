@@ -1,27 +1,51 @@
-from typing import Mapping, List
-from os import listdir
-from os.path import isfile, join
+from typing import List, NamedTuple, Tuple
+from os import environ, listdir
+from os.path import expanduser, isfile, join
+from xml.etree.ElementTree import iterparse
 
 
-def get_gir_mappings(library_path: str) -> Mapping[str, str]:
-    gir_files = get_files(library_path)
-    low_case_names = [
-        '.'.join(gir.split('.')[:-1]).lower()
-        for gir in gir_files
-    ]
+GIR_CORE_NS = '{http://www.gtk.org/introspection/core/1.0}'
+PKG_NAME = 'gi-stubgen'
 
-    low_case_names_no_version = [
-        '-'.join(name.split('-')[:-1]).lower()
-        for name in low_case_names
-    ]
 
-    return {
-        name: '.'.join(gir.split('.')[:-1])
-        for name, gir in zip(low_case_names + low_case_names_no_version, gir_files + gir_files)
-    }
+def get_cache_dir() -> str:
+    # Shared by every run and worker process, e.g. for compiled templates
+    return environ.get('GI_STUBGEN_CACHE_DIR', join(
+        environ.get('XDG_CACHE_HOME', expanduser('~/.cache')), PKG_NAME))
 
 
 def get_files(library_path: str) -> List[str]:
     only_files = [file for file in listdir(
         library_path) if isfile(join(library_path, file))]
     return only_files
+
+
+class GirHeader(NamedTuple):
+    # Name of the namespace declared by the GIR
+    namespace: str
+    # (name, version) includes, in document order
+    includes: List[Tuple[str, str]]
+
+
+def read_gir_header(gir_file: str) -> GirHeader:
+    """
+    Read the namespace and the includes declared in the header of a GIR,
+    without parsing the rest of the file.
+    """
+    includes: List[Tuple[str, str]] = []
+    for _, element in iterparse(gir_file, events=('start',)):
+        if element.tag == f'{GIR_CORE_NS}include':
+            includes.append(
+                (element.attrib['name'], element.attrib.get('version', '')))
+        elif element.tag == f'{GIR_CORE_NS}namespace':
+            # Includes are only declared before the namespace
+            return GirHeader(element.attrib['name'], includes)
+    return GirHeader('', includes)
+
+
+def read_gir_includes(gir_file: str) -> List[Tuple[str, str]]:
+    """
+    Read the (name, version) includes declared in the header of a GIR,
+    without parsing the rest of the file.
+    """
+    return read_gir_header(gir_file).includes
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from ctypes import CDLL, get_errno
+from ctypes.util import find_library
+from os import close, listdir, path, read, stat, strerror
+from select import select
+from struct import Struct
+from time import sleep
+
+import sys
+
+from .batch import batch_generation, print_summary, select_libraries
+from .dependency_graph import get_dependents, resolve_include_graph
+from .json_intermediate.io import INTERMEDIATE_FORMATS
+from .json_intermediate.main import (
+    EXTRACTOR_BACKENDS, get_default_input_dirs, get_input_extension)
+from .json_intermediate.repository_cache import evict_repositories
+from .json_intermediate.streaming import evict_indexes
+from .memory import add_memory_arguments, set_memory_budget
+from .stub_gen import add_docstring_arguments
+
+
+# Seconds without new events before a burst of changes, e.g. a meson install,
+# is regenerated
+SETTLE_DELAY = 0.5
+
+IN_CLOEXEC = 0o2000000
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# wd, mask, cookie, len, followed by the name
+_INOTIFY_EVENT = Struct('iIII')
+
+
+class InotifyWatcher:
+    """
+    Waits for changes to the files of the given directories with inotify.
+    """
+
+    def __init__(self, watch_dirs: list[str], extension: str):
+        self.extension = extension
+        libc = CDLL(find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(get_errno(), strerror(get_errno()))
+        # Watch descriptor => directory
+        self.dirs: dict[int, str] = {}
+        for watch_dir in watch_dirs:
+            wd = libc.inotify_add_watch(self.fd, watch_dir.encode(), IN_WATCH_MASK)
+            if wd < 0:
+                error = get_errno()
+                self.close()
+                raise OSError(error, strerror(error), watch_dir)
+            self.dirs[wd] = watch_dir
+
+    def _read_events(self) -> set[str]:
+        changed: set[str] = set()
+        data = read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, _, _, name_length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + name_length].rstrip(b'\0').decode()
+            offset += name_length
+            if wd in self.dirs and name.endswith(f'.{self.extension}'):
+                changed.add(path.join(self.dirs[wd], name))
+        return changed
+
+    def wait(self) -> set[str]:
+        """
+        Block until files change and return them, once they stop changing.
+        """
+        changed: set[str] = set()
+        while len(changed) == 0:
+            select([self.fd], [], [])
+            changed |= self._read_events()
+        while select([self.fd], [], [], SETTLE_DELAY)[0]:
+            changed |= self._read_events()
+        return changed
+
+    def close(self):
+        close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Waits for changes to the files of the given directories by comparing
+    their mtime and size every interval.
+    """
+
+    def __init__(self, watch_dirs: list[str], extension: str, interval: float):
+        self.watch_dirs = watch_dirs
+        self.extension = extension
+        self.interval = interval
+        self.files = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        files: dict[str, tuple[int, int]] = {}
+        for watch_dir in self.watch_dirs:
+            for file_name in listdir(watch_dir):
+                if not file_name.endswith(f'.{self.extension}'):
+                    continue
+                file_path = path.join(watch_dir, file_name)
+                try:
+                    file_stat = stat(file_path)
+                except OSError:
+                    continue
+                files[file_path] = (file_stat.st_mtime_ns, file_stat.st_size)
+        return files
+
+    def _poll(self) -> set[str]:
+        files = self._scan()
+        changed = {
+            file_path for file_path in files.keys() | self.files.keys()
+            if files.get(file_path) != self.files.get(file_path)
+        }
+        self.files = files
+        return changed
+
+    def wait(self) -> set[str]:
+        changed: set[str] = set()
+        while len(changed) == 0:
+            sleep(self.interval)
+            changed |= self._poll()
+        while True:
+            sleep(SETTLE_DELAY)
+            settling = self._poll()
+            if len(settling) == 0:
+                return changed
+            changed |= settling
+
+    def close(self):
+        pass
+
+
+def make_watcher(watch_dirs: list[str], extension: str, interval: float, poll: bool = False):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(watch_dirs, extension)
+        except (OSError, AttributeError) as e:
+            print(f'- Could not watch with inotify ({e}), polling every {interval}s instead')
+    return PollingWatcher(watch_dirs, extension, interval)
+
+
+def get_affected_libraries(
+    changed: set[str],
+    gir_dirs: list[str],
+    allow: list[str],
+    deny: list[str],
+    extension: str
+) -> tuple[list[str], list[str]]:
+    """
+    Return the selected libraries affected by the changed files, which are
+    the ones changed and the ones including them, and the files to evict
+    from the caches.
+    """
+    libraries = select_libraries(gir_dirs, allow, deny, extension)
+    graph = resolve_include_graph(libraries, gir_dirs, extension)
+    changed_paths = {path.realpath(file_path) for file_path in changed}
+    pending = [
+        library for library, gir_path in graph.girs.items()
+        if path.realpath(gir_path) in changed_paths
+    ]
+
+    dependents = get_dependents(graph)
+    affected: set[str] = set()
+    while len(pending) > 0:
+        library = pending.pop()
+        if library not in affected:
+            affected.add(library)
+            pending.extend(dependents[library])
+
+    return (
+        sorted(library for library in affected if library in libraries),
+        list(changed) + [graph.girs[library] for library in affected]
+    )
+
+
+def watch(
+    gir_dirs: list[str],
+    allow: list[str],
+    deny: list[str],
+    intermediate_format: str = 'json',
+    fast_path: bool = False,
+    backend: str = 'gidocgen',
+    interval: float = 1.0,
+    poll: bool = False,
+    split: bool = False,
+    docstrings: str = 'full'
+):
+    gir_dirs = [gir_dir for gir_dir in gir_dirs if path.isdir(gir_dir)]
+    extension = get_input_extension(backend)
+
+    # Parsed repositories, within the memory budget, and compiled templates
+    # stay in memory between runs
+    print_summary(batch_generation(
+        gir_dirs, allow, deny, 1, False, intermediate_format, fast_path, backend, split, docstrings,
+        keep_repositories=True))
+
+    watcher = make_watcher(gir_dirs, extension, interval, poll)
+    print(f'\nWatching {", ".join(gir_dirs)} for changes...', flush=True)
+    try:
+        while True:
+            changed = watcher.wait()
+            libraries, evicted = get_affected_libraries(changed, gir_dirs, allow, deny, extension)
+            if len(libraries) == 0:
+                continue
+            print(f'\n{len(changed)} files changed, regenerating {", ".join(libraries)}')
+            evict_repositories(evicted)
+            evict_indexes(evicted)
+            print_summary(batch_generation(
+                gir_dirs, libraries, deny, 1, False, intermediate_format, fast_path, backend, split, docstrings,
+                keep_repositories=True))
+            print(f'\nWatching {", ".join(gir_dirs)} for changes...', flush=True)
+    except KeyboardInterrupt:
+        print('\nStopped watching')
+    finally:
+        watcher.close()
+
+
+def main():
+    parser = ArgumentParser(
+        description='Generate the intermediates and stubs of every GIR in the given directories, '
+                    'then regenerate the affected ones whenever a GIR changes.')
+    parser.add_argument('gir_dirs', nargs='*',
+                        help='directories containing GIR files, or typelibs with --backend '
+                             'typelib, the first ones take precedence')
+    parser.add_argument('--allow', action='append', default=[],
+                        help='only generate the matching libraries, e.g. Gtk-3.0, Gtk or "G*"')
+    parser.add_argument('--deny', action='append', default=[],
+                        help='skip the matching libraries')
+    parser.add_argument('--format', choices=list(INTERMEDIATE_FORMATS), default='json',
+                        help='format of the intermediates')
+    parser.add_argument('--backend', choices=list(EXTRACTOR_BACKENDS), default='gidocgen',
+                        help='how GIRs are read, streaming reads them incrementally and '
+                             'typelib reads the compiled typelibs instead')
+    parser.add_argument('--fast-path', action='store_true',
+                        help='render functions in Python instead of with their template macros')
+    parser.add_argument('--split', action='store_true',
+                        help='write each library as a package of smaller stubs')
+    add_docstring_arguments(parser)
+    add_memory_arguments(parser)
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between two scans when polling')
+    parser.add_argument('--poll', action='store_true',
+                        help='poll the directories instead of using inotify')
+    args = parser.parse_args()
+
+    set_memory_budget(args.max_memory)
+    watch(
+        args.gir_dirs or get_default_input_dirs(args.backend), args.allow, args.deny,
+        args.format, args.fast_path, args.backend, args.interval, args.poll, args.split, args.docstrings)
+
+
+if __name__ == '__main__':
+    main()
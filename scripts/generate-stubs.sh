@@ -1,3 +1,3 @@
 #!/usr/bin/env bash
 
-python3 -m gi-stubgen.stub_gen
\ No newline at end of file
+python3 -m gi-stubgen.stub_gen "$@"
\ No newline at end of file
@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+
+python3 -m gi-stubgen.benchmarks.main "$@"
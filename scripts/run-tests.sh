@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+
+python3 -m unittest discover -s gi-stubgen/tests -t . "$@"